@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 CERN.
+#
+# Invenio-Circulation is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Pytest configuration for the benchmarks.
+
+Run with ``py.test benchmarks --benchmark-json=results.json``, set the
+number of generated loans with ``--scale``.
+"""
+
+from __future__ import absolute_import, print_function
+
+import pytest
+from utils import DEFAULT_SCALE, create_app
+
+
+def pytest_addoption(parser):
+    """Add the scale option."""
+    parser.addoption(
+        '--scale', type=int, default=DEFAULT_SCALE,
+        help='Number of generated loans.')
+
+
+@pytest.fixture(scope='session')
+def loaded_app(request):
+    """Application with generated circulation data."""
+    return create_app(request.config.getoption('scale'))
+
+
+@pytest.yield_fixture()
+def dataset(loaded_app):
+    """Generated dataset, within an application context."""
+    app, dataset = loaded_app
+    with app.app_context():
+        yield dataset
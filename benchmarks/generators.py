@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 CERN.
+#
+# Invenio-Circulation is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Synthetic circulation data."""
+
+from __future__ import absolute_import, print_function
+
+import random
+from datetime import date, timedelta
+
+PATRON_CATEGORIES = ['student', 'staff', 'faculty', 'external']
+ITEM_TYPES = ['book', 'journal', 'dvd', 'map']
+CLOSED_STATES = ['ITEM_RETURNED', 'CANCELLED']
+
+
+class Dataset(object):
+    """Synthetic items, patrons and loans.
+
+    Loans are generated so that a fraction of the items is on loan and some
+    items have pending requests, the rest of the loans are closed. The
+    generation is deterministic for a given seed.
+    """
+
+    def __init__(self, scale, active_ratio=0.1, pending_ratio=0.02,
+                 locations=10, today=None, seed=42):
+        """Initialize the dataset.
+
+        :param scale: number of loans, also used as the number of items.
+        :param active_ratio: fraction of the items which are on loan.
+        :param pending_ratio: fraction of the items with a pending request.
+        :param locations: number of locations.
+        :param today: reference date of the generated dates.
+        :param seed: random seed.
+        """
+        self.scale = scale
+        self.active_ratio = active_ratio
+        self.pending_ratio = pending_ratio
+        self.today = today or date.today()
+        self.random = random.Random(seed)
+        self.item_pids = ['item{0}'.format(i) for i in range(scale)]
+        self.patron_pids = [
+            'patron{0}'.format(i) for i in range(max(scale // 10, 1))]
+        self.location_pids = [
+            'location{0}'.format(i) for i in range(locations)]
+        on_loan = int(scale * active_ratio)
+        self.on_loan_item_pids = self.item_pids[:on_loan]
+        self.available_item_pids = self.item_pids[on_loan:]
+
+    def patron(self):
+        """Return a random patron PID."""
+        return self.random.choice(self.patron_pids)
+
+    def _date(self, days):
+        """Return the ISO date ``days`` days after today."""
+        return (self.today + timedelta(days=days)).isoformat()
+
+    def _loan(self, index, item_pid, state):
+        """Generate one loan."""
+        start = self.random.randint(-400, 0)
+        return dict(
+            loan_pid='loan{0}'.format(index),
+            item_pid=item_pid,
+            patron_pid=self.patron(),
+            patron_category=self.random.choice(PATRON_CATEGORIES),
+            item_type=self.random.choice(ITEM_TYPES),
+            transaction_location_pid=self.random.choice(self.location_pids),
+            state=state,
+            transaction_date=self._date(start) + 'T10:00:00',
+            start_date=self._date(start),
+            end_date=self._date(start + 28),
+        )
+
+    def loans(self):
+        """Iterate over the generated loans."""
+        index = 0
+        for item_pid in self.on_loan_item_pids:
+            yield self._loan(index, item_pid, 'ITEM_ON_LOAN')
+            index += 1
+        pending = int(self.scale * self.pending_ratio)
+        for item_pid in self.item_pids[:pending]:
+            loan = self._loan(index, item_pid, 'PENDING')
+            loan['request_date'] = loan.pop('transaction_date')
+            del loan['start_date'], loan['end_date']
+            yield loan
+            index += 1
+        while index < self.scale:
+            item_pid = self.random.choice(self.item_pids)
+            yield self._loan(
+                index, item_pid, self.random.choice(CLOSED_STATES))
+            index += 1
+
+    def load(self, store, chunk_size=10000):
+        """Write the generated loans into a loan store."""
+        chunk = []
+        for loan in self.loans():
+            chunk.append(loan)
+            if len(chunk) >= chunk_size:
+                store.put_many(chunk)
+                chunk = []
+        if chunk:
+            store.put_many(chunk)
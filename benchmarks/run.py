@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 CERN.
+#
+# Invenio-Circulation is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Run the circulation benchmarks without pytest.
+
+Usage::
+
+    python benchmarks/run.py --scale 100000 --output results.json
+
+Results are written as JSON, with the timings of each scenario in seconds.
+"""
+
+from __future__ import absolute_import, print_function
+
+import argparse
+import json
+import platform
+import sys
+import timeit
+
+from scenarios import SCENARIOS
+from utils import DEFAULT_SCALE, create_app
+
+from invenio_circulation import __version__
+
+
+def measure(func, repeat, number):
+    """Time a function.
+
+    :returns: a dictionary of statistics, in seconds per call.
+    """
+    timings = sorted(
+        t / number for t in timeit.repeat(func, repeat=repeat, number=number))
+    return dict(
+        min=timings[0],
+        max=timings[-1],
+        median=timings[len(timings) // 2],
+        mean=sum(timings) / len(timings),
+        rounds=repeat,
+        iterations=number,
+    )
+
+
+def main(argv=None):
+    """Run the benchmarks and write the results."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--scale', type=int, default=DEFAULT_SCALE,
+                        help='number of generated loans')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='number of timed rounds')
+    parser.add_argument('--number', type=int, default=10,
+                        help='number of calls per round')
+    parser.add_argument('--output', type=argparse.FileType('w'),
+                        default=sys.stdout, help='JSON output file')
+    parser.add_argument('scenarios', nargs='*', metavar='scenario',
+                        help='scenarios to run, all by default: {0}'.format(
+                            ', '.join(SCENARIOS)))
+    args = parser.parse_args(argv)
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error('unknown scenarios: {0}'.format(', '.join(unknown)))
+
+    app, dataset = create_app(args.scale)
+    results = {}
+    with app.app_context():
+        for name in args.scenarios or SCENARIOS:
+            results[name] = measure(
+                SCENARIOS[name](dataset), args.repeat, args.number)
+    json.dump(dict(
+        version=__version__,
+        python=platform.python_version(),
+        scale=args.scale,
+        results=results,
+    ), args.output, indent=2, sort_keys=True)
+    args.output.write('\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 CERN.
+#
+# Invenio-Circulation is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Benchmark scenarios.
+
+A scenario receives a :class:`~generators.Dataset` already loaded in the
+current application, and returns the function to time. The function must
+leave the data as it found it, so that it can be run repeatedly.
+"""
+
+from __future__ import absolute_import, print_function
+
+import itertools
+from collections import OrderedDict
+
+from invenio_circulation.api import bulk_loan_action, checkin, checkout
+from invenio_circulation.holds import HoldQueue
+from invenio_circulation.policies import overdue_sweep
+from invenio_circulation.proxies import current_circulation
+
+SCENARIOS = OrderedDict()
+"""Registered scenarios, by name."""
+
+
+def scenario(func):
+    """Register a scenario."""
+    SCENARIOS[func.__name__] = func
+    return func
+
+
+@scenario
+def checkout_checkin(dataset):
+    """Check an available item out and in again."""
+    items = itertools.cycle(dataset.available_item_pids)
+
+    def run():
+        item_pid = next(items)
+        checkout(item_pid, dataset.patron())
+        checkin(item_pid)
+    return run
+
+
+@scenario
+def bulk_checkout_checkin(dataset, size=300):
+    """Check a trolley of items out and in again, in two batches."""
+    item_pids = dataset.available_item_pids[:size]
+    patron_pid = dataset.patron()
+    checkouts = [
+        dict(item_pid=item_pid, patron_pid=patron_pid)
+        for item_pid in item_pids
+    ]
+    checkins = [dict(item_pid=item_pid) for item_pid in item_pids]
+
+    def run():
+        bulk_loan_action('checkout', checkouts)
+        bulk_loan_action('checkin', checkins)
+    return run
+
+
+@scenario
+def availability(dataset, size=100):
+    """Look the availability of a search results page up."""
+    item_pids = dataset.random.sample(dataset.item_pids, size)
+    index = current_circulation.availability
+    index.get_many(item_pids)
+
+    def run():
+        index.get_many(item_pids)
+    return run
+
+
+@scenario
+def hold_queue(dataset, size=1000):
+    """Add, peek and cancel a hold in a long queue."""
+    queue = HoldQueue()
+    for i in range(size):
+        queue.push(dict(loan_pid=str(i)), (i % 3, i))
+
+    def run():
+        queue.push(dict(loan_pid='new'), (1, size // 2))
+        queue.peek()
+        queue.cancel('new')
+    return run
+
+
+@scenario
+def overdue(dataset):
+    """Compute overdue days and fines of all items on loan."""
+    store = current_circulation.loan_store
+    states = current_circulation.loan_transitions.on_loan_states
+
+    def run():
+        overdue_sweep(store.search(states=states), today=dataset.today)
+    return run
+
+
+@scenario
+def overdue_batches(dataset):
+    """Compute overdue days and fines of all items on loan, by batches."""
+    store = current_circulation.loan_store
+    states = current_circulation.loan_transitions.on_loan_states
+
+    def run():
+        for batch in store.iter_batches(states=states, chunk_size=10000):
+            overdue_sweep(batch, today=dataset.today)
+    return run
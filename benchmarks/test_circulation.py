@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 CERN.
+#
+# Invenio-Circulation is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Circulation benchmarks."""
+
+from __future__ import absolute_import, print_function
+
+import pytest
+from scenarios import SCENARIOS
+
+
+@pytest.mark.parametrize('name', list(SCENARIOS))
+def test_scenario(benchmark, dataset, name):
+    """Benchmark a scenario."""
+    benchmark.group = 'scale={0}'.format(dataset.scale)
+    benchmark(SCENARIOS[name](dataset))
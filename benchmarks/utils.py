@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 CERN.
+#
+# Invenio-Circulation is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Benchmark helpers."""
+
+from __future__ import absolute_import, print_function
+
+import os
+
+from flask import Flask
+from generators import Dataset
+
+from invenio_circulation import InvenioCirculation
+
+DEFAULT_SCALE = int(os.environ.get('CIRCULATION_BENCHMARK_SCALE', 10000))
+"""Number of generated loans, overridden by the environment."""
+
+
+def create_app(scale, **config):
+    """Create an application with a loaded in-memory loan store.
+
+    :returns: a tuple ``(app, dataset)``.
+    """
+    app = Flask('benchmarks')
+    app.config.update(
+        CIRCULATION_LOAN_STORE='invenio_circulation.storage:MemoryLoanStore',
+        TESTING=True,
+    )
+    app.config.update(config)
+    InvenioCirculation(app)
+    dataset = Dataset(scale)
+    dataset.load(app.extensions['invenio-circulation'].loan_store)
+    return app, dataset
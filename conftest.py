@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 CERN.
+#
+# Invenio-Circulation is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Pytest configuration shared by the tests and the doctests."""
+
+from __future__ import absolute_import, print_function
+
+import sys
+
+collect_ignore = []
+if sys.version_info < (3, 5):
+    # The asyncio service uses the async syntax of Python 3.5.
+    collect_ignore.extend([
+        'invenio_circulation/aio.py',
+        'tests/test_aio.py',
+    ])
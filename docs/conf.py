@@ -10,6 +10,7 @@
 from __future__ import print_function
 
 import os
+import sys
 
 import sphinx.environment
 
@@ -84,6 +85,10 @@ language = None
 # List of patterns, relative to source directory, that match files and
 # directories to ignore when looking for source files.
 exclude_patterns = []
+if sys.version_info < (3, 5):
+    # The asyncio service uses the async syntax of Python 3.5, its page is
+    # only listed by the glob of the API reference when it is built.
+    exclude_patterns.append('aio.rst')
 
 # The reST default role (used for this markup: `text`) to use for all
 # documents.
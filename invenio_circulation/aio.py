@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 CERN.
+#
+# Invenio-Circulation is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Asyncio circulation service, for kiosks and other devices.
+
+Self-check kiosks and RFID gates keep long-lived and mostly idle
+connections. :class:`KioskServer` serves them from one event loop, and only
+uses a worker thread of :class:`AsyncCirculation` while an action runs, with
+the same transitions, policies and state as the Flask application.
+
+Requires Python 3.5 or later.
+"""
+
+from __future__ import absolute_import, print_function
+
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from .api import check_client_fields, checkin, checkout, loan_action
+from .errors import CirculationException
+from .proxies import current_circulation
+
+
+def _item_status(item_pid):
+    """Return the availability of an item as a dictionary."""
+    return dict(current_circulation.availability.get(item_pid)._asdict())
+
+
+class AsyncCirculation(object):
+    """Circulation actions returning awaitables.
+
+    Actions run in a thread pool, each one in an application context, so
+    that the event loop is never blocked by the loan store.
+    """
+
+    def __init__(self, app, executor=None):
+        """Initialize the service.
+
+        :param app: the Flask application, with the circulation extension.
+        :param executor: the executor running the actions, by default a
+            thread pool of
+            :data:`invenio_circulation.config.CIRCULATION_ASYNC_WORKERS`
+            threads.
+        """
+        self.app = app
+        self.executor = executor or ThreadPoolExecutor(
+            app.config['CIRCULATION_ASYNC_WORKERS'])
+
+    def _call(self, func, *args, **kwargs):
+        """Call a function in an application context."""
+        with self.app.app_context():
+            return func(*args, **kwargs)
+
+    def run(self, func, *args, **kwargs):
+        """Run a function of the circulation API in the executor."""
+        return asyncio.get_event_loop().run_in_executor(
+            self.executor, partial(self._call, func, *args, **kwargs))
+
+    def checkout(self, item_pid, patron_pid, **kwargs):
+        """Lend an item to a patron, see :func:`~.api.checkout`."""
+        return self.run(checkout, item_pid, patron_pid, **kwargs)
+
+    def checkin(self, item_pid, **kwargs):
+        """Return an item, see :func:`~.api.checkin`."""
+        return self.run(checkin, item_pid, **kwargs)
+
+    def renew(self, item_pid, **kwargs):
+        """Extend the loan of an item."""
+        return self.run(loan_action, 'extend', item_pid, **kwargs)
+
+    def item_status(self, item_pid):
+        """Return the availability of an item as a dictionary."""
+        return self.run(_item_status, item_pid)
+
+
+class KioskServer(object):
+    """Line based kiosk protocol server.
+
+    Each request is a line with a command, its arguments and optional loan
+    fields as ``key=value``, e.g.::
+
+        CHECKOUT item1 patron1 transaction_location_pid=desk1
+        CHECKIN item1 transaction_location_pid=desk1
+        RENEW item1
+        STATUS item1
+        QUIT
+
+    Each response is a line, ``OK`` followed by the loan or item status in
+    JSON, or ``ERR`` followed by the error code and message. Loan fields are
+    limited to
+    :data:`~invenio_circulation.config.CIRCULATION_CLIENT_LOAN_FIELDS`, and
+    unexpected errors are logged and answered with ``ERR 500``.
+    """
+
+    commands = {
+        'CHECKOUT': ('checkout', ('item_pid', 'patron_pid')),
+        'CHECKIN': ('checkin', ('item_pid', )),
+        'RENEW': ('renew', ('item_pid', )),
+        'STATUS': ('item_status', ('item_pid', )),
+    }
+    """Commands mapped to the method and the names of its arguments."""
+
+    def __init__(self, circulation):
+        """Initialize the server.
+
+        :param circulation: the :class:`AsyncCirculation` service.
+        """
+        self.circulation = circulation
+        self.idle_timeout = circulation.app.config[
+            'CIRCULATION_KIOSK_IDLE_TIMEOUT']
+
+    def start(self, host='127.0.0.1', port=0, **kwargs):
+        """Start serving, return a coroutine of the ``asyncio`` server."""
+        return asyncio.start_server(self.handle, host, port, **kwargs)
+
+    async def execute(self, line):
+        """Execute a request line, return the response line."""
+        words = line.split()
+        if not words:
+            return 'ERR 400 Empty request.'
+        method, names = self.commands.get(words[0].upper(), (None, ()))
+        args = [word for word in words[1:] if '=' not in word]
+        fields = dict(
+            word.split('=', 1) for word in words[1:] if '=' in word)
+        if method is None or len(args) != len(names) or \
+                (fields and method == 'item_status') or \
+                set(fields) & set(names):
+            return 'ERR 400 Invalid request.'
+        app = self.circulation.app
+        try:
+            with app.app_context():
+                check_client_fields(fields)
+            result = await getattr(self.circulation, method)(*args, **fields)
+        except CirculationException as e:
+            return 'ERR {0} {1}'.format(e.code, e)
+        except Exception:
+            app.logger.exception('Kiosk request "%s" failed.', line)
+            return 'ERR 500 Internal error.'
+        return 'OK {0}'.format(json.dumps(result, sort_keys=True))
+
+    async def handle(self, reader, writer):
+        """Serve the requests of a connection, one after the other."""
+        try:
+            while True:
+                line = await asyncio.wait_for(
+                    reader.readline(), self.idle_timeout)
+                line = line.decode('utf-8').strip() if line else 'QUIT'
+                if line.upper() == 'QUIT':
+                    break
+                response = await self.execute(line)
+                writer.write(response.encode('utf-8') + b'\n')
+                await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
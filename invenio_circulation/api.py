@@ -0,0 +1,429 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 CERN.
+#
+# Invenio-Circulation is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Circulation API."""
+
+from __future__ import absolute_import, print_function
+
+import random
+import time
+import uuid
+from collections import OrderedDict, namedtuple
+from datetime import date, datetime
+
+from flask import current_app
+from six import string_types
+
+from .errors import CirculationException, InvalidLoanFieldError, \
+    InvalidLoanTransitionError, ItemNotAvailableError, LoanConflictError, \
+    LoanFieldNotAllowedError, LoanMaxExtensionsError, LoanNotFoundError, \
+    LoanOnHoldError, MissingRequiredParameterError
+from .limits import PatronCounts
+from .proxies import current_circulation
+from .signals import item_transits_changed, loan_state_changed
+
+HOLD_TRIGGER = 'validate_request'
+"""Trigger assigning a returned item to its next hold."""
+
+COMPUTED_FIELDS = ('state', 'start_date', 'end_date', 'extension_count')
+"""Loan fields set by the circulation actions, never by their operations.
+
+The ``start_date`` of an operation is only used as the start of a new loan
+period, from which its due date is computed.
+"""
+
+LoanChange = namedtuple('LoanChange', ['trigger', 'previous', 'loan'])
+"""A committed loan transition.
+
+``previous`` is the loan before the transition, or ``None`` when the
+transition created the loan.
+"""
+
+LoanActionResult = namedtuple('LoanActionResult',
+                              ['item_pid', 'loan', 'error', 'transit'])
+"""Outcome of one operation of a bulk action.
+
+Exactly one of ``loan`` (the loan after the transition) and ``error`` (the
+:class:`~invenio_circulation.errors.CirculationException` which prevented
+it) is set. ``transit`` is the transit started by the operation, if any.
+"""
+
+TRANSIT_PICKUP = 'pickup'
+"""Reason of the transit of an item to the pickup location of a hold."""
+
+TRANSIT_RETURN = 'return'
+"""Reason of the transit of an item to its home location."""
+
+
+def _find_loan(transitions, trigger, operation, loans):
+    """Return the loan of an item on which ``trigger`` should be applied."""
+    loan_pid = operation.get('loan_pid')
+    patron_pid = operation.get('patron_pid')
+    candidates = [
+        loan for loan in loans
+        if (loan_pid is None or loan['loan_pid'] == loan_pid) and
+        (patron_pid is None or loan['patron_pid'] == patron_pid)
+    ]
+    for loan in candidates:
+        if transitions.can(loan['state'], trigger):
+            return loan
+    if candidates and (loan_pid or not transitions.can(
+            transitions.initial_state, trigger)):
+        raise InvalidLoanTransitionError(candidates[0]['state'], trigger)
+    return None
+
+
+def _validate(transitions, trigger, operation, loans):
+    """Validate the application of ``trigger`` to the loans of an item.
+
+    :param loans: active loans of the item, as seen by the batch so far.
+    :returns: a tuple ``(previous, loan, dest)`` with the loan before the
+        transition (``None`` for a new loan), a copy of it to modify, and
+        the destination state.
+    """
+    item_pid = operation['item_pid']
+    patron_pid = operation.get('patron_pid')
+    previous = _find_loan(transitions, trigger, operation, loans)
+    if previous is None:
+        if operation.get('loan_pid') or \
+                not transitions.can(transitions.initial_state, trigger):
+            raise LoanNotFoundError(item_pid, trigger)
+        if not patron_pid:
+            raise MissingRequiredParameterError(
+                'A patron is required to create a loan.')
+        loan = dict(
+            loan_pid=uuid.uuid4().hex,
+            item_pid=item_pid,
+            patron_pid=patron_pid,
+            state=transitions.initial_state,
+        )
+    else:
+        loan = dict(previous)
+
+    dest = transitions.validate(loan['state'], trigger)
+    unavailable = transitions.unavailable_states
+    if dest in unavailable and loan['state'] not in unavailable:
+        if any(other['state'] in unavailable for other in loans
+               if other['loan_pid'] != loan['loan_pid']):
+            raise ItemNotAvailableError(item_pid)
+    return previous, loan, dest
+
+
+def _apply_policy(state, operation, loan, dest, loans, counts):
+    """Set the loan period of a loan entering or staying on loan.
+
+    A loan is only extended if its patron is not blocked, if it has not
+    reached the maximum number of extensions, and if its item is not
+    requested, like with
+    :func:`~invenio_circulation.renewals.renew_patron_loans`.
+
+    :param loans: active loans of the item, as seen by the batch so far.
+    :param counts: the
+        :class:`~invenio_circulation.limits.PatronCounts` of the batch.
+    """
+    transitions = state.loan_transitions
+    on_loan = transitions.on_loan_states
+    if dest not in on_loan:
+        return
+    target = dict(loan, **operation)
+    policy = state.policies.for_loan(target)
+    location_pid = operation.get(
+        'transaction_location_pid', loan.get('transaction_location_pid'))
+    if loan['state'] not in on_loan:
+        state.limits.check(target, policy, counts)
+        loan['start_date'] = operation.get(
+            'start_date', date.today().isoformat())
+        loan['end_date'] = state.calendars.next_open_day(
+            location_pid, loan['start_date'], policy['loan_duration'])
+    elif dest == loan['state']:
+        state.limits.check_blocks(target, policy)
+        count = loan.get('extension_count', 0)
+        max_extensions = policy.get('max_extensions')
+        if max_extensions is not None and count >= max_extensions:
+            raise LoanMaxExtensionsError(loan['loan_pid'], max_extensions)
+        if any(other['state'] in transitions.pending_states
+               for other in loans):
+            raise LoanOnHoldError(loan['loan_pid'])
+        loan['extension_count'] = count + 1
+        loan['end_date'] = state.calendars.next_open_day(
+            location_pid,
+            max(loan.get('end_date') or '', date.today().isoformat()),
+            policy['extension_duration'])
+
+
+def _apply(state, trigger, operation, loans, counts):
+    """Apply ``trigger`` to the loans of an item.
+
+    :param state: the circulation state of the application.
+    :param loans: active loans of the item, as seen by the batch so far.
+    :param counts: patron loan counts, as seen by the batch so far.
+    :returns: a tuple ``(previous, loan)``.
+    """
+    instrumentation = state.instrumentation
+    with instrumentation.timer(trigger, 'validation'):
+        previous, loan, dest = _validate(
+            state.loan_transitions, trigger, operation, loans)
+        if previous is None:
+            loan.update(state.loan_enricher(loan))
+    with instrumentation.timer(trigger, 'policy'):
+        _apply_policy(state, operation, loan, dest, loans, counts)
+
+    loan.update(
+        (field, value) for field, value in operation.items()
+        if field not in COMPUTED_FIELDS)
+    loan['state'] = dest
+    if 'transaction_date' not in operation:
+        loan['transaction_date'] = datetime.utcnow().isoformat()
+    return previous, loan
+
+
+def _next_hold(state, loans):
+    """Return the next hold to serve among the active loans of an item."""
+    transitions = state.loan_transitions
+    if not any(transitions.can(pending, HOLD_TRIGGER)
+               for pending in transitions.pending_states):
+        return None
+    pending = [
+        loan for loan in loans if transitions.can(loan['state'], HOLD_TRIGGER)
+    ]
+    if not pending:
+        return None
+    return state.holds.next_hold(loans[0]['item_pid'], pending)
+
+
+def enrich_loan(loan):
+    """Return the fields of a new loan read from its item and patron.
+
+    Default of :data:`invenio_circulation.config.CIRCULATION_LOAN_ENRICHER`,
+    adding no field.
+    """
+    return {}
+
+
+def get_item_location(loan):
+    """Return the home location of the item of a loan.
+
+    Default of :data:`invenio_circulation.config.CIRCULATION_ITEM_LOCATION`,
+    reading the ``item_location_pid`` of the loan.
+    """
+    return loan.get('item_location_pid')
+
+
+def _route(state, loan, hold):
+    """Return where an item released by a loan goes.
+
+    :param loan: the loan releasing the item.
+    :param hold: the hold now assigned to the item, or ``None``.
+    :returns: a transit, or ``None`` if the item stays where it was
+        returned.
+    """
+    here = loan.get('transaction_location_pid')
+    if hold is not None:
+        reason, destination = TRANSIT_PICKUP, hold.get('pickup_location_pid')
+    else:
+        reason, destination = TRANSIT_RETURN, state.item_location(loan)
+    if not destination or destination == here:
+        return None
+    return dict(
+        item_pid=loan['item_pid'],
+        loan_pid=(hold or loan)['loan_pid'],
+        reason=reason,
+        from_location_pid=here,
+        to_location_pid=destination,
+        transaction_date=loan['transaction_date'],
+    )
+
+
+def _bulk_loan_action(state, trigger, operations):
+    """Apply a circulation action to a batch of items, without retries."""
+    transitions = state.loan_transitions
+    instrumentation = state.instrumentation
+    item_pids = list(OrderedDict.fromkeys(op['item_pid'] for op in operations))
+    with instrumentation.timer(trigger, 'storage_read'):
+        revisions = state.loan_store.get_item_revisions(item_pids)
+        loans_by_item = state.loan_store.get_by_items(
+            item_pids, states=transitions.active_states)
+
+    results = []
+    changes = []
+    changed = OrderedDict()
+    counts = PatronCounts()
+    transits = {}
+
+    def record(change):
+        loan = change.loan
+        loans = loans_by_item[loan['item_pid']]
+        loans[:] = [
+            other for other in loans if other['loan_pid'] != loan['loan_pid']
+        ]
+        if transitions.is_active(loan['state']):
+            loans.append(loan)
+        changed[loan['loan_pid']] = loan
+        changes.append(change)
+
+    for operation in operations:
+        item_pid = operation['item_pid']
+        loans = loans_by_item[item_pid]
+        try:
+            previous, loan = _apply(state, trigger, operation, loans, counts)
+        except CirculationException as e:
+            results.append(LoanActionResult(item_pid, None, e, None))
+            continue
+        record(LoanChange(trigger, previous, loan))
+
+        if previous and previous['state'] in transitions.unavailable_states \
+                and loan['state'] not in transitions.unavailable_states:
+            hold = _next_hold(state, loans_by_item[item_pid])
+            if hold is not None:
+                hold_previous, hold = _apply(
+                    state, HOLD_TRIGGER, dict(
+                        item_pid=item_pid,
+                        loan_pid=hold['loan_pid'],
+                        transaction_location_pid=loan.get(
+                            'transaction_location_pid'),
+                    ), loans_by_item[item_pid], counts)
+                record(LoanChange(HOLD_TRIGGER, hold_previous, hold))
+            if loan.get('transaction_location_pid'):
+                transits[item_pid] = _route(state, loan, hold)
+        results.append(LoanActionResult(
+            item_pid, loan, None, transits.get(item_pid)))
+
+    if changed:
+        with instrumentation.timer(trigger, 'storage_write'):
+            state.loan_store.put_many(
+                changed.values(), revisions=revisions, transits=transits,
+                max_counts=counts.maxima)
+        with instrumentation.timer(trigger, 'indexing'):
+            loan_state_changed.send(
+                current_app._get_current_object(), changes=changes)
+        started = [transit for transit in transits.values() if transit]
+        if started:
+            item_transits_changed.send(
+                current_app._get_current_object(), started=started,
+                completed=[])
+    return results
+
+
+def bulk_loan_action(trigger, operations):
+    """Apply a circulation action to a batch of items in one transaction.
+
+    All operations are validated against the current loans in a single
+    pass, as if they were applied one after the other, and the resulting
+    loans are written with one call to the loan store. An operation which
+    cannot be applied does not prevent the others from being committed.
+
+    When an operation releases an item, the next hold of the item is
+    assigned to it in the same batch with the :data:`HOLD_TRIGGER`.
+
+    No lock is held between reading and writing the loans. If loans of the
+    same items were written in the meantime, the whole batch is computed
+    again, up to
+    :data:`invenio_circulation.config.CIRCULATION_CONFLICT_RETRIES` times.
+
+    :param trigger: the circulation action, e.g. ``checkin``.
+    :param operations: list of dictionaries with the ``item_pid``, the
+        optional ``patron_pid`` and any other loan field to set, except
+        the :data:`COMPUTED_FIELDS`.
+    :returns: list of :data:`LoanActionResult`, one per operation.
+    :raises LoanConflictError: if the batch still conflicts after the
+        retries.
+    """
+    return retry_conflicts(
+        _bulk_loan_action, current_circulation, trigger, operations)
+
+
+def check_client_fields(operation):
+    """Check that an operation sent by a client only sets allowed fields.
+
+    See :data:`invenio_circulation.config.CIRCULATION_CLIENT_LOAN_FIELDS`.
+
+    :raises LoanFieldNotAllowedError: if the operation sets another field.
+    :raises InvalidLoanFieldError: if a field is neither a string nor
+        ``None``.
+    """
+    allowed = current_app.config['CIRCULATION_CLIENT_LOAN_FIELDS']
+    for field, value in sorted(operation.items()):
+        if field not in allowed:
+            raise LoanFieldNotAllowedError(field)
+        if value is not None and not isinstance(value, string_types):
+            raise InvalidLoanFieldError(field)
+
+
+def retry_conflicts(func, *args, **kwargs):
+    """Call a function reading and writing loans, retrying on conflicts.
+
+    :raises LoanConflictError: if the function still conflicts after
+        :data:`invenio_circulation.config.CIRCULATION_CONFLICT_RETRIES`
+        retries.
+    """
+    retries = current_app.config['CIRCULATION_CONFLICT_RETRIES']
+    delay = current_app.config['CIRCULATION_CONFLICT_RETRY_DELAY']
+    for attempt in range(retries + 1):
+        try:
+            return func(*args, **kwargs)
+        except LoanConflictError:
+            if attempt == retries:
+                raise
+            time.sleep(delay * 2 ** attempt * random.random())
+
+
+def loan_action(trigger, item_pid, patron_pid=None, **kwargs):
+    """Apply a circulation action to an item.
+
+    :param trigger: the circulation action, e.g. ``checkout``.
+    :param item_pid: the item PID.
+    :param patron_pid: the patron PID, required when a loan is created.
+    :param kwargs: other loan fields to set, except the
+        :data:`COMPUTED_FIELDS`.
+    :returns: the loan after the transition.
+    :raises CirculationException: if the action cannot be applied.
+    """
+    operation = dict(kwargs, item_pid=item_pid)
+    if patron_pid:
+        operation['patron_pid'] = patron_pid
+    result = bulk_loan_action(trigger, [operation])[0]
+    if result.error:
+        raise result.error
+    return result.loan
+
+
+def checkout(item_pid, patron_pid, **kwargs):
+    """Lend an item to a patron."""
+    return loan_action('checkout', item_pid, patron_pid, **kwargs)
+
+
+def checkin(item_pid, **kwargs):
+    """Return an item."""
+    return loan_action('checkin', item_pid, **kwargs)
+
+
+def receive_items(location_pid, item_pids):
+    """Record the arrival of items in transit at a location.
+
+    :returns: a dictionary mapping the PIDs of the items which were in
+        transit to the location to their completed transit.
+    """
+    store = current_circulation.loan_store
+    revisions = store.get_item_revisions(item_pids)
+    arrived = dict(
+        (item_pid, transit)
+        for item_pid, transit in store.get_transits(item_pids).items()
+        if transit and transit['to_location_pid'] == location_pid
+    )
+    if arrived:
+        store.put_many([], revisions=revisions,
+                       transits=dict.fromkeys(arrived))
+        item_transits_changed.send(
+            current_app._get_current_object(), started=[],
+            completed=list(arrived.values()))
+    return arrived
+
+
+def get_arrivals(location_pid):
+    """Return the transits of the items on their way to a location."""
+    return list(current_circulation.loan_store.search_transits(
+        [location_pid]))
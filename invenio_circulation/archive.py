@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 CERN.
+#
+# Invenio-Circulation is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Loan archive.
+
+Loans in a final state for longer than
+:data:`invenio_circulation.config.CIRCULATION_ARCHIVE_AGE` days are moved
+from the loan store to append-only segments, so that the loan store only
+keeps active and recent loans. A segment is a gzipped file with one JSON loan
+per line, and a sidecar index listing the lines of each patron, so that the
+history of a patron only decompresses the segments where the patron appears.
+"""
+
+from __future__ import absolute_import, print_function
+
+import gzip
+import json
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+
+from flask import current_app
+
+from .proxies import current_circulation
+
+SEGMENT_SUFFIX = '.ndjson.gz'
+"""Suffix of the segment files."""
+
+INDEX_SUFFIX = '.patrons.json'
+"""Suffix of the sidecar index files."""
+
+
+class LoanArchive(object):
+    """Directory of archived loan segments."""
+
+    def __init__(self, path, index_cache_size=64):
+        """Initialize the archive.
+
+        :param path: directory of the segments, created when needed.
+        :param index_cache_size: number of patron indexes of segments kept
+            in memory, the least recently used ones are read again from
+            their sidecar files.
+        """
+        self.path = path
+        self.index_cache_size = index_cache_size
+        self._lock = threading.Lock()
+        self._indexes = OrderedDict()
+
+    def segments(self):
+        """Return the names of the segments, oldest first."""
+        if not os.path.isdir(self.path):
+            return []
+        return sorted(
+            name[:-len(SEGMENT_SUFFIX)] for name in os.listdir(self.path)
+            if name.endswith(SEGMENT_SUFFIX))
+
+    def _file(self, segment, suffix):
+        """Return the path of a file of a segment."""
+        return os.path.join(self.path, segment + suffix)
+
+    def write(self, loans):
+        """Write loans to a new segment.
+
+        The segment only becomes visible once completely written.
+
+        :returns: the name of the segment.
+        """
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+        segment = '{0}-{1}'.format(
+            datetime.utcnow().strftime('%Y%m%d%H%M%S%f'), uuid.uuid4().hex[:8])
+        index = {}
+        data = self._file(segment, SEGMENT_SUFFIX)
+        with gzip.open(data + '.tmp', 'wb') as fp:
+            for line, loan in enumerate(loans):
+                fp.write(json.dumps(loan, sort_keys=True).encode('utf-8'))
+                fp.write(b'\n')
+                index.setdefault(loan.get('patron_pid'), []).append(line)
+        with open(self._file(segment, INDEX_SUFFIX), 'w') as fp:
+            json.dump(index, fp)
+        os.rename(data + '.tmp', data)
+        return segment
+
+    def _index(self, segment):
+        """Return the patron index of a segment."""
+        with self._lock:
+            index = self._indexes.pop(segment, None)
+            if index is not None:
+                self._indexes[segment] = index
+                return index
+        with open(self._file(segment, INDEX_SUFFIX)) as fp:
+            index = json.load(fp)
+        with self._lock:
+            self._indexes[segment] = index
+            while len(self._indexes) > self.index_cache_size:
+                self._indexes.popitem(last=False)
+        return index
+
+    def _read(self, segment, lines):
+        """Iterate over the loans at some lines of a segment."""
+        lines = set(lines)
+        last = max(lines)
+        with gzip.open(self._file(segment, SEGMENT_SUFFIX), 'rb') as fp:
+            for number, line in enumerate(fp):
+                if number in lines:
+                    yield json.loads(line.decode('utf-8'))
+                if number == last:
+                    return
+
+    def get_patron_loans(self, patron_pid):
+        """Iterate over the archived loans of a patron."""
+        for segment in self.segments():
+            lines = self._index(segment).get(patron_pid)
+            if lines:
+                for loan in self._read(segment, lines):
+                    yield loan
+
+
+def archive_loans(age=None, chunk_size=None):
+    """Move old loans in a final state from the loan store to the archive.
+
+    Each chunk of loans is written to a segment, then deleted from the loan
+    store. If the job is interrupted in between, the loans of the last
+    chunk are both in the loan store and the archive, and are archived
+    again by the next run. :func:`get_patron_history` ignores such
+    duplicates.
+
+    :param age: minimum age in days of the loans, defaults to
+        :data:`invenio_circulation.config.CIRCULATION_ARCHIVE_AGE`.
+    :param chunk_size: number of loans per segment, defaults to
+        :data:`invenio_circulation.config.CIRCULATION_ARCHIVE_CHUNK_SIZE`.
+    :returns: the number of archived loans.
+    """
+    config = current_app.config
+    state = current_circulation
+    store = state.loan_store
+    age = config['CIRCULATION_ARCHIVE_AGE'] if age is None else age
+    chunk_size = chunk_size or config['CIRCULATION_ARCHIVE_CHUNK_SIZE']
+    cutoff = (date.today() - timedelta(days=age)).isoformat()
+
+    count = 0
+    chunk = []
+    loans = store.iter_loans(
+        chunk_size=chunk_size, states=state.loan_transitions.final_states)
+    for loan in loans:
+        if (loan.get('transaction_date') or '') < cutoff:
+            chunk.append(loan)
+        if len(chunk) == chunk_size:
+            count += _move(state, chunk)
+            chunk = []
+    if chunk:
+        count += _move(state, chunk)
+    return count
+
+
+def _move(state, loans):
+    """Move loans from the loan store to a new segment."""
+    state.archive.write(loans)
+    state.loan_store.delete_many([loan['loan_pid'] for loan in loans])
+    return len(loans)
+
+
+def get_patron_history(patron_pid):
+    """Return all loans of a patron, from the loan store and the archive.
+
+    :returns: a list of loans, most recent transactions first.
+    """
+    state = current_circulation
+    loans = dict(
+        (loan['loan_pid'], loan)
+        for loan in state.archive.get_patron_loans(patron_pid))
+    loans.update(
+        (loan['loan_pid'], loan)
+        for loan in state.loan_store.search(patron_pids=[patron_pid]))
+    return sorted(
+        loans.values(), key=lambda loan: loan.get('transaction_date') or '',
+        reverse=True)
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 CERN.
+#
+# Invenio-Circulation is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Item availability index."""
+
+from __future__ import absolute_import, print_function
+
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+ItemAvailability = namedtuple('ItemAvailability', [
+    'item_pid', 'available', 'state', 'loan_pid', 'end_date',
+    'pending_requests',
+])
+"""Availability of an item.
+
+``state``, ``loan_pid`` and ``end_date`` describe the loan holding the item,
+and are ``None`` when the item is available.
+"""
+
+
+class AvailabilityIndex(object):
+    """Availability of items, maintained from loan transitions.
+
+    Only items with a loan holding them or with pending requests have an
+    entry, items without entry are available. The index is built from the
+    loan store on first use, transitions committed before are ignored.
+
+    The index is kept in process memory and only follows the transitions
+    committed by the same process. When other processes write to the same
+    loan store, it is rebuilt from the store every ``max_age`` seconds, see
+    :data:`invenio_circulation.config.CIRCULATION_AVAILABILITY_MAX_AGE`.
+    """
+
+    def __init__(self, transitions, loader=None, max_age=None):
+        """Initialize the index.
+
+        :param transitions: the
+            :class:`~invenio_circulation.transitions.LoanTransitions`
+            defining which states hold an item or are pending requests.
+        :param loader: callable returning the loans holding their item or
+            pending, used to build the index on first use.
+        :param max_age: seconds after which the index is rebuilt with the
+            loader, ``None`` to never rebuild it.
+        """
+        self.transitions = transitions
+        self.loader = loader
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._items = None if loader else {}
+        self._built = time.time()
+
+    def _update(self, previous, loan):
+        """Apply one loan transition to the index."""
+        unavailable = self.transitions.unavailable_states
+        pending = self.transitions.pending_states
+        item_pid = loan['item_pid']
+        entry = self._items.get(item_pid) or [None, None, None, 0]
+
+        if previous and previous['state'] in pending:
+            entry[3] -= 1
+        if loan['state'] in pending:
+            entry[3] += 1
+        if loan['state'] in unavailable:
+            entry[:3] = loan['state'], loan['loan_pid'], loan.get('end_date')
+        elif entry[1] == loan['loan_pid']:
+            entry[:3] = None, None, None
+
+        if entry[0] is None and entry[3] <= 0:
+            self._items.pop(item_pid, None)
+        else:
+            self._items[item_pid] = entry
+
+    def update(self, changes):
+        """Update the index from a list of loan changes."""
+        with self._lock:
+            if self._items is None:
+                return
+            for change in changes:
+                self._update(change.previous, change.loan)
+
+    def rebuild(self, loans):
+        """Rebuild the index from scratch.
+
+        :param loans: iterable over all active loans.
+        """
+        with self._lock:
+            self._items = {}
+            self._built = time.time()
+            for loan in loans:
+                self._update(None, loan)
+
+    def _get_items(self):
+        """Return the index entries, building them when needed."""
+        if self._items is None or (
+                self.loader and self.max_age is not None and
+                time.time() - self._built >= self.max_age):
+            self.rebuild(self.loader())
+        return self._items
+
+    def get(self, item_pid):
+        """Return the :data:`ItemAvailability` of an item."""
+        return self.get_many([item_pid])[item_pid]
+
+    def get_many(self, item_pids):
+        """Return the availability of several items.
+
+        :returns: an ordered dictionary mapping each item PID to its
+            :data:`ItemAvailability`.
+        """
+        result = OrderedDict()
+        items = self._get_items()
+        for item_pid in item_pids:
+            state, loan_pid, end_date, pending = \
+                items.get(item_pid) or (None, None, None, 0)
+            result[item_pid] = ItemAvailability(
+                item_pid, state is None, state, loan_pid, end_date, pending)
+        return result
+
+    def on_loan_state_changed(self, sender, changes=None, **kwargs):
+        """Update the index when loan transitions are committed."""
+        self.update(changes)
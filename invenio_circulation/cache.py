@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 CERN.
+#
+# Invenio-Circulation is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Response cache of the circulation views.
+
+Views decorated with :func:`cached` store their responses in a cache
+backend. Responses are keyed by the URL, the locale and the base template,
+and by the version of their scope, e.g. ``item:<item_pid>`` for the status
+page of an item. Loan transitions replace the versions of the scopes of
+their item and patron with new random ones, so that the cached responses
+depending on them are not used anymore and expire from the backend. Random
+versions, unlike counters, stay unique when the backend evicts them.
+
+Keys have no user component: responses which may depend on the user, i.e.
+reading the session, which includes loading the logged in user, are never
+cached nor served from the cache.
+"""
+
+from __future__ import absolute_import, print_function
+
+import hashlib
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, request, session
+from flask_babelex import get_locale
+
+from .proxies import current_circulation
+
+
+class LRUCacheBackend(object):
+    """Cache backend in process memory, evicting least recently used keys.
+
+    Each process has its own cache, use :class:`RedisCacheBackend` to share
+    the cache between processes.
+    """
+
+    def __init__(self, app=None):
+        """Initialize the backend."""
+        self.size = app.config['CIRCULATION_VIEW_CACHE_SIZE'] if app else 1024
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get_many(self, keys):
+        """Return the values of several keys, ``None`` for missing ones."""
+        now = time.time()
+        values = []
+        with self._lock:
+            for key in keys:
+                entry = self._entries.pop(key, None)
+                if entry is not None and (entry[0] is None or entry[0] > now):
+                    self._entries[key] = entry
+                    values.append(entry[1])
+                else:
+                    values.append(None)
+        return values
+
+    def set(self, key, value, timeout=None):
+        """Set the value of a key, expiring after ``timeout`` seconds."""
+        expires = time.time() + timeout if timeout else None
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (expires, value)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+
+class RedisCacheBackend(object):
+    """Cache backend shared between processes, which requires ``redis``.
+
+    Any client with the ``mget`` and ``set`` methods of
+    ``redis.StrictRedis`` can be used.
+    """
+
+    def __init__(self, app=None, client=None):
+        """Initialize the backend.
+
+        :param client: the Redis client, by default connected to
+            ``CIRCULATION_VIEW_CACHE_REDIS_URL``.
+        """
+        if client is None:
+            import redis
+            client = redis.StrictRedis.from_url(
+                app.config['CIRCULATION_VIEW_CACHE_REDIS_URL'])
+        self.client = client
+
+    def get_many(self, keys):
+        """Return the values of several keys, ``None`` for missing ones."""
+        return self.client.mget(keys)
+
+    def set(self, key, value, timeout=None):
+        """Set the value of a key, expiring after ``timeout`` seconds."""
+        self.client.set(key, value, ex=timeout or None)
+
+
+class ResponseCache(object):
+    """Cache of view responses, invalidated by loan transitions."""
+
+    prefix = 'circulation:view:'
+    """Prefix of the cache keys."""
+
+    def __init__(self, backend, timeout=None):
+        """Initialize the cache.
+
+        :param backend: the cache backend, e.g. :class:`LRUCacheBackend`.
+        :param timeout: seconds after which cached responses expire.
+        """
+        self.backend = backend
+        self.timeout = timeout
+
+    def _version_key(self, scope):
+        """Return the key of the version of a scope."""
+        return '{0}version:{1}'.format(self.prefix, scope)
+
+    def make_key(self, scope=None):
+        """Return the key of the response of the current request."""
+        version = None
+        if scope is not None:
+            version = self.backend.get_many([self._version_key(scope)])[0]
+            if isinstance(version, bytes):
+                version = version.decode('ascii')
+        parts = [
+            request.endpoint, request.full_path, str(get_locale()),
+            current_app.config['CIRCULATION_BASE_TEMPLATE'], scope,
+            version or '0',
+        ]
+        digest = hashlib.sha1(
+            json.dumps(parts).encode('utf-8')).hexdigest()
+        return '{0}response:{1}'.format(self.prefix, digest)
+
+    def get(self, key):
+        """Return a cached response, or ``None``."""
+        value = self.backend.get_many([key])[0]
+        if value is None:
+            return None
+        if isinstance(value, bytes):
+            value = value.decode('utf-8')
+        data = json.loads(value)
+        response = current_app.response_class(
+            data['body'], status=data['status'],
+            content_type=data['content_type'])
+        response.set_etag(data['etag'])
+        return response
+
+    def set(self, key, response):
+        """Cache a response, with an ETag of its content."""
+        response.add_etag()
+        self.backend.set(key, json.dumps(dict(
+            body=response.get_data(as_text=True),
+            status=response.status_code,
+            content_type=response.content_type,
+            etag=response.get_etag()[0],
+        )), timeout=self.timeout)
+
+    def invalidate(self, scopes):
+        """Invalidate the cached responses of several scopes."""
+        for scope in scopes:
+            self.backend.set(self._version_key(scope), uuid.uuid4().hex)
+
+    def on_loan_state_changed(self, sender, changes=None, **kwargs):
+        """Invalidate the scopes of the items and patrons of transitions."""
+        scopes = set()
+        for change in changes or ():
+            for loan in (change.previous, change.loan):
+                if loan:
+                    scopes.add('item:{0}'.format(loan.get('item_pid')))
+                    scopes.add('patron:{0}'.format(loan.get('patron_pid')))
+        self.invalidate(sorted(scopes))
+
+
+def _personal():
+    """Check if the response of the current request may depend on the user.
+
+    It is the case when the session has been read, e.g. by Flask-Login to
+    load the current user. Sessions which cannot tell always count as read.
+    """
+    return getattr(session, 'accessed', True)
+
+
+def cached(scope=None):
+    """Cache the responses of a view.
+
+    Only successful ``GET`` responses without cookies are cached, and only
+    when they do not depend on the user: views reading the session, e.g. to
+    show the logged in user, bypass the cache. Responses get an ETag,
+    and conditional requests are answered with ``304``.
+
+    :param scope: format string of the scope of the responses, with the view
+        arguments, e.g. ``'item:{item_pid}'``. Responses without scope are
+        only invalidated by the cache timeout.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            cache = current_circulation.view_cache
+            if cache is None or request.method != 'GET' or _personal():
+                return view(*args, **kwargs)
+            key = cache.make_key(
+                scope.format(**kwargs) if scope is not None else None)
+            response = cache.get(key)
+            if response is None:
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code != 200 or \
+                        'Set-Cookie' in response.headers or _personal():
+                    return response
+                cache.set(key, response)
+            return response.make_conditional(request)
+        return wrapper
+    return decorator
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 CERN.
+#
+# Invenio-Circulation is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Opening calendars of locations."""
+
+from __future__ import absolute_import, print_function
+
+import threading
+from datetime import date, timedelta
+
+import numpy as np
+
+from .policies import to_dates
+
+_MISSING = object()
+
+
+class LocationCalendars(object):
+    """Cache of the open days of locations.
+
+    For each location, the open days of a window of dates are precomputed
+    once into a sorted ``datetime64[D]`` array, so that finding the next
+    open day is a binary search. The window covers at least
+    ``CIRCULATION_LOCATION_CALENDAR_HORIZON`` days after today and is
+    widened when a date outside of it is requested.
+
+    Cached calendars must be invalidated with :meth:`invalidate` when a
+    calendar changes.
+    """
+
+    def __init__(self, loader, horizon):
+        """Initialize the cache.
+
+        :param loader: callable returning the calendar of a location PID, or
+            ``None`` if the location is always open. See
+            :data:`invenio_circulation.config.CIRCULATION_LOCATION_CALENDARS`
+            for the calendar format.
+        :param horizon: minimum number of days after today to precompute.
+        """
+        self.loader = loader
+        self.horizon = horizon
+        self._lock = threading.Lock()
+        self._cache = {}
+
+    def _compute(self, calendar, start, end):
+        """Return the sorted array of open days between two dates."""
+        days = np.arange(start, end + np.timedelta64(1, 'D'),
+                         dtype='datetime64[D]')
+        # 1970-01-01 was a Thursday, i.e. weekday 3 counting from Monday.
+        weekdays = (days.astype('int64') + 3) % 7
+        is_open = np.isin(weekdays, calendar.get('weekdays', range(7)))
+        is_open[np.isin(days, to_dates(calendar.get('closed', [])))] = False
+        is_open[np.isin(days, to_dates(calendar.get('open', [])))] = True
+        return days[is_open]
+
+    def _open_days(self, location_pid, first, last):
+        """Return the cached window of open days covering two dates.
+
+        :returns: a tuple ``(start, end, open_days)``, or ``None`` if the
+            location has no calendar.
+        """
+        entry = self._cache.get(location_pid, _MISSING)
+        if entry is None:
+            return entry
+        if entry is not _MISSING and entry[0] <= first and last <= entry[1]:
+            return entry
+
+        calendar = self.loader(location_pid)
+        if calendar is None:
+            entry = None
+        else:
+            today = np.datetime64(date.today(), 'D')
+            start = min(first, today)
+            end = max(last + np.timedelta64(31, 'D'),
+                      today + np.timedelta64(self.horizon, 'D'))
+            if entry is not _MISSING:
+                start, end = min(start, entry[0]), max(end, entry[1])
+            entry = (start, end, self._compute(calendar, start, end))
+        with self._lock:
+            self._cache[location_pid] = entry
+        return entry
+
+    def next_open_days(self, location_pid, dates):
+        """Return the first open day on or after each date.
+
+        :param location_pid: the location PID.
+        :param dates: ``datetime64[D]`` array of dates, ``NaT`` values are
+            left unchanged.
+        :returns: a ``datetime64[D]`` array. Dates without any open day in
+            the precomputed window are left unchanged.
+        """
+        dates = to_dates(dates)
+        valid = dates[~np.isnat(dates)]
+        if location_pid is None or not len(valid):
+            return dates
+        entry = self._open_days(location_pid, valid.min(), valid.max())
+        if entry is None:
+            return dates
+        open_days = entry[2]
+        positions = np.searchsorted(open_days, dates)
+        found = (positions < len(open_days)) & ~np.isnat(dates)
+        result = dates.copy()
+        result[found] = open_days[positions[found]]
+        return result
+
+    def next_open_day(self, location_pid, start, days=0):
+        """Return the first open day ``days`` days after ``start``.
+
+        :param location_pid: the location PID.
+        :param start: a date or an ISO date.
+        :param days: number of days to add to ``start``.
+        :returns: the ISO date of the open day.
+        """
+        value = np.datetime64(str(start)[:10], 'D') + np.timedelta64(days, 'D')
+        return str(self.next_open_days(location_pid, [value])[0])
+
+    def next_open_days_per_location(self, location_pids, dates):
+        """Return the first open day on or after each date at its location.
+
+        :param location_pids: array of location PIDs, one per date.
+        :param dates: ``datetime64[D]`` array of dates.
+        """
+        location_pids = np.asarray(location_pids, dtype=object)
+        result = to_dates(dates).copy()
+        for location_pid in set(location_pids.tolist()):
+            mask = location_pids == location_pid
+            result[mask] = self.next_open_days(location_pid, result[mask])
+        return result
+
+    def invalidate(self, location_pid=None):
+        """Drop the cached open days of a location, or of all locations."""
+        with self._lock:
+            if location_pid is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(location_pid, None)
+
+    def on_calendar_changed(self, sender, location_pid=None, **kwargs):
+        """Invalidate the cache when a location calendar changes."""
+        self.invalidate(location_pid)
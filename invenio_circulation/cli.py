@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 CERN.
+#
+# Invenio-Circulation is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Circulation command line interface."""
+
+from __future__ import absolute_import, print_function
+
+import csv
+import json
+import os
+import sys
+from datetime import datetime
+from itertools import islice
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from .proxies import current_circulation
+from .signals import loan_state_changed
+
+FORMATS = ('ndjson', 'csv')
+"""Supported loan file formats."""
+
+_CSV_INTEGER_FIELDS = ('extension_count', )
+
+
+def _read_checkpoint(path):
+    """Return the content of a checkpoint file, or ``None``."""
+    if path and os.path.exists(path):
+        with open(path) as fp:
+            return fp.read().strip() or None
+    return None
+
+
+def _write_checkpoint(path, value):
+    """Atomically replace the content of a checkpoint file."""
+    if path:
+        tmp = '{0}.tmp'.format(path)
+        with open(tmp, 'w') as fp:
+            fp.write(str(value))
+        os.rename(tmp, path)
+
+
+def _chunks(iterable, size):
+    """Split an iterable in lists of at most ``size`` elements."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _writer(fp, fmt, fields, header):
+    """Return a function writing one loan to a file."""
+    if fmt == 'ndjson':
+        return lambda loan: fp.write(json.dumps(loan, sort_keys=True) + '\n')
+    writer = csv.DictWriter(fp, fields, extrasaction='ignore')
+    if header:
+        writer.writeheader()
+    return writer.writerow
+
+
+def _reader(fp, fmt):
+    """Iterate over the loans of a file."""
+    if fmt == 'ndjson':
+        for line in fp:
+            if line.strip():
+                yield json.loads(line)
+        return
+    for row in csv.DictReader(fp):
+        loan = dict((key, value) for key, value in row.items() if value)
+        for field in _CSV_INTEGER_FIELDS:
+            if field in loan:
+                loan[field] = int(loan[field])
+        yield loan
+
+
+@click.group()
+def circulation():
+    """Circulation commands."""
+
+
+@circulation.group()
+def loans():
+    """Loan commands."""
+
+
+@loans.command('export')
+@click.argument('output', type=click.Path(dir_okay=False, allow_dash=True))
+@click.option('--format', '-f', 'fmt', type=click.Choice(FORMATS),
+              default='ndjson', show_default=True)
+@click.option('--state', '-s', 'states', multiple=True,
+              help='Only export loans in this state.')
+@click.option('--chunk-size', type=int, default=1000, show_default=True,
+              help='Number of loans read at once.')
+@click.option('--checkpoint', type=click.Path(dir_okay=False),
+              help='File recording the progress, to resume an export.')
+@with_appcontext
+def export_loans(output, fmt, states, chunk_size, checkpoint):
+    """Export loans to OUTPUT, ordered by PID.
+
+    Loans are read and written by chunks, so the memory use does not depend
+    on the number of loans. With a checkpoint, an interrupted export is
+    resumed by appending to OUTPUT.
+    """
+    after = _read_checkpoint(checkpoint)
+    mode = 'a' if after else 'w'
+    fields = current_app.config['CIRCULATION_EXPORT_CSV_FIELDS']
+    count = 0
+    with click.open_file(output, mode) as fp:
+        write = _writer(fp, fmt, fields, header=not after)
+        loans = current_circulation.loan_store.iter_loans(
+            after=after, chunk_size=chunk_size, states=states or None)
+        for chunk in _chunks(loans, chunk_size):
+            for loan in chunk:
+                write(loan)
+            fp.flush()
+            count += len(chunk)
+            _write_checkpoint(checkpoint, chunk[-1]['loan_pid'])
+    click.secho('Exported {0} loans.'.format(count), err=True, fg='green')
+
+
+@loans.command('import')
+@click.argument('source', type=click.Path(dir_okay=False, allow_dash=True))
+@click.option('--format', '-f', 'fmt', type=click.Choice(FORMATS),
+              default='ndjson', show_default=True)
+@click.option('--chunk-size', type=int, default=1000, show_default=True,
+              help='Number of loans written at once.')
+@click.option('--checkpoint', type=click.Path(dir_okay=False),
+              help='File recording the progress, to resume an import.')
+@with_appcontext
+def import_loans(source, fmt, chunk_size, checkpoint):
+    """Import loans from SOURCE.
+
+    Loans are written by chunks, each chunk in one transaction. Existing
+    loans with the same PID are replaced. With a checkpoint, an interrupted
+    import skips the loans already imported.
+    """
+    from .api import LoanChange
+    done = int(_read_checkpoint(checkpoint) or 0)
+    store = current_circulation.loan_store
+    app = current_app._get_current_object()
+    count = 0
+    with click.open_file(source) as fp:
+        records = islice(_reader(fp, fmt), done, None)
+        for chunk in _chunks(records, chunk_size):
+            previous = store.get_many([loan['loan_pid'] for loan in chunk])
+            store.put_many(chunk)
+            loan_state_changed.send(app, changes=[
+                LoanChange('import', before, loan)
+                for before, loan in zip(previous, chunk)
+            ])
+            count += len(chunk)
+            _write_checkpoint(checkpoint, done + count)
+    click.secho('Imported {0} loans.'.format(count), err=True, fg='green')
+
+
+@loans.command('archive')
+@click.option('--age', type=int,
+              help='Minimum age of the loans in days, defaults to '
+                   'CIRCULATION_ARCHIVE_AGE.')
+@with_appcontext
+def archive(age):
+    """Move old finished loans to the loan archive.
+
+    The command can be run again safely after an interruption.
+    """
+    from .archive import archive_loans
+    count = archive_loans(age=age)
+    click.secho('Archived {0} loans.'.format(count), err=True, fg='green')
+
+
+@loans.command('extend-location')
+@click.argument('location_pid')
+@click.argument('end_date')
+@with_appcontext
+def extend_location(location_pid, end_date):
+    """Postpone to END_DATE the loans of LOCATION_PID due until then.
+
+    Use it when a location closes, with the reopening day as END_DATE.
+    """
+    from .renewals import extend_location_loans
+    datetime.strptime(end_date, '%Y-%m-%d')
+    results = extend_location_loans(location_pid, end_date)
+    click.secho('Extended {0} loans.'.format(sum(
+        1 for result in results if result.loan)), err=True, fg='green')
+
+
+@circulation.group()
+def limits():
+    """Patron limit commands."""
+
+
+@limits.command('reconcile')
+@with_appcontext
+def reconcile_limits():
+    """Rebuild the patron loan counters from the loans.
+
+    Wrong counters are fixed and listed.
+    """
+    drift = current_circulation.limits.reconcile()
+    for (patron_pid, item_type), (counter, actual) in sorted(
+            drift.items(), key=lambda item: (item[0][0], item[0][1] or '')):
+        click.echo('{0}\t{1}\t{2}\t{3}'.format(
+            patron_pid, item_type or '', counter, actual))
+    click.secho('Fixed {0} counters.'.format(len(drift)), err=True,
+                fg='yellow' if drift else 'green')
+
+
+@circulation.group()
+def notices():
+    """Loan notice commands."""
+
+
+@notices.command('send')
+@click.option('--date', 'today', help='Day of the notices, as YYYY-MM-DD.')
+@click.option('--queue', is_flag=True,
+              help='Send the chunks of patrons in parallel with Celery.')
+@with_appcontext
+def send_notices(today, queue):
+    """Send the reminders, overdue notices and recalls of a day.
+
+    Notices already sent are skipped, so the command can be run again
+    safely.
+    """
+    if queue:
+        from .tasks import send_notices as task
+        count = task(today)
+        click.secho('Queued {0} chunks.'.format(count), err=True, fg='green')
+        return
+    from .notifications import prepare_notices, send_notice_chunk
+    if today:
+        today = datetime.strptime(today, '%Y-%m-%d').date()
+    count = 0
+    with click.progressbar(prepare_notices(today), file=sys.stderr,
+                           label='Sending notices') as chunks:
+        for chunk in chunks:
+            count += send_notice_chunk(chunk)
+    click.secho('Sent {0} notices.'.format(count), err=True, fg='green')
+
+
+@circulation.command('kiosk')
+@click.option('--host', default='127.0.0.1', show_default=True)
+@click.option('--port', type=int, default=6001, show_default=True)
+@with_appcontext
+def kiosk(host, port):
+    """Serve the kiosk protocol, requires Python 3.5 or later."""
+    import asyncio
+    from .aio import AsyncCirculation, KioskServer
+    app = current_app._get_current_object()
+    server = KioskServer(AsyncCirculation(app))
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    loop.run_until_complete(server.start(host, port))
+    click.secho('Serving kiosks on {0}:{1}.'.format(host, port), err=True,
+                fg='green')
+    loop.run_forever()
@@ -15,3 +15,430 @@ CIRCULATION_DEFAULT_VALUE = 'foobar'
 
 CIRCULATION_BASE_TEMPLATE = 'invenio_circulation/base.html'
 """Default base template for the demo page."""
+
+CIRCULATION_LOAN_STORE = 'invenio_circulation.storage:MemoryLoanStore'
+"""Class or import path of the loan store.
+
+The class is instantiated with the application. Available stores:
+
+- :class:`invenio_circulation.storage.MemoryLoanStore` keeps loans in
+  process memory, for tests and benchmarks.
+- :class:`invenio_circulation.storage.SQLAlchemyLoanStore` keeps loans in
+  the database, requires Invenio-DB.
+"""
+
+CIRCULATION_LOAN_INITIAL_STATE = 'CREATED'
+"""State of a loan before any transition has been applied to it."""
+
+CIRCULATION_LOAN_TRANSITIONS = {
+    'CREATED': [
+        dict(dest='PENDING', trigger='request'),
+        dict(dest='ITEM_ON_LOAN', trigger='checkout'),
+    ],
+    'PENDING': [
+        dict(dest='ITEM_AT_DESK', trigger='validate_request'),
+        dict(dest='ITEM_ON_LOAN', trigger='checkout'),
+        dict(dest='CANCELLED', trigger='cancel'),
+    ],
+    'ITEM_AT_DESK': [
+        dict(dest='ITEM_ON_LOAN', trigger='checkout'),
+        dict(dest='CANCELLED', trigger='cancel'),
+    ],
+    'ITEM_ON_LOAN': [
+        dict(dest='ITEM_ON_LOAN', trigger='extend'),
+        dict(dest='ITEM_RETURNED', trigger='checkin'),
+        dict(dest='CANCELLED', trigger='cancel'),
+    ],
+    'ITEM_RETURNED': [],
+    'CANCELLED': [],
+}
+"""Loan state machine.
+
+Maps each loan state to the list of transitions leaving it. A transition is
+a dictionary with the ``trigger`` (the circulation action) and the ``dest``
+state reached by applying it. States without outgoing transitions are final.
+The table is compiled once per application, see
+:class:`invenio_circulation.transitions.LoanTransitions`.
+"""
+
+CIRCULATION_LOAN_ON_LOAN_STATES = ['ITEM_ON_LOAN']
+"""Loan states in which the item is lent to the patron.
+
+Entering one of these states starts the loan period, and a transition from
+one of these states to itself extends it.
+"""
+
+CIRCULATION_LOAN_ITEM_UNAVAILABLE_STATES = ['ITEM_AT_DESK']
+"""Other loan states in which the item cannot be lent to another patron.
+
+When a loan leaves these states and the on loan states, the item is
+assigned to its next hold with the ``validate_request`` trigger.
+"""
+
+CIRCULATION_LOAN_PENDING_STATES = ['PENDING']
+"""Loan states of requests waiting for the item."""
+
+CIRCULATION_CONFLICT_RETRIES = 3
+"""Number of times a circulation action is retried after a conflict.
+
+A conflict happens when loans of the same items are written concurrently,
+e.g. by two desks or application workers. The action is then computed again
+from the current loans.
+"""
+
+CIRCULATION_CONFLICT_RETRY_DELAY = 0.01
+"""Base delay in seconds before retrying after a conflict.
+
+The delay is doubled after each retry and randomized, so that conflicting
+workers do not retry in lockstep.
+"""
+
+CIRCULATION_CLIENT_LOAN_FIELDS = [
+    'item_pid', 'patron_pid', 'loan_pid', 'transaction_location_pid',
+    'transaction_user_pid', 'pickup_location_pid',
+]
+"""Loan fields which clients of the bulk endpoint and kiosks can send.
+
+Operations with other fields, or with values which are not strings, are
+rejected. Fields selecting the policy of a loan, such as ``item_type`` and
+``patron_category``, are set from the item and patron records by
+:data:`CIRCULATION_LOAN_ENRICHER`, not by clients.
+"""
+
+CIRCULATION_LOAN_ENRICHER = 'invenio_circulation.api:enrich_loan'
+"""Function returning the fields of a new loan read from its item and patron.
+
+It is called with each loan created by an action, which has an ``item_pid``
+and a ``patron_pid``, and returns a dictionary of loan fields to set, e.g.
+the ``item_type``, ``library_pid`` and ``item_location_pid`` of the item
+record and the ``patron_category`` of the patron record. They select the
+policy of the loan, the priority of holds and the home location of items.
+Fields given to the API functions take precedence. The default sets no
+field.
+"""
+
+CIRCULATION_ACTION_PERMISSION_FACTORY = \
+    'invenio_circulation.permissions:deny_all'
+"""Function returning the permission to apply an action from a view.
+
+It is called with the action, e.g. ``checkout``, and returns an object
+whose ``can()`` method tells if the current user can apply it, e.g. an
+Invenio-Access ``Permission``. Applies to the bulk and renew all endpoints.
+"""
+
+CIRCULATION_LOAN_READ_PERMISSION_FACTORY = \
+    'invenio_circulation.permissions:deny_all'
+"""Function returning the permission to read loans from a view.
+
+It is called with what is read and returns an object whose ``can()`` method
+tells if the current user can read it: without arguments to search loans,
+with the ``loan`` to fetch one, with the ``patron_pid`` of a patron to list
+its history or show its summary and with the ``location_pid`` of a location
+to list its arrivals. Applies to all endpoints of the REST API, to the
+patron summary and to the event stream for each of its patrons and
+locations.
+"""
+
+CIRCULATION_DEFAULT_POLICY = dict(
+    loan_duration=28,
+    extension_duration=28,
+    grace_period=0,
+    fine_rate=0.1,
+    max_fine=10.0,
+    max_extensions=None,
+    max_loans=None,
+    max_overdue_loans=None,
+    max_fines=None,
+)
+"""Default circulation policy.
+
+- ``loan_duration``: number of days of a loan.
+- ``extension_duration``: number of days added by an extension, counted
+  from the current due date or from today if the loan is overdue.
+- ``grace_period``: number of days after the due date before a loan is
+  considered overdue.
+- ``fine_rate``: fine per overdue day.
+- ``max_fine``: maximum fine of a loan, ``None`` for no maximum.
+- ``max_extensions``: maximum number of extensions of a loan, ``None`` for
+  no maximum.
+- ``max_loans``: maximum number of items of the same item type on loan to
+  a patron, ``None`` for no maximum.
+- ``max_overdue_loans``: a patron with more overdue loans cannot borrow,
+  ``None`` for no maximum.
+- ``max_fines``: a patron with more fines cannot borrow, ``None`` for no
+  maximum.
+"""
+
+CIRCULATION_POLICY_RULES = []
+"""Circulation policy rules overriding the default policy.
+
+Each rule is a dictionary with the policy fields to override and the
+``patron_category``, ``item_type``, ``location_pid`` and ``library_pid`` it
+applies to, a missing value or ``'*'`` matching any value. For example::
+
+    CIRCULATION_POLICY_RULES = [
+        dict(item_type='dvd', loan_duration=7, max_extensions=1),
+        dict(patron_category='staff', item_type='dvd', loan_duration=14),
+    ]
+
+Each field of a policy is taken from the most specific matching rule. Rules
+with more concrete values are more specific, then a concrete patron category
+is more specific than a concrete item type, which is more specific than a
+concrete location and than a concrete library. The matrix is read from the
+loan ``patron_category``, ``item_type``, ``transaction_location_pid`` and
+``library_pid`` fields.
+"""
+
+CIRCULATION_AVAILABILITY_MAX_AGE = None
+"""Seconds after which the item availability index is rebuilt.
+
+The availability index is kept in the memory of each process, and only
+follows the loan transitions committed by that process. When several
+processes share the loan store, e.g. application workers with the
+:class:`~invenio_circulation.storage.SQLAlchemyLoanStore`, set it to bound
+how stale the item statuses can be. ``None`` never rebuilds the index,
+which is only exact with a single process.
+"""
+
+CIRCULATION_LOCATION_CALENDARS = {}
+"""Opening calendars of locations, keyed by location PID.
+
+A calendar is a dictionary with:
+
+- ``weekdays``: list of the weekdays on which the location is open, from
+  ``0`` (Monday) to ``6`` (Sunday). Defaults to every day.
+- ``closed``: list of ISO dates on which the location is exceptionally
+  closed, e.g. holidays.
+- ``open``: list of ISO dates on which the location is exceptionally open.
+
+Due dates are moved to the next open day of the location of the loan.
+Locations without a calendar are considered always open.
+"""
+
+CIRCULATION_LOCATION_CALENDAR_LOADER = None
+"""Function or import path returning the calendar of a location PID.
+
+Defaults to reading :data:`CIRCULATION_LOCATION_CALENDARS`. After a
+calendar has changed, send the
+:data:`invenio_circulation.signals.location_calendar_changed` signal.
+"""
+
+CIRCULATION_LOCATION_CALENDAR_HORIZON = 730
+"""Number of days after today for which open days are precomputed."""
+
+CIRCULATION_PATRON_SUMMARY_CACHE_SIZE = 10000
+"""Maximum number of patrons kept in the patron summary cache."""
+
+CIRCULATION_PATRON_SUMMARY_MAX_AGE = None
+"""Seconds after which a patron summary is loaded again from the loan store.
+
+The patron summary cache is kept in the memory of each process, and only
+follows the loan transitions committed by that process. When several
+processes share the loan store, e.g. application workers with the
+:class:`~invenio_circulation.storage.SQLAlchemyLoanStore`, set it to bound
+how stale the summaries shown to patrons can be. The overdue loans and
+fines blocking patrons are always read from the loan store. ``None`` keeps
+summaries until they are evicted, which is only exact with a single process.
+"""
+
+CIRCULATION_HOLD_PRIORITIES = {}
+"""Hold priority of patron categories.
+
+Holds are served by increasing priority, then by request date.
+"""
+
+CIRCULATION_HOLD_DEFAULT_PRIORITY = 100
+"""Hold priority of patron categories missing from
+:data:`CIRCULATION_HOLD_PRIORITIES`."""
+
+CIRCULATION_HOLD_QUEUE_CACHE_SIZE = 10000
+"""Maximum number of item hold queues kept in memory per process.
+
+Queues without holds and the least recently used queues are dropped, and
+loaded again from the loan store when needed.
+"""
+
+CIRCULATION_METRICS_ENABLED = False
+"""Collect the duration of the stages of circulation actions."""
+
+CIRCULATION_METRICS_SINK = 'invenio_circulation.metrics:InProcessMetrics'
+"""Class or import path of the metrics sink, instantiated with the app.
+
+The in-process sink is exported in the Prometheus text format on the
+``/metrics`` endpoint.
+"""
+
+CIRCULATION_METRICS_BUCKETS = [
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+    0.25, 0.5, 1.0,
+]
+"""Upper bounds, in seconds, of the buckets of the duration histograms."""
+
+CIRCULATION_INDEXER_BULK_HANDLER = None
+"""Function or import path sending a list of Elasticsearch bulk actions.
+
+Loans and items are only indexed when it is set, e.g. to
+:func:`invenio_circulation.indexer.search_bulk_handler` which requires
+Invenio-Search.
+"""
+
+CIRCULATION_INDEXER_QUEUE = \
+    'invenio_circulation.indexer:InProcessIndexerQueue'
+"""Class or import path of the indexer queue, instantiated with the app.
+
+The default queue is kept in the memory of each process, and flushed by a
+background thread of the process. Use
+:class:`invenio_circulation.indexer.KombuIndexerQueue` to flush the queue
+with the :func:`~invenio_circulation.tasks.process_loan_indexer_queue`
+Celery task, which requires it.
+"""
+
+CIRCULATION_INDEXER_WINDOW = 5
+"""Seconds during which the changes of a document are indexed together."""
+
+CIRCULATION_INDEXER_CHUNK_SIZE = 500
+"""Maximum number of documents per bulk request."""
+
+CIRCULATION_INDEXER_BROKER_URL = None
+"""Broker of the Kombu indexer queue, defaults to ``BROKER_URL``."""
+
+CIRCULATION_INDEXER_MQ_NAME = 'circulation-indexer'
+"""Name of the exchange, queue and routing key of the Kombu indexer
+queue."""
+
+CIRCULATION_INDEXER_LOAN_INDEX = 'loans'
+"""Elasticsearch index of loans."""
+
+CIRCULATION_INDEXER_LOAN_DOC_TYPE = 'loan'
+"""Elasticsearch document type of loans."""
+
+CIRCULATION_INDEXER_ITEM_INDEX = 'circulation-items'
+"""Elasticsearch index of item availabilities."""
+
+CIRCULATION_INDEXER_ITEM_DOC_TYPE = 'item'
+"""Elasticsearch document type of item availabilities."""
+
+CIRCULATION_EXPORT_CSV_FIELDS = [
+    'loan_pid', 'item_pid', 'patron_pid', 'state', 'transaction_date',
+    'transaction_location_pid', 'request_date', 'start_date', 'end_date',
+    'extension_count',
+]
+"""Loan fields written by ``flask circulation loans export -f csv``."""
+
+CIRCULATION_REST_DEFAULT_PAGE_SIZE = 25
+"""Number of loans per page of the REST API, unless ``size`` is given."""
+
+CIRCULATION_REST_MAX_PAGE_SIZE = 1000
+"""Maximum ``size`` of a page of the REST API."""
+
+CIRCULATION_NOTICE_REMINDER_DAYS = [3]
+"""Send reminders this number of days before the due date of loans."""
+
+CIRCULATION_NOTICE_OVERDUE_DAYS = [1, 7, 30]
+"""Send overdue notices this number of days after the due date of loans."""
+
+CIRCULATION_NOTICE_RECALLS = True
+"""Send recalls for the loans of items requested by other patrons."""
+
+CIRCULATION_NOTICE_CHUNK_SIZE = 500
+"""Number of patrons whose notices are sent by one task."""
+
+CIRCULATION_NOTICE_TEMPLATE = 'invenio_circulation/notices.txt'
+"""Template of the notices sent to a patron."""
+
+CIRCULATION_NOTICE_SENDER = 'invenio_circulation.notifications:log_notice'
+"""Function sending the rendered notices of a patron.
+
+It is called with the patron PID, the rendered notices and the list of
+notices.
+"""
+
+CIRCULATION_NOTICE_LOG = 'invenio_circulation.notifications:MemoryNoticeLog'
+"""Class of the log of sent notices, which prevents sending them twice.
+
+Use ``invenio_circulation.notifications:SQLAlchemyNoticeLog`` to share the
+log between processes.
+"""
+
+CIRCULATION_NOTICE_CLAIM_TIMEOUT = 3600
+"""Seconds after which notices claimed but not sent can be claimed again."""
+
+CIRCULATION_ITEM_LOCATION = 'invenio_circulation.api:get_item_location'
+"""Function returning the home location of the item of a loan.
+
+Items returned elsewhere are sent back in transit to their home location,
+unless they are assigned to a hold, in which case they are sent to the
+``pickup_location_pid`` of the hold.
+"""
+
+CIRCULATION_ARCHIVE_AGE = 365
+"""Days after which loans in a final state are moved to the archive."""
+
+CIRCULATION_ARCHIVE_PATH = None
+"""Directory of the loan archive.
+
+Archived loans are only found in this directory, so it must be on a storage
+shared by all the nodes of the application, e.g. a network file system, and
+is required with a shared loan store such as the
+:class:`~invenio_circulation.storage.SQLAlchemyLoanStore`. With the
+in-memory loan store, defaults to ``circulation-archive`` in the instance
+path of the application.
+"""
+
+CIRCULATION_ARCHIVE_CHUNK_SIZE = 10000
+"""Number of loans per archive segment."""
+
+CIRCULATION_ARCHIVE_INDEX_CACHE_SIZE = 64
+"""Number of patron indexes of archive segments kept in memory per process.
+
+The least recently used indexes are dropped and read again from disk when
+needed.
+"""
+
+CIRCULATION_VIEW_CACHE_BACKEND = 'invenio_circulation.cache:LRUCacheBackend'
+"""Class of the backend of the view response cache, ``None`` to disable it.
+
+Use ``invenio_circulation.cache:RedisCacheBackend`` to share the cache
+between processes. Responses are shared by all users, so the responses of
+views reading the session, e.g. a base template showing the logged in user,
+are not cached.
+"""
+
+CIRCULATION_VIEW_CACHE_TIMEOUT = 300
+"""Seconds after which cached view responses expire."""
+
+CIRCULATION_VIEW_CACHE_SIZE = 1024
+"""Maximum number of responses kept by the in-process cache backend."""
+
+CIRCULATION_VIEW_CACHE_REDIS_URL = 'redis://localhost:6379/0'
+"""Redis server of the Redis cache backend."""
+
+CIRCULATION_EVENTS_QUEUE_SIZE = 100
+"""Maximum number of events queued for a subscriber.
+
+The oldest events of slower subscribers are dropped.
+"""
+
+CIRCULATION_EVENTS_BROKER = None
+"""Class of the broker sending events to all processes, ``None`` for none.
+
+Without broker, the event streams only receive the events of the
+transitions made by the process serving them, so they miss most events
+when the application runs several processes, e.g. gunicorn workers. Use
+``invenio_circulation.events:RedisEventBroker`` in that case.
+"""
+
+CIRCULATION_EVENTS_REDIS_URL = 'redis://localhost:6379/0'
+"""Redis server of the Redis event broker."""
+
+CIRCULATION_EVENTS_KEEPALIVE = 15
+"""Seconds after which an idle event stream sends a keep-alive comment."""
+
+CIRCULATION_ASYNC_WORKERS = 8
+"""Number of threads running the actions of the asyncio service."""
+
+CIRCULATION_KIOSK_IDLE_TIMEOUT = 600
+"""Seconds after which idle kiosk connections are closed.
+
+``None`` keeps them open.
+"""
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 CERN.
+#
+# Invenio-Circulation is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Circulation exceptions."""
+
+from __future__ import absolute_import, print_function
+
+
+class CirculationException(Exception):
+    """Base exception for circulation errors."""
+
+    code = 400
+    """HTTP status code used when the error reaches a view."""
+
+
+class CirculationConfigError(Exception):
+    """Base exception for inconsistent circulation configurations.
+
+    These are server errors, they are not answered to clients as circulation
+    errors.
+    """
+
+
+class InvalidLoanTransitionError(CirculationException):
+    """The requested trigger is not allowed from the current loan state."""
+
+    def __init__(self, state, trigger):
+        """Initialize exception."""
+        self.state = state
+        self.trigger = trigger
+        super(InvalidLoanTransitionError, self).__init__(
+            'Cannot apply "{0}" to a loan in state "{1}".'.format(
+                trigger, state))
+
+
+class LoanTransitionsConfigError(CirculationConfigError):
+    """The configured loan state machine is not consistent."""
+
+
+class LoanNotFoundError(CirculationException):
+    """No loan of the item can be used for the requested action."""
+
+    code = 404
+
+    def __init__(self, item_pid, trigger):
+        """Initialize exception."""
+        self.item_pid = item_pid
+        self.trigger = trigger
+        super(LoanNotFoundError, self).__init__(
+            'No loan found for "{0}" on item "{1}".'.format(
+                trigger, item_pid))
+
+
+class ItemNotAvailableError(CirculationException):
+    """The item is already on loan."""
+
+    def __init__(self, item_pid):
+        """Initialize exception."""
+        self.item_pid = item_pid
+        super(ItemNotAvailableError, self).__init__(
+            'Item "{0}" is not available.'.format(item_pid))
+
+
+class LoanConflictError(CirculationException):
+    """Loans were modified concurrently since they were read."""
+
+    code = 409
+
+    def __init__(self, item_pids):
+        """Initialize exception."""
+        self.item_pids = sorted(item_pids)
+        super(LoanConflictError, self).__init__(
+            'Loans of items {0} were modified concurrently.'.format(
+                ', '.join('"{0}"'.format(pid) for pid in self.item_pids)))
+
+
+class LoanFieldNotAllowedError(CirculationException):
+    """A client tried to set a loan field it is not allowed to set."""
+
+    def __init__(self, field):
+        """Initialize exception."""
+        self.field = field
+        super(LoanFieldNotAllowedError, self).__init__(
+            'Loan field "{0}" cannot be set.'.format(field))
+
+
+class InvalidLoanFieldError(CirculationException):
+    """A client sent a loan field with a value of the wrong type."""
+
+    def __init__(self, field):
+        """Initialize exception."""
+        self.field = field
+        super(InvalidLoanFieldError, self).__init__(
+            'Loan field "{0}" must be a string.'.format(field))
+
+
+class LoanMaxExtensionsError(CirculationException):
+    """The loan has reached the maximum number of extensions."""
+
+    def __init__(self, loan_pid, max_extensions):
+        """Initialize exception."""
+        self.loan_pid = loan_pid
+        self.max_extensions = max_extensions
+        super(LoanMaxExtensionsError, self).__init__(
+            'Loan "{0}" cannot be extended more than {1} times.'.format(
+                loan_pid, max_extensions))
+
+
+class LoanOnHoldError(CirculationException):
+    """The item of the loan is requested by another patron."""
+
+    def __init__(self, loan_pid):
+        """Initialize exception."""
+        self.loan_pid = loan_pid
+        super(LoanOnHoldError, self).__init__(
+            'Loan "{0}" cannot be extended, its item is requested.'.format(
+                loan_pid))
+
+
+class PatronMaxLoansError(CirculationException):
+    """The patron has reached the maximum number of loans."""
+
+    def __init__(self, patron_pid, item_type, max_loans):
+        """Initialize exception."""
+        self.patron_pid = patron_pid
+        self.item_type = item_type
+        self.max_loans = max_loans
+        super(PatronMaxLoansError, self).__init__(
+            'Patron "{0}" cannot have more than {1} loans of type '
+            '"{2}".'.format(patron_pid, max_loans, item_type))
+
+
+class PatronBlockedError(CirculationException):
+    """The patron is blocked by overdue loans or fines."""
+
+    def __init__(self, patron_pid, reason):
+        """Initialize exception."""
+        self.patron_pid = patron_pid
+        self.reason = reason
+        super(PatronBlockedError, self).__init__(
+            'Patron "{0}" is blocked by {1}.'.format(patron_pid, reason))
+
+
+class PolicyRulesConfigError(CirculationConfigError):
+    """The configured circulation policy rules are not consistent."""
+
+
+class LoanArchiveConfigError(CirculationConfigError):
+    """The configured loan archive is not consistent with the loan store."""
+
+
+class LoanIndexerConfigError(CirculationConfigError):
+    """The configured indexer queue cannot be flushed by Celery workers."""
+
+
+class MissingRequiredParameterError(CirculationException):
+    """A parameter required by the action is missing."""
@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 CERN.
+#
+# Invenio-Circulation is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Loan, hold and transit events pushed to subscribers.
+
+The :class:`EventBus` turns loan transitions and transits into events, and
+publishes them on the channels of their patron (``patron:<patron_pid>``) and
+locations (``location:<location_pid>``). Subscribers, e.g. the server-sent
+events endpoint of kiosks and dashboards, read them from a bounded queue:
+when a subscriber is too slow, its oldest events are dropped and it is told
+how many, so that it can reload the current state.
+
+The bus lives in the process memory. Without broker, subscribers only
+receive the events of the transitions made by the same process, which is
+only suited for a single process. With several processes, e.g. gunicorn
+workers, a broker such as :class:`RedisEventBroker` sends the events of all
+processes to the subscribers of each process.
+"""
+
+from __future__ import absolute_import, print_function
+
+import itertools
+import json
+import threading
+from collections import defaultdict, deque
+
+
+class Subscription(object):
+    """Bounded queue of the events of some channels."""
+
+    def __init__(self, bus, channels, size):
+        """Initialize the subscription.
+
+        :param size: maximum number of queued events.
+        """
+        self.bus = bus
+        self.channels = frozenset(channels)
+        self.dropped = 0
+        self._events = deque(maxlen=size)
+        self._condition = threading.Condition()
+
+    def push(self, event):
+        """Queue an event, dropping the oldest one if the queue is full."""
+        with self._condition:
+            if len(self._events) == self._events.maxlen:
+                self.dropped += 1
+            self._events.append(event)
+            self._condition.notify()
+
+    def get(self, timeout=None):
+        """Wait for events.
+
+        :param timeout: maximum number of seconds to wait.
+        :returns: a tuple with the list of queued events, possibly empty,
+            and the number of events dropped since the last call.
+        """
+        with self._condition:
+            if not self._events and not self.dropped:
+                self._condition.wait(timeout)
+            events = list(self._events)
+            self._events.clear()
+            dropped, self.dropped = self.dropped, 0
+        return events, dropped
+
+    def close(self):
+        """Stop receiving events."""
+        self.bus.unsubscribe(self)
+
+    def __enter__(self):
+        """Return the subscription."""
+        return self
+
+    def __exit__(self, *exc_info):
+        """Close the subscription."""
+        self.close()
+
+
+class RedisEventBroker(object):
+    """Broker sharing events between processes, which requires ``redis``.
+
+    Events are published on a Redis pub/sub channel, and each process
+    subscribed to it dispatches them to its own subscribers from a
+    background thread.
+    """
+
+    channel = 'circulation:events'
+    """Redis channel of the events."""
+
+    def __init__(self, app=None, client=None):
+        """Initialize the broker.
+
+        :param client: the Redis client, by default connected to
+            ``CIRCULATION_EVENTS_REDIS_URL``.
+        """
+        if client is None:
+            import redis
+            client = redis.StrictRedis.from_url(
+                app.config['CIRCULATION_EVENTS_REDIS_URL'])
+        self.client = client
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def publish(self, channels, event):
+        """Send an event to all processes."""
+        self.client.publish(self.channel, json.dumps(
+            dict(channels=sorted(channels), event=event)))
+
+    def start(self, dispatch):
+        """Dispatch the events of all processes, once subscribed.
+
+        :param dispatch: callable receiving the channels and the event.
+        """
+        with self._lock:
+            if self._thread is not None:
+                return
+            pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(self.channel)
+
+            def run():
+                for message in pubsub.listen():
+                    data = message['data']
+                    if isinstance(data, bytes):
+                        data = data.decode('utf-8')
+                    data = json.loads(data)
+                    dispatch(data['channels'], data['event'])
+
+            self._thread = threading.Thread(
+                target=run, name='circulation-events')
+            self._thread.daemon = True
+            self._thread.start()
+
+
+class EventBus(object):
+    """Publish circulation events to the subscribers of their channels."""
+
+    def __init__(self, pending_states, queue_size=100, broker=None):
+        """Initialize the bus.
+
+        :param pending_states: states of the loans which are holds.
+        :param queue_size: default maximum number of events queued per
+            subscriber.
+        :param broker: broker sending the events to all processes, e.g.
+            :class:`RedisEventBroker`, ``None`` to only send them to the
+            subscribers of this process.
+        """
+        self.pending_states = pending_states
+        self.queue_size = queue_size
+        self.broker = broker
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._subscriptions = defaultdict(set)
+
+    def subscribe(self, channels, size=None):
+        """Subscribe to the events of several channels.
+
+        :returns: a :class:`Subscription`, to close when done.
+        """
+        if self.broker is not None:
+            self.broker.start(self.dispatch)
+        subscription = Subscription(self, channels, size or self.queue_size)
+        with self._lock:
+            for channel in subscription.channels:
+                self._subscriptions[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """Remove a subscription."""
+        with self._lock:
+            for channel in subscription.channels:
+                subscriptions = self._subscriptions.get(channel)
+                if subscriptions is not None:
+                    subscriptions.discard(subscription)
+                    if not subscriptions:
+                        del self._subscriptions[channel]
+
+    def publish(self, channels, event):
+        """Publish an event once to each subscriber of some channels.
+
+        With a broker, the event is dispatched by each process receiving it.
+        """
+        if self.broker is not None:
+            self.broker.publish(channels, event)
+        else:
+            self.dispatch(channels, event)
+
+    def dispatch(self, channels, event):
+        """Send an event to the subscribers of this process.
+
+        The event gets an ``id``, increasing with each event.
+        """
+        with self._lock:
+            if not self._subscriptions:
+                return
+            event['id'] = next(self._ids)
+            subscriptions = set()
+            for channel in channels:
+                subscriptions.update(self._subscriptions.get(channel, ()))
+        for subscription in subscriptions:
+            subscription.push(event)
+
+    @staticmethod
+    def _location_channels(*location_pids):
+        """Return the channels of some locations."""
+        return set(
+            'location:{0}'.format(pid) for pid in location_pids if pid)
+
+    def on_loan_state_changed(self, sender, changes=None, **kwargs):
+        """Publish loan and hold events."""
+        for change in changes or ():
+            loan = change.loan
+            previous_state = change.previous and change.previous['state']
+            is_hold = loan['state'] in self.pending_states or \
+                previous_state in self.pending_states
+            channels = self._location_channels(
+                loan.get('transaction_location_pid'),
+                loan.get('pickup_location_pid'),
+                loan.get('item_location_pid'))
+            channels.add('patron:{0}'.format(loan.get('patron_pid')))
+            self.publish(channels, dict(
+                type='hold' if is_hold else 'loan',
+                trigger=change.trigger,
+                loan_pid=loan['loan_pid'],
+                item_pid=loan['item_pid'],
+                patron_pid=loan.get('patron_pid'),
+                state=loan['state'],
+                previous_state=previous_state,
+                end_date=loan.get('end_date'),
+            ))
+
+    def on_item_transits_changed(self, sender, started=(), completed=(),
+                                 **kwargs):
+        """Publish transit events."""
+        for status, transits in (('started', started),
+                                 ('completed', completed)):
+            for transit in transits:
+                self.publish(self._location_channels(
+                    transit.get('from_location_pid'),
+                    transit.get('to_location_pid'),
+                ), dict(transit, type='transit', status=status))
@@ -9,10 +9,267 @@
 
 from __future__ import absolute_import, print_function
 
+import threading
+
 from flask_babelex import gettext as _
 
 from . import config
-from .views import blueprint
+from .rules import PolicyResolver
+from .signals import item_transits_changed, loan_state_changed, \
+    location_calendar_changed
+from .transitions import LoanTransitions
+from .utils import obj_or_import_string
+
+
+class _component(object):
+    """Build a component of the circulation state on first access.
+
+    Components and the modules they need are only loaded by the processes
+    using them, e.g. a Celery worker sending notices never builds the
+    availability index.
+    """
+
+    def __init__(self, build):
+        """Initialize the descriptor."""
+        self.build = build
+        self.name = build.__name__
+        self.__doc__ = build.__doc__
+
+    def __get__(self, state, owner=None):
+        """Return the component, building it once."""
+        if state is None:
+            return self
+        with state._lock:
+            if self.name not in state.__dict__:
+                state.__dict__[self.name] = self.build(state)
+        return state.__dict__[self.name]
+
+
+class _CirculationState(object):
+    """Circulation state for an application.
+
+    The configuration of loan transitions and policies is compiled, and thus
+    validated, when the state is created. The other components are built on
+    first use.
+    """
+
+    def __init__(self, app):
+        """Initialize state."""
+        self.app = app
+        self._lock = threading.RLock()
+        self.loan_transitions = LoanTransitions.from_app(app)
+        self.policies = PolicyResolver.from_app(app)
+        loan_state_changed.connect(self._on_loan_state_changed, sender=app)
+        location_calendar_changed.connect(
+            self._on_calendar_changed, sender=app)
+        item_transits_changed.connect(
+            self._on_item_transits_changed, sender=app)
+
+    @_component
+    def instrumentation(self):
+        """Timing of circulation actions."""
+        from .metrics import Instrumentation
+        app = self.app
+        return Instrumentation(
+            app,
+            obj_or_import_string(app.config['CIRCULATION_METRICS_SINK'])(app)
+            if app.config['CIRCULATION_METRICS_ENABLED'] else None,
+        )
+
+    @_component
+    def loan_store(self):
+        """Loan store."""
+        return obj_or_import_string(
+            self.app.config['CIRCULATION_LOAN_STORE'])(self.app)
+
+    @_component
+    def loan_enricher(self):
+        """Function returning the fields of a new loan from its records."""
+        return obj_or_import_string(
+            self.app.config['CIRCULATION_LOAN_ENRICHER'])
+
+    @_component
+    def item_location(self):
+        """Function returning the home location of the item of a loan."""
+        return obj_or_import_string(
+            self.app.config['CIRCULATION_ITEM_LOCATION'])
+
+    @_component
+    def availability(self):
+        """Availability index of items."""
+        from .availability import AvailabilityIndex
+        return AvailabilityIndex(
+            self.loan_transitions, self._availability_loans,
+            self.app.config['CIRCULATION_AVAILABILITY_MAX_AGE'])
+
+    @_component
+    def calendars(self):
+        """Opening calendars of locations."""
+        from .calendars import LocationCalendars
+        app = self.app
+        return LocationCalendars(
+            obj_or_import_string(
+                app.config['CIRCULATION_LOCATION_CALENDAR_LOADER'],
+                default=app.config['CIRCULATION_LOCATION_CALENDARS'].get),
+            app.config['CIRCULATION_LOCATION_CALENDAR_HORIZON'],
+        )
+
+    @_component
+    def patron_summaries(self):
+        """Cache of patron loan summaries."""
+        from .patrons import PatronSummaryCache
+        return PatronSummaryCache(
+            self.loan_transitions,
+            self._patron_loans,
+            self.policies,
+            self.app.config['CIRCULATION_PATRON_SUMMARY_CACHE_SIZE'],
+            self.app.config['CIRCULATION_PATRON_SUMMARY_MAX_AGE'],
+        )
+
+    @_component
+    def limits(self):
+        """Patron loan limits."""
+        from .limits import PatronLimits
+        return PatronLimits(self.loan_store, self.patron_summaries)
+
+    @_component
+    def notice_log(self):
+        """Log of sent loan notices."""
+        return obj_or_import_string(
+            self.app.config['CIRCULATION_NOTICE_LOG'])(self.app)
+
+    @_component
+    def archive(self):
+        """Archive of old loans."""
+        import os
+        from .archive import LoanArchive
+        from .errors import LoanArchiveConfigError
+        path = self.app.config['CIRCULATION_ARCHIVE_PATH']
+        if not path:
+            if self.loan_store.shared:
+                raise LoanArchiveConfigError(
+                    'CIRCULATION_ARCHIVE_PATH must be set to a directory '
+                    'shared by all nodes with a shared loan store.')
+            path = os.path.join(self.app.instance_path, 'circulation-archive')
+        return LoanArchive(
+            path, self.app.config['CIRCULATION_ARCHIVE_INDEX_CACHE_SIZE'])
+
+    @_component
+    def view_cache(self):
+        """Response cache of the views, ``None`` if disabled."""
+        from .cache import ResponseCache
+        app = self.app
+        backend = app.config['CIRCULATION_VIEW_CACHE_BACKEND']
+        if not backend:
+            return None
+        return ResponseCache(
+            obj_or_import_string(backend)(app),
+            app.config['CIRCULATION_VIEW_CACHE_TIMEOUT'],
+        )
+
+    @_component
+    def events(self):
+        """Bus of the events pushed to subscribers."""
+        from .events import EventBus
+        app = self.app
+        broker = app.config['CIRCULATION_EVENTS_BROKER']
+        return EventBus(
+            self.loan_transitions.pending_states,
+            app.config['CIRCULATION_EVENTS_QUEUE_SIZE'],
+            obj_or_import_string(broker)(app) if broker else None,
+        )
+
+    @_component
+    def holds(self):
+        """Hold queues of items."""
+        from .holds import HoldQueues
+        return HoldQueues(
+            self.loan_transitions,
+            self._item_holds,
+            self.app.config['CIRCULATION_HOLD_PRIORITIES'],
+            self.app.config['CIRCULATION_HOLD_DEFAULT_PRIORITY'],
+            self.app.config['CIRCULATION_HOLD_QUEUE_CACHE_SIZE'],
+        )
+
+    @_component
+    def indexer(self):
+        """Batching loan indexer."""
+        from .indexer import LoanIndexer
+        app = self.app
+        indexer = LoanIndexer(
+            app,
+            obj_or_import_string(app.config['CIRCULATION_INDEXER_QUEUE'])(app),
+            obj_or_import_string(
+                app.config['CIRCULATION_INDEXER_BULK_HANDLER']),
+            app.config['CIRCULATION_INDEXER_WINDOW'],
+            app.config['CIRCULATION_INDEXER_CHUNK_SIZE'],
+        )
+        if indexer.enabled and not indexer.queue.shared:
+            # Only this process can flush a queue in its memory.
+            indexer.start_worker()
+        return indexer
+
+    def _on_loan_state_changed(self, sender, changes=None, **kwargs):
+        """Forward loan transitions to the components following them.
+
+        Caches which are not built yet are skipped, they are loaded from
+        the loan store when built. The indexer is built by the first
+        transition if it is enabled, and so are the view cache, whose
+        backend may be shared with other processes, and the event bus with
+        a broker.
+        """
+        for name in ('availability', 'patron_summaries', 'holds'):
+            component = self.__dict__.get(name)
+            if component is not None:
+                component.on_loan_state_changed(sender, changes=changes)
+        events = self._event_bus()
+        if events is not None:
+            events.on_loan_state_changed(sender, changes=changes)
+        if self.app.config['CIRCULATION_INDEXER_BULK_HANDLER']:
+            self.indexer.on_loan_state_changed(sender, changes=changes)
+        if self.view_cache is not None:
+            self.view_cache.on_loan_state_changed(sender, changes=changes)
+
+    def _event_bus(self):
+        """Return the event bus if events must be published, else ``None``.
+
+        Without broker, events are only published to the subscribers of
+        this process, so the bus is only used once built by a subscriber.
+        With a broker, events are published for the other processes.
+        """
+        if self.app.config['CIRCULATION_EVENTS_BROKER']:
+            return self.events
+        return self.__dict__.get('events')
+
+    def _on_item_transits_changed(self, sender, **kwargs):
+        """Forward transits to the event bus, if events are published."""
+        events = self._event_bus()
+        if events is not None:
+            events.on_item_transits_changed(sender, **kwargs)
+
+    def _on_calendar_changed(self, sender, **kwargs):
+        """Forward calendar changes to the calendars, if they are built."""
+        calendars = self.__dict__.get('calendars')
+        if calendars is not None:
+            calendars.on_calendar_changed(sender, **kwargs)
+
+    def _availability_loans(self):
+        """Return the loans needed to build the availability index."""
+        transitions = self.loan_transitions
+        return self.loan_store.search(
+            states=transitions.unavailable_states | transitions.pending_states)
+
+    def _item_holds(self, item_pid):
+        """Return the pending loans of an item."""
+        return self.loan_store.search(
+            item_pids=[item_pid], states=self.loan_transitions.pending_states)
+
+    def _patron_loans(self, patron_pid):
+        """Return the loans needed to build the summary of a patron."""
+        transitions = self.loan_transitions
+        return self.loan_store.search(
+            patron_pids=[patron_pid],
+            states=transitions.unavailable_states | transitions.pending_states)
 
 
 class InvenioCirculation(object):
@@ -29,9 +286,12 @@ class InvenioCirculation(object):
 
     def init_app(self, app):
         """Flask application initialization."""
+        from .cli import circulation as circulation_cmd
+        from .views import blueprint
         self.init_config(app)
         app.register_blueprint(blueprint)
-        app.extensions['invenio-circulation'] = self
+        app.cli.add_command(circulation_cmd)
+        app.extensions['invenio-circulation'] = _CirculationState(app)
 
     def init_config(self, app):
         """Initialize configuration."""
@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 CERN.
+#
+# Invenio-Circulation is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Hold queues of items."""
+
+from __future__ import absolute_import, print_function
+
+import heapq
+import itertools
+import threading
+from collections import OrderedDict
+
+
+class HoldQueue(object):
+    """Priority queue of the holds of an item.
+
+    Holds are kept in a binary heap ordered by their sort key. Cancelled
+    holds are only marked as removed and dropped when they reach the top of
+    the heap, so that adding, cancelling and reordering a hold take
+    logarithmic time. The heap is rebuilt when most of its entries are
+    cancelled holds.
+    """
+
+    _removed = object()
+
+    def __init__(self):
+        """Initialize the queue."""
+        self._heap = []
+        self._entries = {}
+        self._counter = itertools.count()
+
+    def __len__(self):
+        """Return the number of holds in the queue."""
+        return len(self._entries)
+
+    def __contains__(self, loan_pid):
+        """Check if a hold is in the queue."""
+        return loan_pid in self._entries
+
+    def push(self, loan, key):
+        """Add a hold, or move it if it is already in the queue.
+
+        :param loan: the pending loan.
+        :param key: the sort key, lower keys are served first.
+        """
+        self.cancel(loan['loan_pid'])
+        entry = [key, next(self._counter), loan]
+        self._entries[loan['loan_pid']] = entry
+        heapq.heappush(self._heap, entry)
+
+    def cancel(self, loan_pid):
+        """Remove a hold from the queue, if present."""
+        entry = self._entries.pop(loan_pid, None)
+        if entry is not None:
+            entry[2] = self._removed
+            if len(self._heap) > 2 * len(self._entries) + 8:
+                self._heap = [
+                    held for held in self._heap
+                    if held[2] is not self._removed]
+                heapq.heapify(self._heap)
+
+    def reorder(self, loan_pid, key):
+        """Change the sort key of a hold in the queue."""
+        self.push(self._entries[loan_pid][2], key)
+
+    def _prune(self):
+        """Drop cancelled holds from the top of the heap."""
+        while self._heap and self._heap[0][2] is self._removed:
+            heapq.heappop(self._heap)
+
+    def peek(self, eligible=None):
+        """Return the first hold, without removing it.
+
+        :param eligible: optional predicate on the pending loan. Holds for
+            which it is false are skipped.
+        :returns: the pending loan or ``None``.
+        """
+        self._prune()
+        heap = self._heap
+        # Walk the heap in order: the next hold is always the smallest of
+        # the children of the holds already visited.
+        frontier = [(heap[0], 0)] if heap else []
+        while frontier:
+            entry, index = heapq.heappop(frontier)
+            loan = entry[2]
+            if loan is not self._removed and (
+                    eligible is None or eligible(loan)):
+                return loan
+            for child in (2 * index + 1, 2 * index + 2):
+                if child < len(heap):
+                    heapq.heappush(frontier, (heap[child], child))
+        return None
+
+    def pop(self, eligible=None):
+        """Remove and return the first hold."""
+        loan = self.peek(eligible)
+        if loan is not None:
+            self.cancel(loan['loan_pid'])
+        return loan
+
+    def __iter__(self):
+        """Iterate over the holds in order."""
+        entries = sorted(self._entries.values())
+        return iter([entry[2] for entry in entries])
+
+
+class HoldQueues(object):
+    """Hold queues of all items, maintained from loan transitions.
+
+    The queue of an item is loaded from the loan store on first use, and
+    then updated incrementally when requests are created or leave the
+    pending state. Queues are kept in process memory, so requests created
+    by other processes are only seen by :meth:`next_hold`. Empty queues
+    are dropped, and so are the least recently used queues beyond the
+    cache size.
+    """
+
+    def __init__(self, transitions, loader, priorities, default_priority,
+                 size=10000):
+        """Initialize the queues.
+
+        :param transitions: the
+            :class:`~invenio_circulation.transitions.LoanTransitions`.
+        :param loader: callable returning the pending loans of an item.
+        :param priorities: mapping of patron category to priority, lower
+            priorities are served first.
+        :param default_priority: priority of other patron categories.
+        :param size: maximum number of queues kept in memory.
+        """
+        self.transitions = transitions
+        self.loader = loader
+        self.priorities = priorities
+        self.default_priority = default_priority
+        self.size = size
+        self._lock = threading.RLock()
+        self._queues = OrderedDict()
+
+    def sort_key(self, loan):
+        """Return the sort key of a pending loan.
+
+        Holds are ordered by patron category priority, then by request
+        date.
+        """
+        return (
+            self.priorities.get(
+                loan.get('patron_category'), self.default_priority),
+            loan.get('request_date') or loan.get('transaction_date') or '',
+        )
+
+    def get(self, item_pid):
+        """Return the :class:`HoldQueue` of an item."""
+        with self._lock:
+            queue = self._queues.pop(item_pid, None)
+            if queue is None:
+                queue = HoldQueue()
+                for loan in self.loader(item_pid):
+                    queue.push(loan, self.sort_key(loan))
+            self._queues[item_pid] = queue
+            while len(self._queues) > self.size:
+                self._queues.popitem(last=False)
+            return queue
+
+    def _discard_empty(self, item_pid):
+        """Drop the queue of an item if it has no holds left."""
+        queue = self._queues.get(item_pid)
+        if queue is not None and not len(queue):
+            del self._queues[item_pid]
+
+    def peek_next(self, item_pid, eligible=None):
+        """Return the next hold of an item, or ``None``."""
+        with self._lock:
+            return self.get(item_pid).peek(eligible)
+
+    def next_hold(self, item_pid, pending):
+        """Return the next hold of an item among its current pending loans.
+
+        Pending loans missing from the queue, e.g. requests created by other
+        processes, are added to it first, and holds which are not pending
+        anymore are skipped.
+
+        :param pending: the pending loans of the item, read from the loan
+            store.
+        :returns: the pending loan or ``None``.
+        """
+        loan_pids = set(loan['loan_pid'] for loan in pending)
+        with self._lock:
+            queue = self.get(item_pid)
+            for loan in pending:
+                if loan['loan_pid'] not in queue:
+                    queue.push(loan, self.sort_key(loan))
+            hold = queue.peek(lambda hold: hold['loan_pid'] in loan_pids)
+            self._discard_empty(item_pid)
+            return hold
+
+    def update(self, changes):
+        """Update the loaded queues from a list of loan changes."""
+        pending = self.transitions.pending_states
+        with self._lock:
+            for change in changes:
+                loan = change.loan
+                queue = self._queues.get(loan['item_pid'])
+                if queue is None:
+                    continue
+                if loan['state'] in pending:
+                    queue.push(loan, self.sort_key(loan))
+                else:
+                    queue.cancel(loan['loan_pid'])
+                    self._discard_empty(loan['item_pid'])
+
+    def on_loan_state_changed(self, sender, changes=None, **kwargs):
+        """Update the queues when loan transitions are committed."""
+        self.update(changes)
@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 CERN.
+#
+# Invenio-Circulation is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Batching indexer of loans and items.
+
+Loan transitions only queue the PIDs of the changed loans and items. The
+queue is flushed periodically, by the
+:func:`invenio_circulation.tasks.process_loan_indexer_queue` Celery task
+with a queue shared by all processes, or by a background thread of each
+process with a queue in process memory, and each flush sends one bulk
+request for all the documents changed since the previous one. A document
+changed several times in between is indexed once.
+
+Documents are built from the loan store when they are flushed, so that
+workers index the current loans and items whichever process changed them.
+If a bulk request fails, its documents are queued again.
+"""
+
+from __future__ import absolute_import, print_function
+
+import threading
+import time
+from collections import OrderedDict
+
+LOAN = 'loan'
+"""Type of loan documents."""
+
+ITEM = 'item'
+"""Type of item availability documents."""
+
+
+class InProcessIndexerQueue(object):
+    """Queue of documents to index kept in process memory.
+
+    A document is only taken out of the queue once it has been waiting for
+    the deduplication window, so that all its changes in the window are
+    indexed at once. Each process flushes its own queue from a background
+    thread, started with the indexer.
+    """
+
+    shared = False
+    """Whether the queued documents are shared by all processes."""
+
+    def __init__(self, app=None):
+        """Initialize the queue."""
+        self._lock = threading.Lock()
+        self._pending = OrderedDict()
+
+    def __len__(self):
+        """Return the number of queued documents."""
+        return len(self._pending)
+
+    def put(self, keys, timestamp):
+        """Queue documents, keeping the time they were first queued.
+
+        :param keys: iterable of ``(type, pid)`` tuples.
+        :param timestamp: time at which they changed.
+        """
+        with self._lock:
+            for key in keys:
+                self._pending.setdefault(tuple(key), timestamp)
+
+    def take(self, older_than=None, limit=None):
+        """Remove and return queued documents.
+
+        :param older_than: only take documents queued before this time.
+        :param limit: maximum number of documents to take.
+        :returns: list of ``(type, pid)`` tuples.
+        """
+        keys = []
+        with self._lock:
+            # Documents are ordered by the time they were first queued.
+            for key, timestamp in self._pending.items():
+                if (older_than is not None and timestamp > older_than) or \
+                        (limit is not None and len(keys) >= limit):
+                    break
+                keys.append(key)
+            for key in keys:
+                del self._pending[key]
+        return keys
+
+
+class KombuIndexerQueue(object):
+    """Queue of documents to index kept in a message broker.
+
+    Needed when the queue is flushed by Celery workers. All documents
+    queued when a flush starts are taken, so the deduplication window is
+    the interval between flushes.
+    """
+
+    shared = True
+    """Whether the queued documents are shared by all processes."""
+
+    def __init__(self, app):
+        """Initialize the queue."""
+        from kombu import Connection, Exchange, Queue
+        self.connection = Connection(
+            app.config['CIRCULATION_INDEXER_BROKER_URL'] or
+            app.config.get('BROKER_URL') or 'memory://')
+        self.exchange = Exchange(
+            app.config['CIRCULATION_INDEXER_MQ_NAME'], type='direct')
+        self.queue = Queue(
+            app.config['CIRCULATION_INDEXER_MQ_NAME'],
+            exchange=self.exchange,
+            routing_key=app.config['CIRCULATION_INDEXER_MQ_NAME'])
+
+    def _acquire(self):
+        """Return a connection from the pool."""
+        from kombu.pools import connections
+        return connections[self.connection].acquire(block=True)
+
+    def put(self, keys, timestamp):
+        """Publish documents to index."""
+        with self._acquire() as conn:
+            conn.Producer(serializer='json').publish(
+                dict(keys=[list(key) for key in keys], timestamp=timestamp),
+                exchange=self.exchange,
+                routing_key=self.queue.routing_key,
+                declare=[self.queue],
+            )
+
+    def take(self, older_than=None, limit=None):
+        """Consume the published documents, without duplicates."""
+        keys = OrderedDict()
+        with self._acquire() as conn:
+            queue = self.queue(conn.default_channel)
+            queue.declare()
+            while limit is None or len(keys) < limit:
+                message = queue.get()
+                if message is None:
+                    break
+                keys.update((tuple(key), None)
+                            for key in message.payload['keys'])
+                message.ack()
+        return list(keys)
+
+
+def search_bulk_handler(actions):
+    """Send bulk actions to Elasticsearch, requires Invenio-Search."""
+    from elasticsearch.helpers import bulk
+    from invenio_search import current_search_client
+    bulk(current_search_client, actions, stats_only=True)
+
+
+class LoanIndexer(object):
+    """Queue changed loans and items and index them in bulk."""
+
+    def __init__(self, app, queue, handler, window, chunk_size):
+        """Initialize the indexer.
+
+        :param app: the Flask application.
+        :param queue: the indexer queue, see :class:`InProcessIndexerQueue`.
+        :param handler: callable sending a list of Elasticsearch bulk
+            actions, or ``None`` to disable indexing.
+        :param window: deduplication window, in seconds.
+        :param chunk_size: maximum number of documents per bulk request.
+        """
+        self.app = app
+        self.queue = queue
+        self.handler = handler
+        self.window = window
+        self.chunk_size = chunk_size
+        self._worker = None
+        self._stop = threading.Event()
+
+    @property
+    def enabled(self):
+        """Check if changed loans are indexed."""
+        return self.handler is not None
+
+    def enqueue(self, changes):
+        """Queue the loans and items of a list of loan changes."""
+        keys = OrderedDict()
+        for change in changes:
+            keys[(LOAN, change.loan['loan_pid'])] = None
+            keys[(ITEM, change.loan['item_pid'])] = None
+        self.queue.put(list(keys), time.time())
+
+    def _availability(self, item_pids):
+        """Return the availability of items, read from the loan store."""
+        from .availability import AvailabilityIndex
+        from .proxies import current_circulation
+        if not item_pids:
+            return {}
+        transitions = current_circulation.loan_transitions
+        loans = current_circulation.loan_store.get_by_items(
+            item_pids,
+            states=transitions.unavailable_states | transitions.pending_states)
+        index = AvailabilityIndex(transitions)
+        index.rebuild(loan for item in loans.values() for loan in item)
+        return index.get_many(item_pids)
+
+    def _actions(self, keys):
+        """Build the bulk actions of a list of documents."""
+        from .proxies import current_circulation
+        config = self.app.config
+        loan_pids = [pid for doc_type, pid in keys if doc_type == LOAN]
+        item_pids = [pid for doc_type, pid in keys if doc_type == ITEM]
+        loans = current_circulation.loan_store.get_many(loan_pids)
+        for loan_pid, loan in zip(loan_pids, loans):
+            action = {
+                '_index': config['CIRCULATION_INDEXER_LOAN_INDEX'],
+                '_type': config['CIRCULATION_INDEXER_LOAN_DOC_TYPE'],
+                '_id': loan_pid,
+            }
+            if loan is None:
+                action['_op_type'] = 'delete'
+            else:
+                action['_op_type'] = 'index'
+                action['_source'] = loan
+            yield action
+        for item_pid, item in self._availability(item_pids).items():
+            yield {
+                '_op_type': 'index',
+                '_index': config['CIRCULATION_INDEXER_ITEM_INDEX'],
+                '_type': config['CIRCULATION_INDEXER_ITEM_DOC_TYPE'],
+                '_id': item_pid,
+                '_source': item._asdict(),
+            }
+
+    def flush(self, force=False):
+        """Index the queued documents.
+
+        :param force: also index documents changed during the
+            deduplication window.
+        :returns: the number of indexed documents.
+        :raises Exception: the error of a failed bulk request, after its
+            documents are queued again.
+        """
+        older_than = None if force else time.time() - self.window
+        count = 0
+        with self.app.app_context():
+            while True:
+                keys = self.queue.take(older_than, self.chunk_size)
+                if not keys:
+                    break
+                try:
+                    self.handler(list(self._actions(keys)))
+                except Exception:
+                    # Queue them as already waiting for the window.
+                    self.queue.put(keys, time.time() - self.window)
+                    raise
+                count += len(keys)
+        return count
+
+    def start_worker(self, interval=None):
+        """Flush the queue from a background thread.
+
+        :param interval: seconds between flushes, defaults to the window.
+        """
+        if self._worker is not None:
+            return self._worker
+        self._stop.clear()
+
+        def run():
+            while not self._stop.wait(interval or self.window):
+                try:
+                    self.flush()
+                except Exception:
+                    self.app.logger.exception(
+                        'Indexing circulation documents failed.')
+
+        self._worker = threading.Thread(
+            target=run, name='circulation-indexer')
+        self._worker.daemon = True
+        self._worker.start()
+        return self._worker
+
+    def stop_worker(self):
+        """Stop the background thread, after flushing the whole queue."""
+        if self._worker is not None:
+            self._stop.set()
+            self._worker.join()
+            self._worker = None
+            self.flush(force=True)
+
+    def on_loan_state_changed(self, sender, changes=None, **kwargs):
+        """Queue the changed loans and items."""
+        self.enqueue(changes)
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 CERN.
+#
+# Invenio-Circulation is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Patron loan limits."""
+
+from __future__ import absolute_import, print_function
+
+from .errors import PatronBlockedError, PatronMaxLoansError
+
+
+class PatronCounts(object):
+    """Patron loan counts seen by a batch of actions."""
+
+    def __init__(self):
+        """Initialize the counts."""
+        self.counts = {}
+        """Counts of each patron per item type, including the batch."""
+        self.maxima = {}
+        """Maximum count of each checked ``(patron_pid, item_type)``."""
+
+
+class PatronLimits(object):
+    """Checks of the limits of a patron before a loan starts.
+
+    The number of loans of a patron is read from the counters of the loan
+    store, and the maximum is checked again by the store when the loans are
+    written, so that concurrent batches of the same patron cannot exceed
+    it. Overdue loans and fines are read from the patron summaries,
+    refreshed from the loan store once per batch, so that loans written by
+    other processes are taken into account.
+    """
+
+    def __init__(self, store, summaries):
+        """Initialize the limits.
+
+        :param store: the :class:`~invenio_circulation.storage.LoanStore`.
+        :param summaries: the
+            :class:`~invenio_circulation.patrons.PatronSummaryCache`.
+        """
+        self.store = store
+        self.summaries = summaries
+
+    def check_blocks(self, loan, policy, refresh=True):
+        """Check that the patron of a loan is not blocked.
+
+        :param loan: the loan about to start or to be extended.
+        :param policy: the policy of the loan.
+        :param refresh: read the summary of the patron from the loan store.
+        :raises PatronBlockedError: if the patron has too many overdue loans
+            or fines.
+        """
+        patron_pid = loan['patron_pid']
+        max_overdue_loans = policy.get('max_overdue_loans')
+        max_fines = policy.get('max_fines')
+        if max_overdue_loans is not None or max_fines is not None:
+            summary = self.summaries.get(patron_pid, refresh=refresh)
+            if max_overdue_loans is not None and \
+                    summary.overdue_loans > max_overdue_loans:
+                raise PatronBlockedError(patron_pid, 'overdue loans')
+            if max_fines is not None and summary.fines > max_fines:
+                raise PatronBlockedError(patron_pid, 'fines')
+
+    def check(self, loan, policy, counts):
+        """Check that a loan can start, and count it.
+
+        :param loan: the loan about to start.
+        :param policy: the policy of the loan.
+        :param counts: the :class:`PatronCounts` shared by the loans of a
+            batch. Missing patrons are loaded from the loan store, and the
+            checked maxima are to be passed to
+            :meth:`~invenio_circulation.storage.LoanStore.put_many`.
+        :raises PatronMaxLoansError: if the patron has too many loans of the
+            item type.
+        :raises PatronBlockedError: if the patron has too many overdue loans
+            or fines.
+        """
+        patron_pid = loan['patron_pid']
+        item_type = loan.get('item_type')
+        loaded = counts.counts
+        self.check_blocks(loan, policy, refresh=patron_pid not in loaded)
+
+        if patron_pid not in loaded:
+            loaded.update(self.store.get_patron_counts([patron_pid]))
+        patron_counts = loaded[patron_pid]
+        count = patron_counts.get(item_type, 0)
+        max_loans = policy.get('max_loans')
+        if max_loans is not None:
+            if count >= max_loans:
+                raise PatronMaxLoansError(patron_pid, item_type, max_loans)
+            key = (patron_pid, item_type)
+            counts.maxima[key] = min(
+                max_loans, counts.maxima.get(key, max_loans))
+        patron_counts[item_type] = count + 1
+
+    def reconcile(self):
+        """Rebuild the counters from the loans and return the drift.
+
+        See
+        :meth:`~invenio_circulation.storage.LoanStore.reconcile_patron_counts`.
+        """
+        return self.store.reconcile_patron_counts()
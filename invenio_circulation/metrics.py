@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 CERN.
+#
+# Invenio-Circulation is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Timing of circulation actions.
+
+Circulation actions are split in stages (see :data:`STAGES`). When
+:data:`invenio_circulation.config.CIRCULATION_METRICS_ENABLED` is set, the
+duration of each stage is sent to the configured metrics sink and through
+the :data:`invenio_circulation.signals.action_stage_timed` signal.
+"""
+
+from __future__ import absolute_import, print_function
+
+import threading
+from bisect import bisect_left
+from timeit import default_timer
+
+from .signals import action_stage_timed
+
+STAGES = ('validation', 'policy', 'storage_read', 'storage_write',
+          'indexing')
+"""Stages of a circulation action."""
+
+
+class _NullTimer(object):
+    """Timer doing nothing, used when metrics are disabled."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+_null_timer = _NullTimer()
+
+
+class _Timer(object):
+    """Timer of one stage of an action."""
+
+    __slots__ = ('instrumentation', 'action', 'stage', 'start')
+
+    def __init__(self, instrumentation, action, stage):
+        self.instrumentation = instrumentation
+        self.action = action
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = default_timer()
+        return self
+
+    def __exit__(self, *args):
+        self.instrumentation.observe(
+            self.action, self.stage, default_timer() - self.start)
+        return False
+
+
+class Instrumentation(object):
+    """Entry point of the circulation code to report stage durations."""
+
+    def __init__(self, app, sink=None):
+        """Initialize the instrumentation.
+
+        :param app: the Flask application, sender of the signals.
+        :param sink: the :class:`MetricsSink`, ``None`` to disable metrics.
+        """
+        self.app = app
+        self.sink = sink
+
+    @property
+    def enabled(self):
+        """Check if stage durations are collected."""
+        return self.sink is not None
+
+    def timer(self, action, stage):
+        """Return a context manager timing a stage of an action."""
+        if self.sink is None:
+            return _null_timer
+        return _Timer(self, action, stage)
+
+    def observe(self, action, stage, duration):
+        """Report the duration of a stage, in seconds."""
+        self.sink.observe(action, stage, duration)
+        if action_stage_timed.receivers:
+            action_stage_timed.send(
+                self.app, action=action, stage=stage, duration=duration)
+
+
+class MetricsSink(object):
+    """Interface of metrics sinks."""
+
+    def __init__(self, app):
+        """Initialize the sink."""
+
+    def observe(self, action, stage, duration):
+        """Record the duration of a stage of an action, in seconds."""
+        raise NotImplementedError()
+
+    def export(self):
+        """Return the metrics in the Prometheus text format, if supported."""
+        raise NotImplementedError()
+
+
+class InProcessMetrics(MetricsSink):
+    """Sink aggregating durations in histograms in process memory.
+
+    There is one histogram per action and stage, with the buckets of
+    :data:`invenio_circulation.config.CIRCULATION_METRICS_BUCKETS`.
+    """
+
+    name = 'circulation_action_stage_duration_seconds'
+    """Name of the exported metric."""
+
+    def __init__(self, app=None, buckets=None):
+        """Initialize the sink."""
+        if buckets is None:
+            buckets = app.config['CIRCULATION_METRICS_BUCKETS']
+        self.buckets = sorted(buckets)
+        self._lock = threading.Lock()
+        self._histograms = {}
+
+    def observe(self, action, stage, duration):
+        """Record the duration of a stage of an action, in seconds."""
+        index = bisect_left(self.buckets, duration)
+        with self._lock:
+            histogram = self._histograms.get((action, stage))
+            if histogram is None:
+                histogram = self._histograms[(action, stage)] = [
+                    [0] * (len(self.buckets) + 1), 0.0]
+            histogram[0][index] += 1
+            histogram[1] += duration
+
+    def histograms(self):
+        """Return a snapshot of the histograms.
+
+        :returns: a dictionary keyed by ``(action, stage)``, with the
+            cumulated ``buckets`` counts (as a list of ``(upper bound,
+            count)``, the last bound being infinite), the ``count`` and the
+            ``sum`` of the durations.
+        """
+        with self._lock:
+            snapshot = dict(
+                (key, (list(counts), total))
+                for key, (counts, total) in self._histograms.items())
+        result = {}
+        for key, (counts, total) in snapshot.items():
+            cumulated = []
+            count = 0
+            for bound, bucket in zip(self.buckets + [float('inf')], counts):
+                count += bucket
+                cumulated.append((bound, count))
+            result[key] = dict(buckets=cumulated, count=count, sum=total)
+        return result
+
+    def reset(self):
+        """Drop all recorded durations."""
+        with self._lock:
+            self._histograms.clear()
+
+    def export(self):
+        """Return the histograms in the Prometheus text format."""
+        lines = [
+            '# HELP {0} Duration of the stages of circulation actions.'
+            .format(self.name),
+            '# TYPE {0} histogram'.format(self.name),
+        ]
+        for (action, stage), histogram in sorted(self.histograms().items()):
+            labels = 'action="{0}",stage="{1}"'.format(action, stage)
+            for bound, count in histogram['buckets']:
+                lines.append('{0}_bucket{{{1},le="{2}"}} {3}'.format(
+                    self.name, labels,
+                    '+Inf' if bound == float('inf') else repr(bound), count))
+            lines.append('{0}_sum{{{1}}} {2!r}'.format(
+                self.name, labels, histogram['sum']))
+            lines.append('{0}_count{{{1}}} {2}'.format(
+                self.name, labels, histogram['count']))
+        return '\n'.join(lines) + '\n'
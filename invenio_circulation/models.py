@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 CERN.
+#
+# Invenio-Circulation is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Circulation database models."""
+
+from __future__ import absolute_import, print_function
+
+from invenio_db import db
+from sqlalchemy.dialects import postgresql
+from sqlalchemy_utils.models import Timestamp
+from sqlalchemy_utils.types import JSONType
+
+
+class LoanMetadata(db.Model, Timestamp):
+    """Loan stored in the database.
+
+    The loan itself is stored as JSON, the fields used to look loans up are
+    copied into indexed columns.
+    """
+
+    __tablename__ = 'circulation_loans'
+
+    __table_args__ = (
+        db.Index('ix_circulation_loans_item_pid_state', 'item_pid', 'state'),
+        db.Index('ix_circulation_loans_patron_pid_state',
+                 'patron_pid', 'state'),
+        db.Index('ix_circulation_loans_state_end_date', 'state', 'end_date'),
+    )
+
+    loan_pid = db.Column(db.String(255), primary_key=True)
+    """Loan identifier."""
+
+    item_pid = db.Column(db.String(255), nullable=False)
+    """Identifier of the loaned item."""
+
+    patron_pid = db.Column(db.String(255), nullable=True)
+    """Identifier of the patron."""
+
+    state = db.Column(db.String(64), nullable=False, index=True)
+    """Loan state."""
+
+    end_date = db.Column(db.String(32), nullable=True)
+    """Due date of the loan, as an ISO date."""
+
+    json = db.Column(
+        db.JSON().with_variant(
+            postgresql.JSONB(none_as_null=True),
+            'postgresql',
+        ).with_variant(
+            JSONType(),
+            'sqlite',
+        ).with_variant(
+            JSONType(),
+            'mysql',
+        ),
+        default=lambda: dict(),
+        nullable=False,
+    )
+    """Loan in JSON format."""
+
+
+class ItemRevision(db.Model):
+    """Revision of the loans of an item.
+
+    Incremented each time loans of the item are written, to detect
+    concurrent transitions on the same item.
+    """
+
+    __tablename__ = 'circulation_item_revisions'
+
+    item_pid = db.Column(db.String(255), primary_key=True)
+    """Item identifier."""
+
+    revision_id = db.Column(db.Integer, nullable=False)
+    """Revision of the loans of the item."""
+
+    __mapper_args__ = {
+        'version_id_col': revision_id,
+        'version_id_generator': False,
+    }
+
+
+class PatronLoanCount(db.Model):
+    """Number of loans on loan of a patron for an item type."""
+
+    __tablename__ = 'circulation_patron_loan_counts'
+
+    patron_pid = db.Column(db.String(255), primary_key=True)
+    """Patron identifier."""
+
+    item_type = db.Column(db.String(255), primary_key=True, default='')
+    """Item type, empty for loans without item type."""
+
+    count = db.Column(db.Integer, nullable=False, default=0)
+    """Number of loans."""
+
+
+class NoticeLogEntry(db.Model):
+    """Loan notice claimed or sent."""
+
+    __tablename__ = 'circulation_notices'
+
+    key = db.Column(db.String(255), primary_key=True)
+    """Notice identifier."""
+
+    claimed = db.Column(db.DateTime, nullable=False)
+    """When the notice was claimed for sending."""
+
+    sent = db.Column(db.DateTime, nullable=True)
+    """When the notice was sent, ``None`` if it was not yet."""
+
+
+class TransitMetadata(db.Model):
+    """Transit of an item between two locations."""
+
+    __tablename__ = 'circulation_transits'
+
+    item_pid = db.Column(db.String(255), primary_key=True)
+    """Identifier of the item in transit."""
+
+    to_location_pid = db.Column(db.String(255), nullable=False, index=True)
+    """Identifier of the destination location."""
+
+    json = db.Column(
+        db.JSON().with_variant(
+            postgresql.JSONB(none_as_null=True),
+            'postgresql',
+        ).with_variant(
+            JSONType(),
+            'sqlite',
+        ).with_variant(
+            JSONType(),
+            'mysql',
+        ),
+        default=lambda: dict(),
+        nullable=False,
+    )
+    """Transit in JSON format."""
+
+
+__all__ = (
+    'ItemRevision',
+    'LoanMetadata',
+    'NoticeLogEntry',
+    'PatronLoanCount',
+    'TransitMetadata',
+)
@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 CERN.
+#
+# Invenio-Circulation is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Loan notices.
+
+Reminders before the due date, overdue notices and recalls are sent in three
+steps:
+
+1. :func:`prepare_notices` selects the loans needing a notice with indexed
+   due date queries, claims the notices in the notice log so that they are
+   sent once, and groups them per patron in chunks.
+2. :func:`send_notice_chunk` renders and sends the notices of a chunk of
+   patrons. Chunks are independent, so they can be sent in parallel, e.g.
+   by the Celery task :func:`~invenio_circulation.tasks.send_notices`.
+3. Sent notices are marked in the notice log. The notices of a patron which
+   could not be sent are released, to be sent by the next run.
+"""
+
+from __future__ import absolute_import, print_function
+
+import threading
+from collections import OrderedDict, namedtuple
+from datetime import date, datetime, timedelta
+
+from flask import current_app, render_template
+
+from .proxies import current_circulation
+from .utils import obj_or_import_string
+
+Notice = namedtuple('Notice', ['kind', 'days', 'key', 'patron_pid', 'loan'])
+"""A notice about a loan.
+
+``kind`` is ``reminder``, ``overdue`` or ``recall``, ``days`` the number of
+days before or after the due date and ``key`` identifies the notice in the
+notice log.
+"""
+
+
+def _notice(kind, loan, days=0):
+    """Return the notice of a loan."""
+    key = '{0}:{1}:{2}:{3}'.format(
+        kind, days, loan['loan_pid'], loan.get('end_date'))
+    return Notice(kind, days, key, loan['patron_pid'], loan)
+
+
+def _due(store, day, states):
+    """Iterate over the loans due on a day."""
+    day = day.isoformat()
+    return store.search_due(day, day, states=states)
+
+
+def select_notices(today=None):
+    """Iterate over the notices to send on a given day.
+
+    :param today: the day, defaults to today.
+    """
+    config = current_app.config
+    state = current_circulation
+    store = state.loan_store
+    on_loan = state.loan_transitions.on_loan_states
+    today = today or date.today()
+    for days in config['CIRCULATION_NOTICE_REMINDER_DAYS']:
+        for loan in _due(store, today + timedelta(days=days), on_loan):
+            yield _notice('reminder', loan, days)
+    for days in config['CIRCULATION_NOTICE_OVERDUE_DAYS']:
+        for loan in _due(store, today - timedelta(days=days), on_loan):
+            yield _notice('overdue', loan, days)
+    if config['CIRCULATION_NOTICE_RECALLS']:
+        pending = store.search(states=state.loan_transitions.pending_states)
+        item_pids = set(loan['item_pid'] for loan in pending)
+        if item_pids:
+            for loans in store.get_by_items(
+                    item_pids, states=on_loan).values():
+                for loan in loans:
+                    yield _notice('recall', loan)
+
+
+def prepare_notices(today=None):
+    """Claim the notices to send on a given day and group them per patron.
+
+    :returns: a list of chunks, each one a list of ``(patron_pid, notices)``
+        tuples, where notices are dictionaries with the ``kind``, ``days``,
+        ``key`` and ``loan``.
+    """
+    notices = list(select_notices(today))
+    claimed = current_circulation.notice_log.claim(
+        [notice.key for notice in notices])
+    by_patron = OrderedDict()
+    for notice in notices:
+        if notice.key in claimed:
+            by_patron.setdefault(notice.patron_pid, []).append(dict(
+                kind=notice.kind, days=notice.days, key=notice.key,
+                loan=notice.loan))
+    size = current_app.config['CIRCULATION_NOTICE_CHUNK_SIZE']
+    patrons = list(by_patron.items())
+    return [patrons[i:i + size] for i in range(0, len(patrons), size)]
+
+
+def render_notices(patron_pid, notices):
+    """Render the notices of a patron."""
+    return render_template(
+        current_app.config['CIRCULATION_NOTICE_TEMPLATE'],
+        patron_pid=patron_pid, notices=notices)
+
+
+def log_notice(patron_pid, body, notices):
+    """Default notice sender, writing notices to the application log."""
+    current_app.logger.info('Notice to patron %s:\n%s', patron_pid, body)
+
+
+def send_notice_chunk(chunk):
+    """Render and send the notices of a chunk of patrons.
+
+    :param chunk: a chunk returned by :func:`prepare_notices`.
+    :returns: the number of notices sent.
+    """
+    sender = obj_or_import_string(
+        current_app.config['CIRCULATION_NOTICE_SENDER'])
+    log = current_circulation.notice_log
+    sent = []
+    for patron_pid, notices in chunk:
+        keys = [notice['key'] for notice in notices]
+        try:
+            sender(patron_pid, render_notices(patron_pid, notices), notices)
+        except Exception:
+            current_app.logger.exception(
+                'Could not send notices to patron %s.', patron_pid)
+            log.release(keys)
+        else:
+            sent.extend(keys)
+    log.mark_sent(sent)
+    return len(sent)
+
+
+class NoticeLog(object):
+    """Interface of notice logs.
+
+    A notice is claimed before being sent, and marked as sent once sent.
+    Claims which are not marked as sent after
+    :data:`invenio_circulation.config.CIRCULATION_NOTICE_CLAIM_TIMEOUT`
+    seconds, e.g. because the worker died, can be claimed again.
+    """
+
+    def __init__(self, app=None):
+        """Initialize the log."""
+        self.timeout = timedelta(seconds=app.config[
+            'CIRCULATION_NOTICE_CLAIM_TIMEOUT'] if app else 3600)
+
+    def claim(self, keys):
+        """Claim notices.
+
+        :returns: the set of the keys which were claimed, excluding notices
+            already sent or claimed by another run.
+        """
+        raise NotImplementedError()
+
+    def mark_sent(self, keys):
+        """Mark claimed notices as sent."""
+        raise NotImplementedError()
+
+    def release(self, keys):
+        """Release claimed notices which could not be sent."""
+        raise NotImplementedError()
+
+
+class MemoryNoticeLog(NoticeLog):
+    """Notice log kept in process memory."""
+
+    def __init__(self, app=None):
+        """Initialize the log."""
+        super(MemoryNoticeLog, self).__init__(app)
+        self._lock = threading.Lock()
+        self._claims = {}
+        self._sent = set()
+
+    def claim(self, keys):
+        """Claim notices."""
+        now = datetime.utcnow()
+        claimed = set()
+        with self._lock:
+            for key in keys:
+                claimed_at = self._claims.get(key)
+                if key in self._sent or (claimed_at is not None and
+                                         now - claimed_at < self.timeout):
+                    continue
+                self._claims[key] = now
+                claimed.add(key)
+        return claimed
+
+    def mark_sent(self, keys):
+        """Mark claimed notices as sent."""
+        with self._lock:
+            self._sent.update(keys)
+
+    def release(self, keys):
+        """Release claimed notices which could not be sent."""
+        with self._lock:
+            for key in keys:
+                self._claims.pop(key, None)
+
+
+class SQLAlchemyNoticeLog(NoticeLog):
+    """Notice log stored in the database, which requires Invenio-DB."""
+
+    chunk_size = 500
+    """Maximum number of values in a SQL ``IN`` clause."""
+
+    def __init__(self, app=None):
+        """Initialize the log."""
+        from .models import NoticeLogEntry
+        super(SQLAlchemyNoticeLog, self).__init__(app)
+        self.model = NoticeLogEntry
+
+    def _fetch(self, keys):
+        """Return the entries of a list of notices, keyed by notice key."""
+        keys = list(keys)
+        result = {}
+        for i in range(0, len(keys), self.chunk_size):
+            query = self.model.query.filter(
+                self.model.key.in_(keys[i:i + self.chunk_size]))
+            result.update((entry.key, entry) for entry in query)
+        return result
+
+    def claim(self, keys):
+        """Claim notices.
+
+        A concurrent run claiming the same notices makes the commit fail,
+        in which case the error is raised and nothing is claimed.
+        """
+        from invenio_db import db
+        now = datetime.utcnow()
+        claimed = set()
+        try:
+            entries = self._fetch(keys)
+            for key in keys:
+                entry = entries.get(key)
+                if entry is None:
+                    entry = entries[key] = self.model(key=key)
+                    db.session.add(entry)
+                elif entry.sent or now - entry.claimed < self.timeout:
+                    continue
+                entry.claimed = now
+                claimed.add(key)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return claimed
+
+    def _update(self, keys, sent):
+        """Mark entries as sent, or delete them."""
+        from invenio_db import db
+        try:
+            for entry in self._fetch(keys).values():
+                if sent:
+                    entry.sent = datetime.utcnow()
+                elif not entry.sent:
+                    db.session.delete(entry)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+    def mark_sent(self, keys):
+        """Mark claimed notices as sent."""
+        self._update(keys, sent=True)
+
+    def release(self, keys):
+        """Release claimed notices which could not be sent."""
+        self._update(keys, sent=False)
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 CERN.
+#
+# Invenio-Circulation is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Patron loan summaries."""
+
+from __future__ import absolute_import, print_function
+
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from datetime import date
+
+from .policies import assess
+from .rules import loan_criteria
+
+PatronSummary = namedtuple('PatronSummary', [
+    'patron_pid', 'loans', 'overdue_loans', 'fines', 'holds',
+])
+"""Loan summary of a patron.
+
+``loans`` is the number of items on loan, ``overdue_loans`` how many of them
+are overdue, ``fines`` the sum of the fines of overdue loans and ``holds``
+the number of requests, pending or waiting at the desk.
+"""
+
+
+class _PatronAggregate(object):
+    """Active loans of a patron."""
+
+    __slots__ = ('end_dates', 'criteria', 'holds', 'loaded')
+
+    def __init__(self):
+        """Initialize the aggregate."""
+        self.loaded = time.time()
+        self.end_dates = {}
+        self.criteria = {}
+        self.holds = set()
+
+
+class PatronSummaryCache(object):
+    """Least recently used cache of patron loan summaries.
+
+    Each cached patron keeps the due dates of its loans and its pending
+    requests, which are updated incrementally from loan transitions. Patrons
+    missing from the cache are loaded from the loan store, and the least
+    recently used patron is evicted when the cache is full.
+
+    The cache is kept in process memory and only follows the transitions
+    committed by the same process. When other processes write to the same
+    loan store, patrons are loaded again after ``max_age`` seconds, see
+    :data:`invenio_circulation.config.CIRCULATION_PATRON_SUMMARY_MAX_AGE`,
+    and checks which must be exact read with ``refresh=True``.
+    """
+
+    def __init__(self, transitions, loader, policies, size, max_age=None):
+        """Initialize the cache.
+
+        :param transitions: the
+            :class:`~invenio_circulation.transitions.LoanTransitions`.
+        :param loader: callable returning the active loans of a patron.
+        :param policies: the
+            :class:`~invenio_circulation.rules.PolicyResolver`.
+        :param size: maximum number of cached patrons.
+        :param max_age: seconds after which a cached patron is loaded again,
+            ``None`` to keep it until it is evicted.
+        """
+        self.transitions = transitions
+        self.loader = loader
+        self.policies = policies
+        self.size = size
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._patrons = OrderedDict()
+
+    def _add(self, aggregate, loan):
+        """Add a loan to the aggregate of its patron."""
+        transitions = self.transitions
+        if loan['state'] in transitions.on_loan_states:
+            aggregate.end_dates[loan['loan_pid']] = loan.get('end_date')
+            aggregate.criteria[loan['loan_pid']] = loan_criteria(loan)
+        elif loan['state'] in transitions.pending_states or \
+                loan['state'] in transitions.unavailable_states:
+            aggregate.holds.add(loan['loan_pid'])
+
+    def _load(self, patron_pid):
+        """Build the aggregate of a patron from the loan store."""
+        aggregate = _PatronAggregate()
+        for loan in self.loader(patron_pid):
+            self._add(aggregate, loan)
+        return aggregate
+
+    def _get(self, patron_pid, refresh=False):
+        """Return the aggregate of a patron, marking it as recently used."""
+        with self._lock:
+            aggregate = self._patrons.pop(patron_pid, None)
+            if aggregate is not None and not refresh and (
+                    self.max_age is None or
+                    time.time() - aggregate.loaded < self.max_age):
+                self._patrons[patron_pid] = aggregate
+                return aggregate
+        aggregate = self._load(patron_pid)
+        with self._lock:
+            self._patrons[patron_pid] = aggregate
+            while len(self._patrons) > self.size:
+                self._patrons.popitem(last=False)
+        return aggregate
+
+    def get(self, patron_pid, today=None, refresh=False):
+        """Return the :data:`PatronSummary` of a patron.
+
+        :param refresh: load the patron from the loan store, even if it is
+            cached.
+        """
+        aggregate = self._get(patron_pid, refresh)
+        end_dates = []
+        policies = []
+        for loan_pid, end_date in aggregate.end_dates.items():
+            if end_date:
+                end_dates.append(end_date)
+                policies.append(self.policies.resolve(
+                    *aggregate.criteria[loan_pid]))
+        days, amounts = assess(end_dates, today or date.today(), policies)
+        return PatronSummary(
+            patron_pid,
+            len(aggregate.end_dates),
+            int((days > 0).sum()),
+            round(float(amounts.sum()), 2),
+            len(aggregate.holds),
+        )
+
+    def update(self, changes):
+        """Update the cached patrons from a list of loan changes."""
+        with self._lock:
+            for change in changes:
+                aggregate = self._patrons.get(change.loan['patron_pid'])
+                if aggregate is None:
+                    continue
+                loan_pid = change.loan['loan_pid']
+                aggregate.end_dates.pop(loan_pid, None)
+                aggregate.criteria.pop(loan_pid, None)
+                aggregate.holds.discard(loan_pid)
+                self._add(aggregate, change.loan)
+
+    def invalidate(self, patron_pid=None):
+        """Drop a patron, or all patrons, from the cache."""
+        with self._lock:
+            if patron_pid is None:
+                self._patrons.clear()
+            else:
+                self._patrons.pop(patron_pid, None)
+
+    def on_loan_state_changed(self, sender, changes=None, **kwargs):
+        """Update the cache when loan transitions are committed."""
+        self.update(changes)
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 CERN.
+#
+# Invenio-Circulation is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Permissions of the circulation views."""
+
+from __future__ import absolute_import, print_function
+
+
+class _Permission(object):
+    """Permission granted or denied to everyone."""
+
+    def __init__(self, granted):
+        """Initialize the permission."""
+        self.granted = granted
+
+    def can(self):
+        """Tell if the current user has the permission."""
+        return self.granted
+
+
+def allow_all(*args, **kwargs):
+    """Permission factory allowing every action."""
+    return _Permission(True)
+
+
+def deny_all(*args, **kwargs):
+    """Permission factory denying every action."""
+    return _Permission(False)
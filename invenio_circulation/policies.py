@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 CERN.
+#
+# Invenio-Circulation is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Circulation policies.
+
+Due dates, overdue days and fines are computed over whole columns of loans
+at once with NumPy, so that sweeping all active loans does not cost one
+Python iteration per loan. Dates are ``datetime64[D]`` arrays, missing dates
+are ``NaT``.
+"""
+
+from __future__ import absolute_import, print_function
+
+from collections import namedtuple
+from datetime import date
+
+import numpy as np
+from flask import current_app
+
+from .proxies import current_circulation
+from .records import LoanBatch
+
+OverdueReport = namedtuple('OverdueReport', [
+    'loan_pids', 'end_dates', 'overdue_days', 'fines',
+])
+"""Result of an overdue sweep, one array entry per loan."""
+
+
+def get_default_policy():
+    """Return the default circulation policy of the current application."""
+    return current_app.config['CIRCULATION_DEFAULT_POLICY']
+
+
+def to_dates(values):
+    """Convert a sequence of ISO dates to a ``datetime64[D]`` array.
+
+    ``None`` values are converted to ``NaT``.
+    """
+    return np.array(values, dtype='datetime64[D]')
+
+
+def to_isoformat(dates):
+    """Convert a ``datetime64[D]`` array to a list of ISO dates."""
+    return [
+        None if np.isnat(value) else str(value) for value in dates
+    ]
+
+
+def due_dates(start_dates, days):
+    """Compute the due dates of a batch of loans.
+
+    :param start_dates: ``datetime64[D]`` array of start dates.
+    :param days: loan duration in days, a scalar or an array.
+    """
+    return to_dates(start_dates) + np.asarray(days, dtype='timedelta64[D]')
+
+
+def overdue_days(end_dates, today, grace_period=0):
+    """Compute the number of overdue days of a batch of loans.
+
+    A loan is overdue when ``today`` is later than its due date plus the
+    grace period. Overdue days are counted from the due date, and are ``0``
+    for loans which are not overdue or have no due date.
+
+    :param end_dates: ``datetime64[D]`` array of due dates.
+    :param today: reference date.
+    :param grace_period: grace period in days, a scalar or an array.
+    """
+    end_dates = to_dates(end_dates)
+    days = (np.datetime64(today, 'D') - end_dates).astype('int64')
+    overdue = ~np.isnat(end_dates) & (days > np.asarray(grace_period))
+    return np.where(overdue, days, 0)
+
+
+def fines(overdue_days, fine_rate, max_fine=None):
+    """Compute the fines of a batch of loans.
+
+    :param overdue_days: integer array of overdue days.
+    :param fine_rate: fine per overdue day, a scalar or an array.
+    :param max_fine: optional cap of the fine of a loan, a scalar or an
+        array in which ``None`` means no cap.
+    """
+    amounts = np.asarray(overdue_days) * np.asarray(fine_rate, dtype=float)
+    if max_fine is not None:
+        # ``None`` entries become NaN, which ``fmin`` ignores.
+        amounts = np.fmin(amounts, np.asarray(max_fine, dtype=float))
+    return np.round(amounts, 2)
+
+
+def assess(end_dates, today, policies):
+    """Compute the overdue days and fines of a batch of loans.
+
+    :param end_dates: sequence of due dates.
+    :param today: reference date.
+    :param policies: the policy of all loans, or a list with the policy of
+        each loan.
+    :returns: a tuple ``(overdue_days, fines)`` of arrays.
+    """
+    if isinstance(policies, dict):
+        grace_period = policies['grace_period']
+        fine_rate = policies['fine_rate']
+        max_fine = policies.get('max_fine')
+    else:
+        grace_period = [policy['grace_period'] for policy in policies]
+        fine_rate = [policy['fine_rate'] for policy in policies]
+        max_fine = [policy.get('max_fine') for policy in policies]
+    days = overdue_days(end_dates, today, grace_period)
+    return days, fines(days, fine_rate, max_fine)
+
+
+def overdue_sweep(loans, today=None, policy=None):
+    """Compute overdue days and fines for a batch of loans.
+
+    The loans are read once into columns, everything else is computed on
+    the columns.
+
+    :param loans: iterable over loan dictionaries, or a
+        :class:`~invenio_circulation.records.LoanBatch` whose columns are
+        used as they are.
+    :param today: reference date, defaults to today.
+    :param policy: circulation policy of all loans, defaults to the policy
+        resolved for each loan from the policy rules.
+    :returns: an :data:`OverdueReport`.
+    """
+    today = today or date.today()
+    if isinstance(loans, LoanBatch):
+        end_dates = loans.columns['end_date']
+        days, amounts = assess(
+            end_dates, today,
+            policy or current_circulation.policies.for_batch(loans))
+        return OverdueReport(
+            np.array(loans.decode('loan_pid'), dtype=object), end_dates,
+            days, amounts)
+    loan_pids = []
+    end_dates = []
+    policies = []
+    for_loan = policy is None and current_circulation.policies.for_loan
+    for loan in loans:
+        loan_pids.append(loan['loan_pid'])
+        end_dates.append(loan.get('end_date'))
+        if for_loan:
+            policies.append(for_loan(loan))
+    end_dates = to_dates(end_dates)
+    days, amounts = assess(end_dates, today, policy or policies)
+    return OverdueReport(
+        np.array(loan_pids, dtype=object), end_dates, days, amounts)
@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 CERN.
+#
+# Invenio-Circulation is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Compact loan records, for jobs holding many loans in memory.
+
+Loans are dictionaries everywhere else, which cost about a kilobyte each.
+Jobs going through many loans can use instead:
+
+- :class:`CompactLoan`, one object per loan with a fixed set of slots and
+  interned values, readable like a loan dictionary;
+- :class:`LoanBatch`, a batch of loans stored as columns, with codes for
+  the states, locations and other repeated values, and ``datetime64``
+  dates, which costs about a tenth of the dictionaries.
+
+Both convert from and to loan dictionaries without loss: fields they do not
+know, or values they cannot encode, are kept aside as they are.
+"""
+
+from __future__ import absolute_import, print_function
+
+import numpy as np
+from six import string_types
+from six.moves import intern
+
+FIELDS = (
+    'loan_pid', 'item_pid', 'patron_pid', 'state', 'transaction_date',
+    'start_date', 'end_date', 'request_date', 'extension_count',
+    'transaction_location_pid', 'pickup_location_pid', 'item_location_pid',
+    'patron_category', 'item_type', 'library_pid',
+)
+"""Loan fields with a slot or a column."""
+
+CODE_FIELDS = (
+    'patron_pid', 'state', 'transaction_location_pid', 'pickup_location_pid',
+    'item_location_pid', 'patron_category', 'item_type', 'library_pid',
+)
+"""Fields with few distinct values, stored as codes in batches."""
+
+DATE_FIELDS = ('start_date', 'end_date', 'request_date')
+"""Fields with ISO dates, stored as ``datetime64[D]`` in batches."""
+
+BYTES_FIELDS = ('loan_pid', 'item_pid', 'transaction_date')
+"""Fields with distinct strings, stored as UTF-8 bytes in batches."""
+
+_SLOTS = frozenset(FIELDS)
+_INTERNED = frozenset(CODE_FIELDS + DATE_FIELDS)
+_MISSING = object()
+_ABSENT = -1
+
+
+class CompactLoan(object):
+    """A loan with slots instead of a dictionary.
+
+    Repeated values (states, locations, patrons, dates) are interned, so
+    that loans share them. Loans can be read like dictionaries, e.g.
+    ``loan['state']`` or ``loan.get('end_date')``.
+    """
+
+    __slots__ = FIELDS + ('extra', )
+
+    def __init__(self, **fields):
+        """Initialize the loan from its fields."""
+        extra = None
+        for field, value in fields.items():
+            if field in _SLOTS:
+                if field in _INTERNED and isinstance(value, str):
+                    value = intern(value)
+                setattr(self, field, value)
+            else:
+                if extra is None:
+                    extra = {}
+                extra[field] = value
+        self.extra = extra
+
+    @classmethod
+    def from_dict(cls, loan):
+        """Build a compact loan from a loan dictionary."""
+        return cls(**loan)
+
+    def to_dict(self):
+        """Return the loan dictionary."""
+        loan = dict(self.extra or ())
+        for field in FIELDS:
+            value = getattr(self, field, _MISSING)
+            if value is not _MISSING:
+                loan[field] = value
+        return loan
+
+    def __getitem__(self, field):
+        """Return a field of the loan."""
+        value = self.get(field, _MISSING)
+        if value is _MISSING:
+            raise KeyError(field)
+        return value
+
+    def __contains__(self, field):
+        """Check if the loan has a field."""
+        return self.get(field, _MISSING) is not _MISSING
+
+    def get(self, field, default=None):
+        """Return a field of the loan, or ``default`` if it is missing."""
+        if field in _SLOTS:
+            return getattr(self, field, default)
+        return (self.extra or {}).get(field, default)
+
+    def __eq__(self, other):
+        """Compare loans by their fields."""
+        if isinstance(other, CompactLoan):
+            other = other.to_dict()
+        return self.to_dict() == other
+
+    def __ne__(self, other):
+        """Compare loans by their fields."""
+        return not self == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        """Return the representation of the loan."""
+        return 'CompactLoan(**{0!r})'.format(self.to_dict())
+
+
+class LoanBatch(object):
+    """A batch of loans stored as columns.
+
+    Columns are numpy arrays, one entry per loan:
+
+    - :data:`CODE_FIELDS` are ``int32`` codes of values of :attr:`values`,
+      ``-1`` when the loan does not have the field;
+    - :data:`DATE_FIELDS` are ``datetime64[D]``, ``NaT`` when missing;
+    - :data:`BYTES_FIELDS` are UTF-8 bytes, empty when missing;
+    - ``extension_count`` is ``int32``, ``-1`` when missing.
+
+    Values which do not fit a column, and fields without column, are kept
+    in :attr:`extra`, keyed by loan position.
+    """
+
+    def __init__(self, columns, values, extra=None):
+        """Initialize the batch, see :meth:`from_loans`."""
+        self.columns = columns
+        self.values = values
+        self.extra = extra or {}
+
+    @classmethod
+    def from_loans(cls, loans):
+        """Build a batch from loan dictionaries or :class:`CompactLoan`."""
+        values = []
+        codes = {}
+        dates = {}
+        extra = {}
+        rows = dict((field, []) for field in FIELDS)
+
+        def code(value):
+            try:
+                key = (type(value), value)
+                hash(key)
+            except TypeError:
+                return None
+            if key not in codes:
+                codes[key] = len(values)
+                values.append(value)
+            return codes[key]
+
+        def date(value):
+            if not isinstance(value, string_types):
+                return None
+            if value not in dates:
+                try:
+                    parsed = np.datetime64(value, 'D')
+                except ValueError:
+                    parsed = None
+                dates[value] = parsed if str(parsed) == value else None
+            return dates[value]
+
+        for position, loan in enumerate(loans):
+            if isinstance(loan, CompactLoan):
+                loan = loan.to_dict()
+            others = dict(
+                (field, value) for field, value in loan.items()
+                if field not in _SLOTS)
+            for field in FIELDS:
+                value = loan.get(field, _MISSING)
+                if value is _MISSING:
+                    encoded = None
+                elif field in CODE_FIELDS:
+                    encoded = code(value)
+                elif field in DATE_FIELDS:
+                    encoded = date(value)
+                elif field in BYTES_FIELDS:
+                    encoded = value.encode('utf-8') if isinstance(
+                        value, string_types) and value else None
+                else:
+                    encoded = value if isinstance(value, int) and \
+                        not isinstance(value, bool) and \
+                        0 <= value < 2 ** 31 else None
+                if encoded is None and value is not _MISSING:
+                    others[field] = value
+                rows[field].append(encoded)
+            if others:
+                extra[position] = others
+
+        columns = {}
+        for field in FIELDS:
+            column = rows[field]
+            if field in CODE_FIELDS or field == 'extension_count':
+                columns[field] = np.array([
+                    _ABSENT if value is None else value for value in column
+                ], dtype=np.int32)
+            elif field in DATE_FIELDS:
+                columns[field] = np.array(column, dtype='datetime64[D]')
+            else:
+                columns[field] = np.array(
+                    [value or b'' for value in column], dtype=bytes)
+        return cls(columns, values, extra)
+
+    def __len__(self):
+        """Return the number of loans."""
+        return len(self.columns['loan_pid'])
+
+    def decode(self, field):
+        """Return the values of a field as a list, ``None`` when missing.
+
+        Values kept in :attr:`extra` are not included.
+        """
+        column = self.columns[field]
+        if field in CODE_FIELDS:
+            values = self.values
+            return [None if c == _ABSENT else values[c] for c in column]
+        elif field in DATE_FIELDS:
+            return [None if np.isnat(d) else str(d) for d in column]
+        elif field in BYTES_FIELDS:
+            return [v.decode('utf-8') if v else None for v in column]
+        return [None if c == _ABSENT else int(c) for c in column]
+
+    def mask(self, field, values):
+        """Return a boolean array of the loans with a field in ``values``."""
+        codes = [
+            code for code, value in enumerate(self.values)
+            if value in values
+        ]
+        return np.isin(self.columns[field], codes)
+
+    def unique(self, fields):
+        """Return the distinct combinations of some fields.
+
+        :param fields: list of :data:`CODE_FIELDS`.
+        :returns: a tuple with the list of distinct combinations of values,
+            and an array with the position of the combination of each loan.
+        """
+        if not len(self):
+            return [], np.zeros(0, dtype=int)
+        stacked = np.stack([self.columns[field] for field in fields], axis=1)
+        combinations, inverse = np.unique(
+            stacked, axis=0, return_inverse=True)
+        values = self.values
+        return [
+            tuple(None if c == _ABSENT else values[c] for c in combination)
+            for combination in combinations
+        ], inverse.reshape(-1)
+
+    def iter_dicts(self):
+        """Iterate over the loans as dictionaries."""
+        decoded = [(field, self.decode(field)) for field in FIELDS]
+        codes = [self.columns[field] for field in CODE_FIELDS]
+        for position in range(len(self)):
+            loan = dict(
+                (field, values[position]) for field, values in decoded
+                if values[position] is not None)
+            # Codes of None values.
+            for field, column in zip(CODE_FIELDS, codes):
+                if column[position] != _ABSENT and field not in loan:
+                    loan[field] = None
+            loan.update(self.extra.get(position, ()))
+            yield loan
+
+    def to_dicts(self):
+        """Return the loans as a list of dictionaries."""
+        return list(self.iter_dicts())
+
+    def __iter__(self):
+        """Iterate over the loans as :class:`CompactLoan`."""
+        for loan in self.iter_dicts():
+            yield CompactLoan(**loan)
@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 CERN.
+#
+# Invenio-Circulation is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Bulk renewals.
+
+:func:`renew_patron_loans` renews all loans of one or more patrons, e.g. for
+a "renew all" button: the loans are read with one query, their eligibility
+and new due dates are computed for all loans at once, and the renewed loans
+are written in one transaction. :func:`extend_location_loans` postpones the
+due dates of the loans of a location, e.g. for a closure.
+"""
+
+from __future__ import absolute_import, print_function
+
+from datetime import date, datetime
+
+import numpy as np
+from flask import current_app
+
+from .api import LoanActionResult, LoanChange, retry_conflicts
+from .errors import LoanMaxExtensionsError, LoanNotFoundError, \
+    LoanOnHoldError, PatronBlockedError
+from .policies import assess, to_dates, to_isoformat
+from .proxies import current_circulation
+from .signals import loan_state_changed
+
+EXTEND_TRIGGER = 'extend'
+"""Trigger extending a loan."""
+
+
+def _thresholds(policies, key):
+    """Return a policy limit of each loan, ``NaN`` when unlimited."""
+    return np.array([
+        np.nan if policy.get(key) is None else policy[key]
+        for policy in policies
+    ], dtype=float)
+
+
+def _patron_totals(state, loans, today):
+    """Return the overdue loans and fines of the patrons of some loans.
+
+    :param loans: all loans on loan of the patrons, from which their
+        :class:`~invenio_circulation.patrons.PatronSummary` would be built.
+    :returns: a dictionary mapping each patron PID to a tuple
+        ``(overdue_loans, fines)``.
+    """
+    if not loans:
+        return {}
+    days, amounts = assess(
+        [loan.get('end_date') for loan in loans], today,
+        [state.policies.for_loan(loan) for loan in loans])
+    patron_pids, inverse = np.unique(
+        [loan['patron_pid'] for loan in loans], return_inverse=True)
+    size = len(patron_pids)
+    overdue = np.bincount(inverse, weights=days > 0, minlength=size)
+    fines = np.round(np.bincount(inverse, weights=amounts, minlength=size), 2)
+    return dict(zip(patron_pids.tolist(), zip(overdue, fines)))
+
+
+def _reload(state, loans):
+    """Read the revisions of the items of loans, then their loans again.
+
+    Revisions are read before the loans written back, so that concurrent
+    writes in between are detected as conflicts. All active loans of the
+    items are read at once, which gives their pending requests too.
+
+    :returns: a tuple with the revisions, the loans still in a state which
+        can be extended, in the same order, and a dictionary with the number
+        of pending requests of each item.
+    """
+    transitions = state.loan_transitions
+    loans = list(loans)
+    item_pids = sorted(set(loan['item_pid'] for loan in loans))
+    revisions = state.loan_store.get_item_revisions(item_pids)
+    by_item = state.loan_store.get_by_items(
+        item_pids, states=transitions.active_states) if item_pids else {}
+    current = dict(
+        (loan['loan_pid'], loan)
+        for item_loans in by_item.values() for loan in item_loans)
+    pending = dict(
+        (item_pid, sum(
+            loan['state'] in transitions.pending_states
+            for loan in item_loans))
+        for item_pid, item_loans in by_item.items())
+    extendable = []
+    for loan in loans:
+        loan = current.get(loan['loan_pid'])
+        if loan is not None and \
+                transitions.can(loan['state'], EXTEND_TRIGGER) and \
+                transitions.validate(loan['state'], EXTEND_TRIGGER) == \
+                loan['state']:
+            extendable.append(loan)
+    return revisions, extendable, pending
+
+
+def _write(state, changes, revisions):
+    """Write extended loans in one transaction and notify the changes."""
+    if changes:
+        state.loan_store.put_many(
+            [change.loan for change in changes], revisions=revisions)
+        loan_state_changed.send(
+            current_app._get_current_object(), changes=changes)
+
+
+def _renew(state, patron_pids, today):
+    """Renew the loans of patrons, without retries."""
+    on_loan = list(state.loan_store.search(
+        patron_pids=patron_pids, states=state.loan_transitions.on_loan_states))
+    revisions, loans, pending = _reload(state, on_loan)
+    if not loans:
+        return []
+    loans.sort(key=lambda loan: (
+        loan['patron_pid'], loan.get('end_date') or '', loan['loan_pid']))
+
+    policies = [state.policies.for_loan(loan) for loan in loans]
+    totals = _patron_totals(state, on_loan, today)
+    counts = np.array(
+        [loan.get('extension_count', 0) for loan in loans], dtype=float)
+    overdue, fines = np.array(
+        [totals[loan['patron_pid']] for loan in loans], dtype=float).T
+    with np.errstate(invalid='ignore'):
+        maxed = counts >= _thresholds(policies, 'max_extensions')
+        blocked_overdue = overdue > _thresholds(policies, 'max_overdue_loans')
+        blocked_fines = fines > _thresholds(policies, 'max_fines')
+    on_hold = np.array([pending[loan['item_pid']] > 0 for loan in loans])
+
+    today = np.datetime64(today.isoformat(), 'D')
+    end_dates = to_dates([loan.get('end_date') for loan in loans])
+    end_dates[np.isnat(end_dates)] = today
+    end_dates = state.calendars.next_open_days_per_location(
+        [loan.get('transaction_location_pid') for loan in loans],
+        np.maximum(end_dates, today) + np.array([
+            policy['extension_duration'] for policy in policies
+        ], dtype='timedelta64[D]'))
+
+    transaction_date = datetime.utcnow().isoformat()
+    results = []
+    changes = []
+    for i, (loan, end_date) in enumerate(
+            zip(loans, to_isoformat(end_dates))):
+        if blocked_overdue[i] or blocked_fines[i]:
+            error = PatronBlockedError(
+                loan['patron_pid'],
+                'overdue loans' if blocked_overdue[i] else 'fines')
+        elif maxed[i]:
+            error = LoanMaxExtensionsError(
+                loan['loan_pid'], policies[i]['max_extensions'])
+        elif on_hold[i]:
+            error = LoanOnHoldError(loan['loan_pid'])
+        else:
+            renewed = dict(
+                loan, end_date=end_date, transaction_date=transaction_date,
+                extension_count=loan.get('extension_count', 0) + 1)
+            changes.append(LoanChange(EXTEND_TRIGGER, loan, renewed))
+            results.append(
+                LoanActionResult(loan['item_pid'], renewed, None, None))
+            continue
+        results.append(LoanActionResult(loan['item_pid'], None, error, None))
+    _write(state, changes, revisions)
+    return results
+
+
+def renew_patron_loans(patron_pids, today=None):
+    """Renew all loans of one or more patrons in one transaction.
+
+    A loan is not renewed if its patron is blocked by overdue loans or
+    fines, if it reached the maximum number of extensions of its policy, or
+    if its item is requested by another patron. The other loans are
+    extended like with the ``extend`` action.
+
+    :param patron_pids: list of patron PIDs.
+    :param today: the day of the renewal, defaults to today.
+    :returns: list of :data:`~invenio_circulation.api.LoanActionResult`, one
+        per loan on loan, ordered by patron and due date.
+    """
+    return retry_conflicts(
+        _renew, current_circulation, patron_pids, today or date.today())
+
+
+def _extend_location(state, location_pid, end_date, today):
+    """Postpone the due dates of the loans of a location, without retries."""
+    loans = [
+        loan for loan in state.loan_store.search_due(
+            today.isoformat(), end_date,
+            states=state.loan_transitions.on_loan_states)
+        if loan.get('transaction_location_pid') == location_pid
+    ]
+    revisions, extendable, _ = _reload(state, loans)
+    extendable = dict((loan['loan_pid'], loan) for loan in extendable)
+    transaction_date = datetime.utcnow().isoformat()
+    results = []
+    changes = []
+    for loan in loans:
+        current = extendable.get(loan['loan_pid'])
+        if current is None:
+            results.append(LoanActionResult(
+                loan['item_pid'], None,
+                LoanNotFoundError(loan['item_pid'], EXTEND_TRIGGER), None))
+        elif current.get('transaction_location_pid') == location_pid and \
+                today.isoformat() <= (current.get('end_date') or '') < \
+                end_date:
+            extended = dict(
+                current, end_date=end_date, transaction_date=transaction_date)
+            changes.append(LoanChange(EXTEND_TRIGGER, current, extended))
+            results.append(
+                LoanActionResult(loan['item_pid'], extended, None, None))
+    _write(state, changes, revisions)
+    return results
+
+
+def extend_location_loans(location_pid, end_date, today=None):
+    """Postpone to a date the due dates of the loans of a location.
+
+    Loans lent at the location and due from today until the given date are
+    due on that date instead, e.g. the reopening day after a closure. They
+    are extended in one transaction, without eligibility checks and without
+    counting as an extension of the patrons.
+
+    :param location_pid: the location PID.
+    :param end_date: the new due date, as an ISO date.
+    :param today: the first due date to postpone, defaults to today.
+    :returns: list of :data:`~invenio_circulation.api.LoanActionResult`, one
+        per loan due in the period, ordered by due date. Loans which cannot
+        be extended anymore, e.g. returned in the meantime, get a
+        :class:`~invenio_circulation.errors.LoanNotFoundError`.
+    """
+    return retry_conflicts(
+        _extend_location, current_circulation, location_pid, end_date,
+        today or date.today())
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 CERN.
+#
+# Invenio-Circulation is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Circulation policy rules."""
+
+from __future__ import absolute_import, print_function
+
+from .errors import PolicyRulesConfigError
+
+WILDCARD = '*'
+"""Rule value matching any value of a dimension."""
+
+DIMENSIONS = ('patron_category', 'item_type', 'location_pid', 'library_pid')
+"""Dimensions of the rule matrix, from the most to the least significant."""
+
+
+CRITERIA_FIELDS = (
+    'patron_category', 'item_type', 'transaction_location_pid', 'library_pid',
+)
+"""Loan fields giving the coordinates of a loan along :data:`DIMENSIONS`."""
+
+
+def loan_criteria(loan):
+    """Return the rule matrix coordinates of a loan."""
+    return tuple(loan.get(field) for field in CRITERIA_FIELDS)
+
+
+class PolicyResolver(object):
+    """Compiled circulation policy rules.
+
+    Rules are indexed by their ``(patron_category, item_type, location_pid,
+    library_pid)`` tuple, wildcards included. Resolving a policy looks up
+    each wildcard pattern used by the rules, from the least to the most
+    specific, and each field of the policy is taken from the most specific
+    matching rule. Resolved policies are memoized until the rules are
+    reloaded.
+    """
+
+    def __init__(self, default, rules=()):
+        """Compile the rules.
+
+        :param default: policy used for the fields no rule sets, see
+            :data:`invenio_circulation.config.CIRCULATION_DEFAULT_POLICY`.
+        :param rules: list of rules, see
+            :data:`invenio_circulation.config.CIRCULATION_POLICY_RULES`.
+        """
+        self.load(default, rules)
+
+    @classmethod
+    def from_app(cls, app):
+        """Compile the rules of an application."""
+        return cls(app.config['CIRCULATION_DEFAULT_POLICY'],
+                   app.config['CIRCULATION_POLICY_RULES'])
+
+    def load(self, default, rules):
+        """Replace the compiled rules, e.g. after a configuration change."""
+        index = {}
+        for rule in rules:
+            rule = dict(rule)
+            key = tuple(rule.pop(name, None) or WILDCARD
+                        for name in DIMENSIONS)
+            unknown = set(rule) - set(default)
+            if unknown:
+                raise PolicyRulesConfigError(
+                    'Unknown policy fields {0} in rule {1}.'.format(
+                        ', '.join(sorted(unknown)), key))
+            index.setdefault(key, {}).update(rule)
+        patterns = sorted(
+            set(tuple(value != WILDCARD for value in key) for key in index),
+            key=lambda pattern: (sum(pattern), pattern))
+        # Swap everything at once so that concurrent readers never see a
+        # memo built from other rules.
+        self._compiled = (dict(default), index, patterns, {})
+
+    def resolve(self, patron_category=None, item_type=None,
+                location_pid=None, library_pid=None):
+        """Return the policy applicable to a combination of the dimensions.
+
+        The returned dictionary is shared and must not be modified.
+        """
+        default, index, patterns, memo = self._compiled
+        key = (patron_category, item_type, location_pid, library_pid)
+        policy = memo.get(key)
+        if policy is None:
+            policy = dict(default)
+            for pattern in patterns:
+                rule = index.get(tuple(
+                    value if concrete else WILDCARD
+                    for value, concrete in zip(key, pattern)))
+                if rule:
+                    policy.update(rule)
+            memo[key] = policy
+        return policy
+
+    def for_loan(self, loan):
+        """Return the policy applicable to a loan."""
+        return self.resolve(*loan_criteria(loan))
+
+    def for_batch(self, batch):
+        """Return the policy of each loan of a batch.
+
+        :param batch: a :class:`~invenio_circulation.records.LoanBatch`.
+        :returns: a list of policies, resolved once per distinct
+            coordinates.
+        """
+        combinations, inverse = batch.unique(CRITERIA_FIELDS)
+        policies = [self.resolve(*criteria) for criteria in combinations]
+        return [policies[i] for i in inverse]
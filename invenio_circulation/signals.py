@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 CERN.
+#
+# Invenio-Circulation is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Circulation signals."""
+
+from __future__ import absolute_import, print_function
+
+from blinker import Namespace
+
+_signals = Namespace()
+
+loan_state_changed = _signals.signal('loan-state-changed')
+"""Signal sent after loan transitions have been committed.
+
+Parameters:
+
+- ``sender`` - the Flask application.
+
+- ``changes`` - list of :class:`invenio_circulation.api.LoanChange`, in the
+  order in which the transitions have been applied.
+
+Example receiver:
+
+.. code-block:: python
+
+   def receiver(sender, changes=None, **kwargs):
+       for change in changes:
+           ...
+"""
+
+location_calendar_changed = _signals.signal('location-calendar-changed')
+"""Signal to send when the opening calendar of a location changes.
+
+Parameters:
+
+- ``sender`` - the Flask application.
+
+- ``location_pid`` - the PID of the location, or ``None`` if all calendars
+  have changed.
+"""
+
+action_stage_timed = _signals.signal('action-stage-timed')
+"""Signal sent with the duration of a stage of a circulation action.
+
+Only sent when metrics are enabled, see
+:data:`invenio_circulation.config.CIRCULATION_METRICS_ENABLED`.
+
+Parameters:
+
+- ``sender`` - the Flask application.
+
+- ``action`` - the circulation action, e.g. ``checkout``.
+
+- ``stage`` - one of :data:`invenio_circulation.metrics.STAGES`.
+
+- ``duration`` - the duration of the stage, in seconds.
+"""
+
+item_transits_changed = _signals.signal('item-transits-changed')
+"""Signal sent after items were sent in transit or received.
+
+Parameters:
+
+- ``sender`` - the Flask application.
+
+- ``started`` - list of the transits started, see
+  :data:`invenio_circulation.api.LoanActionResult`.
+
+- ``completed`` - list of the transits completed by the arrival of their
+  item.
+"""
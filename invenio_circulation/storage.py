@@ -0,0 +1,760 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 CERN.
+#
+# Invenio-Circulation is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Loan storage.
+
+The loan store used by an application is selected with
+:data:`invenio_circulation.config.CIRCULATION_LOAN_STORE`. Loans are
+dictionaries with at least a ``loan_pid``, an ``item_pid``, a ``patron_pid``
+and a ``state``.
+
+Stores keep a revision of the loans of each item, incremented by every write
+touching the item. A transition reads the revisions of its items before
+their loans, and passes them back when writing: the write is refused with a
+:class:`~invenio_circulation.errors.LoanConflictError` if another transition
+wrote loans of the same items in the meantime.
+
+Stores also keep the transit of items between locations, written in the
+same transaction as the loans and indexed by destination.
+
+Stores also count the loans on loan of each patron per item type, updated in
+the same transaction as the loans, so that checking loan limits does not
+need to count loans. A write can require counters to stay below a maximum,
+and is refused with a :class:`~invenio_circulation.errors.LoanConflictError`
+if concurrent writes of the same patrons made them exceed it.
+"""
+
+from __future__ import absolute_import, print_function
+
+import bisect
+import heapq
+import threading
+from collections import Counter, defaultdict
+
+from . import config
+from .errors import LoanConflictError
+
+
+class LoanStore(object):
+    """Interface of loan stores.
+
+    Writes are done in batches: :meth:`put_many` stores all given loans in
+    one transaction.
+    """
+
+    counted_states = frozenset(config.CIRCULATION_LOAN_ON_LOAN_STATES)
+    """States of the loans counted by :meth:`get_patron_counts`."""
+
+    shared = True
+    """Whether the loans are shared by all processes and nodes."""
+
+    def __init__(self, app=None):
+        """Initialize the store."""
+        if app is not None:
+            self.counted_states = frozenset(
+                app.config['CIRCULATION_LOAN_ON_LOAN_STATES'])
+
+    def _count_key(self, loan):
+        """Return the counter of a loan, ``None`` if it is not counted."""
+        if loan is not None and loan.get('patron_pid') and \
+                loan['state'] in self.counted_states:
+            return loan['patron_pid'], loan.get('item_type')
+        return None
+
+    def _count_deltas(self, changes):
+        """Return the counter increments of a list of loan changes.
+
+        :param changes: list of ``(previous, loan)`` tuples.
+        """
+        deltas = Counter()
+        for previous, loan in changes:
+            before, after = self._count_key(previous), self._count_key(loan)
+            if before != after:
+                if before is not None:
+                    deltas[before] -= 1
+                if after is not None:
+                    deltas[after] += 1
+        return dict((key, delta) for key, delta in deltas.items() if delta)
+
+    def _count_loans(self, loans):
+        """Count loans per patron and item type."""
+        return Counter(filter(None, (self._count_key(loan) for loan in loans)))
+
+    def get_patron_counts(self, patron_pids):
+        """Return the number of loans on loan of patrons, per item type.
+
+        :returns: a dictionary mapping each patron PID to a dictionary of
+            counts keyed by item type.
+        """
+        raise NotImplementedError()
+
+    def reconcile_patron_counts(self):
+        """Rebuild the patron counters from the loans.
+
+        :returns: a dictionary mapping the ``(patron_pid, item_type)`` of
+            each wrong counter to a tuple ``(counter, actual)``.
+        """
+        raise NotImplementedError()
+
+    def get_many(self, loan_pids):
+        """Return the loans for a list of PIDs, ``None`` for missing ones."""
+        raise NotImplementedError()
+
+    def get_item_revisions(self, item_pids):
+        """Return the revisions of the loans of several items.
+
+        :returns: a dictionary mapping each item PID to its revision, ``0``
+            for items which never had loans.
+        """
+        raise NotImplementedError()
+
+    def put_many(self, loans, revisions=None, transits=None,
+                 max_counts=None):
+        """Create or update several loans in one transaction.
+
+        :param loans: the loans to write.
+        :param revisions: optional mapping of item PIDs to the revisions
+            read before the loans were.
+        :param transits: optional mapping of item PIDs to their new transit,
+            ``None`` to remove the transit of an item.
+        :param max_counts: optional mapping of ``(patron_pid, item_type)``
+            to the maximum value of their counter once incremented by the
+            loans.
+        :raises LoanConflictError: if loans of an item listed in
+            ``revisions`` were written since, or if a counter listed in
+            ``max_counts`` would exceed its maximum, in which case nothing
+            is written.
+        """
+        raise NotImplementedError()
+
+    def _exceeded(self, deltas, max_counts, counter):
+        """Return the PIDs of the patrons whose counters exceed a maximum.
+
+        :param counter: function returning the current value of a counter.
+        """
+        return set(
+            key[0] for key, delta in deltas.items()
+            if delta > 0 and key in max_counts and
+            counter(key) + delta > max_counts[key])
+
+    def delete_many(self, loan_pids):
+        """Delete several loans in one transaction, e.g. once archived."""
+        raise NotImplementedError()
+
+    def get_transits(self, item_pids):
+        """Return the transits of several items.
+
+        :returns: a dictionary mapping each item PID to its transit, or
+            ``None`` if the item is not in transit.
+        """
+        raise NotImplementedError()
+
+    def search_transits(self, to_location_pids):
+        """Iterate over the transits to some locations.
+
+        Uses an index on the destinations, whatever the number of items in
+        transit.
+        """
+        raise NotImplementedError()
+
+    def search(self, item_pids=None, patron_pids=None, states=None):
+        """Iterate over the loans matching all given criteria.
+
+        :param item_pids: if given, only return loans of these items.
+        :param patron_pids: if given, only return loans of these patrons.
+        :param states: if given, only return loans in one of these states.
+        """
+        raise NotImplementedError()
+
+    def search_due(self, start=None, end=None, states=None):
+        """Iterate over the loans due between two dates, by due date.
+
+        Uses an index on the due dates, to select the loans needing a notice
+        without reading all active loans.
+
+        :param start: first due date, as an ISO string, included.
+        :param end: last due date, as an ISO string, included.
+        :param states: if given, only return loans in one of these states.
+        """
+        raise NotImplementedError()
+
+    def scan(self, after=None, limit=None, item_pids=None, patron_pids=None,
+             states=None):
+        """Return matching loans ordered by PID.
+
+        Used to page through loans with a fixed cost per page, whatever the
+        position of the page.
+
+        :param after: only return loans with a greater PID.
+        :param limit: maximum number of loans to return.
+        :param item_pids: if given, only return loans of these items.
+        :param patron_pids: if given, only return loans of these patrons.
+        :param states: if given, only return loans in one of these states.
+        :returns: a list of loans.
+        """
+        raise NotImplementedError()
+
+    def _iter_chunks(self, after, chunk_size, criteria):
+        """Iterate over chunks of matching loans ordered by PID."""
+        while True:
+            chunk = self.scan(after=after, limit=chunk_size, **criteria)
+            if chunk:
+                yield chunk
+            if len(chunk) < chunk_size:
+                return
+            after = chunk[-1]['loan_pid']
+
+    def iter_loans(self, after=None, chunk_size=1000, compact=False,
+                   **criteria):
+        """Iterate over matching loans ordered by PID, one chunk at a time.
+
+        At most ``chunk_size`` loans are held in memory as dictionaries.
+
+        :param after: only return loans with a greater PID.
+        :param compact: return
+            :class:`~invenio_circulation.records.CompactLoan` instead of
+            dictionaries.
+        :param criteria: filters, see :meth:`scan`.
+        """
+        if compact:
+            from .records import CompactLoan
+        for chunk in self._iter_chunks(after, chunk_size, criteria):
+            for loan in chunk:
+                yield CompactLoan.from_dict(loan) if compact else loan
+
+    def iter_batches(self, after=None, chunk_size=1000, **criteria):
+        """Iterate over matching loans ordered by PID, in columnar batches.
+
+        :param chunk_size: number of loans per batch.
+        :returns: an iterator over
+            :class:`~invenio_circulation.records.LoanBatch`.
+        """
+        from .records import LoanBatch
+        for chunk in self._iter_chunks(after, chunk_size, criteria):
+            yield LoanBatch.from_loans(chunk)
+
+    def get(self, loan_pid):
+        """Return a loan or ``None`` if it does not exist."""
+        return self.get_many([loan_pid])[0]
+
+    def put(self, loan, revisions=None):
+        """Create or update a loan."""
+        self.put_many([loan], revisions=revisions)
+
+    def _group_by(self, field, values, states):
+        """Return matching loans grouped by the value of ``field``."""
+        result = dict((value, []) for value in values)
+        criteria = {'{0}s'.format(field): values, 'states': states}
+        for loan in self.search(**criteria):
+            result[loan[field]].append(loan)
+        return result
+
+    def get_by_items(self, item_pids, states=None):
+        """Return the loans of several items.
+
+        :param item_pids: list of item PIDs.
+        :param states: if given, only return loans in one of these states.
+        :returns: a dictionary mapping each item PID to its list of loans.
+        """
+        return self._group_by('item_pid', item_pids, states)
+
+    def get_by_patrons(self, patron_pids, states=None):
+        """Return the loans of several patrons.
+
+        :param patron_pids: list of patron PIDs.
+        :param states: if given, only return loans in one of these states.
+        :returns: a dictionary mapping each patron PID to its list of loans.
+        """
+        return self._group_by('patron_pid', patron_pids, states)
+
+
+class MemoryLoanStore(LoanStore):
+    """Loan store keeping loans in process memory.
+
+    Loans are indexed by item, patron and state. They are copied on the way
+    in and out, so callers can freely modify what they get. Intended for
+    tests, benchmarks and single process deployments.
+    """
+
+    shared = False
+
+    _indexed = ('item_pid', 'patron_pid', 'state')
+
+    def __init__(self, app=None):
+        """Initialize the store."""
+        super(MemoryLoanStore, self).__init__(app)
+        self._lock = threading.RLock()
+        self._loans = {}
+        self._revisions = {}
+        self._counts = Counter()
+        self._due = []
+        self._transits = {}
+        self._arrivals = defaultdict(set)
+        self._indexes = dict(
+            (field, defaultdict(set)) for field in self._indexed)
+
+    def get_many(self, loan_pids):
+        """Return the loans for a list of PIDs, ``None`` for missing ones."""
+        with self._lock:
+            return [
+                dict(self._loans[pid]) if pid in self._loans else None
+                for pid in loan_pids
+            ]
+
+    def get_item_revisions(self, item_pids):
+        """Return the revisions of the loans of several items."""
+        with self._lock:
+            return dict(
+                (pid, self._revisions.get(pid, 0)) for pid in item_pids)
+
+    def put_many(self, loans, revisions=None, transits=None,
+                 max_counts=None):
+        """Create or update several loans at once."""
+        loans = [dict(loan) for loan in loans]
+        transits = transits or {}
+        item_pids = set(loan['item_pid'] for loan in loans) | set(transits)
+        with self._lock:
+            if revisions:
+                conflicts = [
+                    pid for pid in item_pids if pid in revisions and
+                    revisions[pid] != self._revisions.get(pid, 0)
+                ]
+                if conflicts:
+                    raise LoanConflictError(conflicts)
+            deltas = self._count_deltas(
+                (self._loans.get(loan['loan_pid']), loan) for loan in loans)
+            if max_counts and self._exceeded(
+                    deltas, max_counts, self._counts.__getitem__):
+                raise LoanConflictError(item_pids)
+            for pid in item_pids:
+                self._revisions[pid] = self._revisions.get(pid, 0) + 1
+            self._counts.update(deltas)
+            for loan in loans:
+                loan_pid = loan['loan_pid']
+                previous = self._loans.get(loan_pid)
+                for field, index in self._indexes.items():
+                    if previous is not None:
+                        index[previous.get(field)].discard(loan_pid)
+                    index[loan.get(field)].add(loan_pid)
+                if previous is not None and previous.get('end_date'):
+                    del self._due[bisect.bisect_left(
+                        self._due, (previous['end_date'], loan_pid))]
+                if loan.get('end_date'):
+                    bisect.insort(self._due, (loan['end_date'], loan_pid))
+                self._loans[loan_pid] = loan
+            for item_pid, transit in transits.items():
+                previous = self._transits.pop(item_pid, None)
+                if previous is not None:
+                    self._arrivals[previous['to_location_pid']].discard(
+                        item_pid)
+                if transit is not None:
+                    self._transits[item_pid] = dict(transit)
+                    self._arrivals[transit['to_location_pid']].add(item_pid)
+
+    def delete_many(self, loan_pids):
+        """Delete several loans at once."""
+        with self._lock:
+            loans = [
+                self._loans.pop(pid) for pid in loan_pids
+                if pid in self._loans
+            ]
+            self._counts.update(self._count_deltas(
+                (loan, None) for loan in loans))
+            for loan in loans:
+                loan_pid = loan['loan_pid']
+                for field, index in self._indexes.items():
+                    index[loan.get(field)].discard(loan_pid)
+                if loan.get('end_date'):
+                    del self._due[bisect.bisect_left(
+                        self._due, (loan['end_date'], loan_pid))]
+
+    def get_transits(self, item_pids):
+        """Return the transits of several items."""
+        with self._lock:
+            return dict(
+                (pid, dict(self._transits[pid])
+                 if pid in self._transits else None)
+                for pid in item_pids)
+
+    def search_transits(self, to_location_pids):
+        """Iterate over the transits to some locations."""
+        with self._lock:
+            transits = [
+                dict(self._transits[item_pid])
+                for location_pid in to_location_pids
+                for item_pid in self._arrivals.get(location_pid, ())
+            ]
+        return iter(transits)
+
+    def get_patron_counts(self, patron_pids):
+        """Return the number of loans on loan of patrons, per item type."""
+        patron_pids = set(patron_pids)
+        result = dict((pid, {}) for pid in patron_pids)
+        with self._lock:
+            for (patron_pid, item_type), count in self._counts.items():
+                if patron_pid in patron_pids and count:
+                    result[patron_pid][item_type] = count
+        return result
+
+    def reconcile_patron_counts(self):
+        """Rebuild the patron counters from the loans."""
+        with self._lock:
+            actual = self._count_loans(self.search(states=self.counted_states))
+            drift = dict(
+                (key, (self._counts[key], actual[key]))
+                for key in set(self._counts) | set(actual)
+                if self._counts[key] != actual[key])
+            self._counts = actual
+        return drift
+
+    def _lookup(self, field, values):
+        """Return the PIDs of loans with ``field`` in ``values``."""
+        index = self._indexes[field]
+        return set().union(*(index.get(value, ()) for value in values))
+
+    def _matching(self, item_pids, patron_pids, states):
+        """Return the PIDs of the loans matching all given criteria."""
+        criteria = [
+            (field, values) for field, values in zip(
+                self._indexed, (item_pids, patron_pids, states))
+            if values is not None
+        ]
+        if not criteria:
+            return list(self._loans)
+        return set.intersection(*(
+            self._lookup(field, values) for field, values in criteria))
+
+    def search(self, item_pids=None, patron_pids=None, states=None):
+        """Iterate over the loans matching all given criteria."""
+        with self._lock:
+            loans = [
+                dict(self._loans[pid])
+                for pid in self._matching(item_pids, patron_pids, states)
+            ]
+        return iter(loans)
+
+    def search_due(self, start=None, end=None, states=None):
+        """Iterate over the loans due between two dates, by due date."""
+        with self._lock:
+            lower = 0 if start is None else bisect.bisect_left(
+                self._due, (start, ))
+            upper = len(self._due) if end is None else bisect.bisect_left(
+                self._due, (end + '\0', ))
+            loans = [
+                dict(self._loans[pid]) for _, pid in self._due[lower:upper]
+                if states is None or self._loans[pid]['state'] in states
+            ]
+        return iter(loans)
+
+    def scan(self, after=None, limit=None, item_pids=None, patron_pids=None,
+             states=None):
+        """Return matching loans ordered by PID."""
+        with self._lock:
+            pids = (
+                pid for pid in self._matching(item_pids, patron_pids, states)
+                if after is None or pid > after)
+            pids = sorted(pids) if limit is None else \
+                heapq.nsmallest(limit, pids)
+            return [dict(self._loans[pid]) for pid in pids]
+
+
+class SQLAlchemyLoanStore(LoanStore):
+    """Loan store backed by the database.
+
+    Loans are stored in the
+    :class:`~invenio_circulation.models.LoanMetadata` table, which requires
+    Invenio-DB.
+    """
+
+    chunk_size = 500
+    """Maximum number of values in a SQL ``IN`` clause."""
+
+    def __init__(self, app=None):
+        """Initialize the store."""
+        from .models import ItemRevision, LoanMetadata, PatronLoanCount, \
+            TransitMetadata
+        super(SQLAlchemyLoanStore, self).__init__(app)
+        self.model = LoanMetadata
+        self.revision_model = ItemRevision
+        self.count_model = PatronLoanCount
+        self.transit_model = TransitMetadata
+
+    def _chunks(self, values):
+        """Split values in chunks of at most :attr:`chunk_size`."""
+        values = list(values)
+        for i in range(0, len(values), self.chunk_size):
+            yield values[i:i + self.chunk_size]
+
+    def _fetch(self, loan_pids):
+        """Return the models of a list of loans, keyed by PID."""
+        result = {}
+        for chunk in self._chunks(loan_pids):
+            query = self.model.query.filter(self.model.loan_pid.in_(chunk))
+            result.update((model.loan_pid, model) for model in query)
+        return result
+
+    def _fetch_revisions(self, item_pids):
+        """Return the revision models of a list of items, keyed by PID."""
+        model = self.revision_model
+        result = {}
+        for chunk in self._chunks(item_pids):
+            query = model.query.filter(model.item_pid.in_(chunk))
+            result.update((row.item_pid, row) for row in query)
+        return result
+
+    def get_item_revisions(self, item_pids):
+        """Return the revisions of the loans of several items."""
+        rows = self._fetch_revisions(item_pids)
+        return dict(
+            (pid, rows[pid].revision_id if pid in rows else 0)
+            for pid in item_pids)
+
+    def _increment_revisions(self, item_pids, revisions):
+        """Increment the revisions of items, checking the expected ones.
+
+        The revision column is the version counter of the model, so the
+        ``UPDATE`` fails if another transaction incremented it after it was
+        read here.
+        """
+        from invenio_db import db
+        rows = self._fetch_revisions(item_pids)
+        conflicts = [
+            pid for pid in item_pids if pid in revisions and
+            revisions[pid] != (rows[pid].revision_id if pid in rows else 0)
+        ]
+        if conflicts:
+            raise LoanConflictError(conflicts)
+        for pid in item_pids:
+            if pid in rows:
+                rows[pid].revision_id += 1
+            else:
+                db.session.add(
+                    self.revision_model(item_pid=pid, revision_id=1))
+
+    def get_many(self, loan_pids):
+        """Return the loans for a list of PIDs, ``None`` for missing ones."""
+        models = self._fetch(loan_pids)
+        return [
+            dict(models[pid].json) if pid in models else None
+            for pid in loan_pids
+        ]
+
+    def _fetch_counts(self, patron_pids):
+        """Return the counter models of patrons, keyed by counter."""
+        model = self.count_model
+        result = {}
+        for chunk in self._chunks(patron_pids):
+            query = model.query.filter(model.patron_pid.in_(chunk))
+            result.update(
+                ((row.patron_pid, row.item_type or None), row)
+                for row in query)
+        return result
+
+    def _increment_counts(self, deltas, max_counts=None):
+        """Increment patron counters.
+
+        Counters with a maximum are incremented with a conditional
+        ``UPDATE``, which waits for concurrent transactions incrementing the
+        same counter and then checks the maximum against their result.
+
+        :returns: the PIDs of the patrons whose counters would exceed their
+            maximum.
+        """
+        from invenio_db import db
+        model = self.count_model
+        max_counts = max_counts or {}
+        rows = self._fetch_counts(set(key[0] for key in deltas))
+        exceeded = self._exceeded(
+            dict((key, delta) for key, delta in deltas.items()
+                 if key not in rows),
+            max_counts, lambda key: 0)
+        for key, delta in deltas.items():
+            if key not in rows:
+                db.session.add(model(
+                    patron_pid=key[0], item_type=key[1] or '', count=delta))
+            elif delta > 0 and key in max_counts:
+                updated = model.query.filter(
+                    model.patron_pid == key[0],
+                    model.item_type == (key[1] or ''),
+                    model.count + delta <= max_counts[key],
+                ).update({model.count: model.count + delta},
+                         synchronize_session=False)
+                if not updated:
+                    exceeded.add(key[0])
+            else:
+                # Increment in SQL, concurrent transactions may do the same.
+                rows[key].count = model.count + delta
+        return exceeded
+
+    def get_patron_counts(self, patron_pids):
+        """Return the number of loans on loan of patrons, per item type."""
+        result = dict((pid, {}) for pid in patron_pids)
+        for (patron_pid, item_type), row in \
+                self._fetch_counts(patron_pids).items():
+            if row.count:
+                result[patron_pid][item_type] = row.count
+        return result
+
+    def reconcile_patron_counts(self):
+        """Rebuild the patron counters from the loans.
+
+        The counters are locked before the loans are counted, so that
+        concurrent writes of counted loans wait for the new counters
+        instead of being overwritten.
+        """
+        from invenio_db import db
+        try:
+            drift = {}
+            rows = dict(
+                ((row.patron_pid, row.item_type or None), row)
+                for row in self.count_model.query.with_for_update())
+            actual = self._count_loans(self.iter_loans(
+                states=self.counted_states, compact=True))
+            for key in set(rows) | set(actual):
+                counter = rows[key].count if key in rows else 0
+                if counter != actual[key]:
+                    drift[key] = (counter, actual[key])
+                    if key in rows:
+                        rows[key].count = actual[key]
+                    else:
+                        db.session.add(self.count_model(
+                            patron_pid=key[0], item_type=key[1] or '',
+                            count=actual[key]))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return drift
+
+    def _fetch_transits(self, item_pids):
+        """Return the transit models of a list of items, keyed by PID."""
+        model = self.transit_model
+        result = {}
+        for chunk in self._chunks(item_pids):
+            query = model.query.filter(model.item_pid.in_(chunk))
+            result.update((row.item_pid, row) for row in query)
+        return result
+
+    def _put_transits(self, transits):
+        """Create, update or delete transits."""
+        from invenio_db import db
+        rows = self._fetch_transits(transits)
+        for item_pid, transit in transits.items():
+            row = rows.get(item_pid)
+            if transit is None:
+                if row is not None:
+                    db.session.delete(row)
+                continue
+            if row is None:
+                row = self.transit_model(item_pid=item_pid)
+                db.session.add(row)
+            row.to_location_pid = transit['to_location_pid']
+            row.json = dict(transit)
+
+    def delete_many(self, loan_pids):
+        """Delete several loans in one transaction."""
+        from invenio_db import db
+        try:
+            models = self._fetch(loan_pids)
+            self._increment_counts(self._count_deltas(
+                (model.json, None) for model in models.values()))
+            for model in models.values():
+                db.session.delete(model)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+    def get_transits(self, item_pids):
+        """Return the transits of several items."""
+        rows = self._fetch_transits(item_pids)
+        return dict(
+            (pid, dict(rows[pid].json) if pid in rows else None)
+            for pid in item_pids)
+
+    def search_transits(self, to_location_pids):
+        """Iterate over the transits to some locations."""
+        model = self.transit_model
+        query = model.query.filter(
+            model.to_location_pid.in_(list(to_location_pids)))
+        for row in query.yield_per(self.chunk_size):
+            yield dict(row.json)
+
+    def put_many(self, loans, revisions=None, transits=None,
+                 max_counts=None):
+        """Create or update several loans in one transaction."""
+        from invenio_db import db
+        from sqlalchemy.exc import IntegrityError
+        from sqlalchemy.orm.exc import StaleDataError
+        loans = list(loans)
+        transits = transits or {}
+        item_pids = set(loan['item_pid'] for loan in loans) | set(transits)
+        try:
+            self._increment_revisions(item_pids, revisions or {})
+            models = self._fetch(loan['loan_pid'] for loan in loans)
+            if self._increment_counts(self._count_deltas(
+                    (models[loan['loan_pid']].json
+                     if loan['loan_pid'] in models else None, loan)
+                    for loan in loans), max_counts):
+                raise LoanConflictError(item_pids)
+            for loan in loans:
+                model = models.get(loan['loan_pid'])
+                if model is None:
+                    model = models[loan['loan_pid']] = self.model(
+                        loan_pid=loan['loan_pid'])
+                    db.session.add(model)
+                model.item_pid = loan['item_pid']
+                model.patron_pid = loan.get('patron_pid')
+                model.state = loan['state']
+                model.end_date = loan.get('end_date')
+                model.json = dict(loan)
+            self._put_transits(transits)
+            db.session.commit()
+        except (IntegrityError, StaleDataError):
+            # Another transaction created or incremented the same revisions.
+            db.session.rollback()
+            raise LoanConflictError(item_pids)
+        except Exception:
+            db.session.rollback()
+            raise
+
+    def _query(self, item_pids, patron_pids, states):
+        """Return the query of the loans matching all given criteria."""
+        query = self.model.query
+        for column, values in ((self.model.item_pid, item_pids),
+                               (self.model.patron_pid, patron_pids),
+                               (self.model.state, states)):
+            if values is not None:
+                query = query.filter(column.in_(list(values)))
+        return query
+
+    def search(self, item_pids=None, patron_pids=None, states=None):
+        """Iterate over the loans matching all given criteria."""
+        query = self._query(item_pids, patron_pids, states)
+        for model in query.yield_per(self.chunk_size):
+            yield dict(model.json)
+
+    def search_due(self, start=None, end=None, states=None):
+        """Iterate over the loans due between two dates, by due date."""
+        query = self._query(None, None, states).filter(
+            self.model.end_date.isnot(None))
+        if start is not None:
+            query = query.filter(self.model.end_date >= start)
+        if end is not None:
+            query = query.filter(self.model.end_date <= end)
+        query = query.order_by(self.model.end_date, self.model.loan_pid)
+        for model in query.yield_per(self.chunk_size):
+            yield dict(model.json)
+
+    def scan(self, after=None, limit=None, item_pids=None, patron_pids=None,
+             states=None):
+        """Return matching loans ordered by PID."""
+        query = self._query(item_pids, patron_pids, states)
+        if after is not None:
+            query = query.filter(self.model.loan_pid > after)
+        query = query.order_by(self.model.loan_pid).limit(limit)
+        return [dict(model.json) for model in query]
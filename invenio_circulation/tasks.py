@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 CERN.
+#
+# Invenio-Circulation is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Celery tasks."""
+
+from __future__ import absolute_import, print_function
+
+from datetime import datetime
+
+from celery import group, shared_task
+from flask import current_app
+
+from .archive import archive_loans as _archive_loans
+from .errors import LoanIndexerConfigError
+from .notifications import prepare_notices, send_notice_chunk
+from .proxies import current_circulation
+
+
+@shared_task(ignore_result=True)
+def process_loan_indexer_queue(force=False):
+    """Index the loans and items queued by the loan indexer.
+
+    Schedule it with Celery beat at the interval of the deduplication
+    window, e.g.:
+
+    .. code-block:: python
+
+        CELERY_BEAT_SCHEDULE = {
+            'circulation-indexer': {
+                'task': 'invenio_circulation.tasks'
+                        '.process_loan_indexer_queue',
+                'schedule': timedelta(seconds=5),
+            },
+        }
+
+    :raises LoanIndexerConfigError: if the indexer queue is not shared by
+        all processes, e.g. the default in-process queue, whose documents
+        the Celery workers cannot see.
+    """
+    indexer = current_circulation.indexer
+    if not indexer.queue.shared:
+        raise LoanIndexerConfigError(
+            'CIRCULATION_INDEXER_QUEUE must be shared by all processes, '
+            'e.g. invenio_circulation.indexer:KombuIndexerQueue, to be '
+            'processed by Celery workers.')
+    return indexer.flush(force=force)
+
+
+@shared_task(ignore_result=True)
+def reconcile_patron_limits():
+    """Rebuild the patron loan counters from the loans.
+
+    Counters drift only if loans are written outside of the loan store, or
+    after a failure. Schedule it daily with Celery beat. Each wrong counter
+    is logged as a warning.
+    """
+    drift = current_circulation.limits.reconcile()
+    for (patron_pid, item_type), (counter, actual) in drift.items():
+        current_app.logger.warning(
+            'Circulation counter of patron %s for item type %s was %s '
+            'instead of %s.', patron_pid, item_type, counter, actual)
+    return len(drift)
+
+
+@shared_task(ignore_result=True)
+def send_notices(today=None):
+    """Send the loan notices of a day, one task per chunk of patrons.
+
+    Schedule it daily with Celery beat.
+
+    :param today: the day as an ISO date, defaults to today.
+    """
+    if today:
+        today = datetime.strptime(today, '%Y-%m-%d').date()
+    chunks = prepare_notices(today)
+    if chunks:
+        group(send_notice_chunk_task.s(chunk) for chunk in chunks).delay()
+    return len(chunks)
+
+
+@shared_task(ignore_result=True)
+def send_notice_chunk_task(chunk):
+    """Send the loan notices of a chunk of patrons."""
+    return send_notice_chunk(chunk)
+
+
+@shared_task(ignore_result=True)
+def archive_loans(age=None):
+    """Move old finished loans to the loan archive.
+
+    Schedule it daily or weekly with Celery beat.
+    """
+    return _archive_loans(age=age)
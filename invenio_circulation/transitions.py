@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 CERN.
+#
+# Invenio-Circulation is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Loan state machine."""
+
+from __future__ import absolute_import, print_function
+
+from .errors import InvalidLoanTransitionError, LoanTransitionsConfigError
+
+
+class LoanTransitions(object):
+    """Compiled loan transitions table.
+
+    The configuration lists the transitions leaving each state. It is
+    compiled once into a dictionary keyed by ``(state, trigger)`` so that
+    validating a transition is a single lookup, whatever the number of
+    configured rules.
+    """
+
+    def __init__(self, transitions, initial_state, on_loan_states=(),
+                 unavailable_states=(), pending_states=()):
+        """Compile the transitions table.
+
+        :param transitions: mapping of state to a list of transitions, see
+            :data:`invenio_circulation.config.CIRCULATION_LOAN_TRANSITIONS`.
+        :param initial_state: state of a newly created loan.
+        :param on_loan_states: states in which the item is lent.
+        :param unavailable_states: other states in which a loan holds its
+            item.
+        :param pending_states: states of loans waiting for their item.
+        """
+        self.initial_state = initial_state
+        self.on_loan_states = frozenset(on_loan_states)
+        self.unavailable_states = self.on_loan_states | frozenset(
+            unavailable_states)
+        self.pending_states = frozenset(pending_states)
+        self._table = {}
+        self._triggers = {}
+        for state, rules in transitions.items():
+            self._triggers[state] = frozenset(
+                rule['trigger'] for rule in rules)
+            for rule in rules:
+                key = (state, rule['trigger'])
+                if key in self._table:
+                    raise LoanTransitionsConfigError(
+                        'Trigger "{0}" is defined twice for state "{1}".'
+                        .format(rule['trigger'], state))
+                if rule['dest'] not in transitions:
+                    raise LoanTransitionsConfigError(
+                        'Unknown destination state "{0}".'.format(
+                            rule['dest']))
+                self._table[key] = rule['dest']
+        if initial_state not in transitions:
+            raise LoanTransitionsConfigError(
+                'Unknown initial state "{0}".'.format(initial_state))
+        self.states = frozenset(transitions)
+        self.final_states = frozenset(
+            state for state, triggers in self._triggers.items()
+            if not triggers)
+        self.active_states = self.states - self.final_states
+        self.all_triggers = frozenset(
+            trigger for (_, trigger) in self._table)
+
+    @classmethod
+    def from_app(cls, app):
+        """Build the transitions table from the application configuration."""
+        return cls(
+            app.config['CIRCULATION_LOAN_TRANSITIONS'],
+            app.config['CIRCULATION_LOAN_INITIAL_STATE'],
+            app.config['CIRCULATION_LOAN_ON_LOAN_STATES'],
+            app.config['CIRCULATION_LOAN_ITEM_UNAVAILABLE_STATES'],
+            app.config['CIRCULATION_LOAN_PENDING_STATES'],
+        )
+
+    def can(self, state, trigger):
+        """Check if ``trigger`` can be applied to a loan in ``state``."""
+        return (state, trigger) in self._table
+
+    def validate(self, state, trigger):
+        """Return the destination state of a transition.
+
+        :raises InvalidLoanTransitionError: if the transition is not allowed.
+        """
+        try:
+            return self._table[(state, trigger)]
+        except KeyError:
+            raise InvalidLoanTransitionError(state, trigger)
+
+    def triggers(self, state):
+        """Return the triggers which can be applied from ``state``."""
+        return self._triggers.get(state, frozenset())
+
+    def is_active(self, state):
+        """Check if a loan in ``state`` can still change."""
+        return state not in self.final_states
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 CERN.
+#
+# Invenio-Circulation is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Utility functions."""
+
+from __future__ import absolute_import, print_function
+
+import six
+from werkzeug.utils import import_string
+
+
+def obj_or_import_string(value, default=None):
+    """Import a string or return the object.
+
+    :param value: an import path or an object.
+    :param default: returned when ``value`` is empty.
+    """
+    if isinstance(value, six.string_types):
+        return import_string(value)
+    elif value:
+        return value
+    return default
@@ -12,9 +12,19 @@
 
 from __future__ import absolute_import, print_function
 
-from flask import Blueprint, render_template
+import base64
+import binascii
+import json
+
+from flask import Blueprint, Response, abort, current_app, jsonify, \
+    render_template, request, url_for
 from flask_babelex import gettext as _
 
+from .cache import cached
+from .errors import CirculationException
+from .proxies import current_circulation
+from .utils import obj_or_import_string
+
 blueprint = Blueprint(
     'invenio_circulation',
     __name__,
@@ -22,10 +32,287 @@ blueprint = Blueprint(
     static_folder='static',
 )
 
+api_blueprint = Blueprint(
+    'invenio_circulation_rest',
+    __name__,
+    url_prefix='/circulation',
+)
+"""Read-only REST API, registered on the API application."""
+
+
+@blueprint.errorhandler(CirculationException)
+@api_blueprint.errorhandler(CirculationException)
+def circulation_error(error):
+    """Serialize circulation errors as JSON."""
+    response = jsonify(status=error.code, message=str(error))
+    response.status_code = error.code
+    return response
+
 
 @blueprint.route("/")
+@cached()
 def index():
     """Render a basic view."""
     return render_template(
         "invenio_circulation/index.html",
         module_name=_('Invenio-Circulation'))
+
+
+@blueprint.route("/items/<item_pid>")
+@cached('item:{item_pid}')
+def item_status(item_pid):
+    """Render the availability of an item."""
+    return render_template(
+        "invenio_circulation/item_status.html",
+        item=current_circulation.availability.get(item_pid))
+
+
+def _require(factory_name, *args, **kwargs):
+    """Abort with ``403`` if the permission of a factory is not granted."""
+    factory = obj_or_import_string(current_app.config[factory_name])
+    if not factory(*args, **kwargs).can():
+        abort(403)
+
+
+def _check_permission(action):
+    """Abort with ``403`` if the current user cannot apply an action."""
+    _require('CIRCULATION_ACTION_PERMISSION_FACTORY', action)
+
+
+def _check_read_permission(**kwargs):
+    """Abort with ``403`` if the current user cannot read loans."""
+    _require('CIRCULATION_LOAN_READ_PERMISSION_FACTORY', **kwargs)
+
+
+@blueprint.route("/loans/bulk", methods=['POST'])
+def bulk_action():
+    """Apply a circulation action to a batch of items.
+
+    The request body is a JSON object with the ``action`` (e.g. ``checkin``)
+    and the list of ``operations``, each one with an ``item_pid``, an
+    optional ``patron_pid`` and other loan fields among
+    :data:`~invenio_circulation.config.CIRCULATION_CLIENT_LOAN_FIELDS`. The
+    response lists the outcome of each operation, in the same order.
+    """
+    from .api import bulk_loan_action, check_client_fields
+    data = request.get_json(silent=True) or {}
+    action = data.get('action')
+    operations = data.get('operations')
+    if action not in current_circulation.loan_transitions.all_triggers or \
+            not isinstance(operations, list) or \
+            not all(isinstance(op, dict) and op.get('item_pid')
+                    for op in operations):
+        abort(400)
+    _check_permission(action)
+    for operation in operations:
+        check_client_fields(operation)
+
+    return jsonify(results=_serialize_results(
+        bulk_loan_action(action, operations)))
+
+
+@blueprint.route("/patrons/<patron_pid>/renew", methods=['POST'])
+def renew_all(patron_pid):
+    """Renew all loans of a patron.
+
+    The response lists the outcome of each loan, like the bulk action.
+    """
+    from .renewals import renew_patron_loans
+    _check_permission('extend')
+    return jsonify(results=_serialize_results(
+        renew_patron_loans([patron_pid])))
+
+
+def _serialize_results(results):
+    """Serialize the outcomes of circulation actions."""
+    serialized = []
+    for result in results:
+        if result.error:
+            serialized.append(dict(
+                item_pid=result.item_pid,
+                status=result.error.code,
+                message=str(result.error),
+            ))
+        else:
+            serialized.append(dict(
+                item_pid=result.item_pid,
+                status=200,
+                loan=result.loan,
+                transit=result.transit,
+            ))
+    return serialized
+
+
+@blueprint.route("/patrons/<patron_pid>/summary")
+def patron_summary(patron_pid):
+    """Return the loan summary of a patron."""
+    _check_read_permission(patron_pid=patron_pid)
+    summary = current_circulation.patron_summaries.get(patron_pid)
+    return jsonify(summary._asdict())
+
+
+@blueprint.route("/events")
+def events():
+    """Stream loan, hold and transit events as server-sent events.
+
+    Events are selected with one or more ``location_pid`` and
+    ``patron_pid`` parameters. Each event has the type ``loan``, ``hold``
+    or ``transit``, and its data is a JSON object. When the client is too
+    slow, the oldest events are dropped and an ``overflow`` event gives the
+    number of dropped events. Each stream holds a worker, so the endpoint
+    should be served by an asynchronous worker (e.g. gevent). With several
+    processes, streams only receive the events of other processes through
+    :data:`~invenio_circulation.config.CIRCULATION_EVENTS_BROKER`.
+    """
+    location_pids = request.args.getlist('location_pid')
+    patron_pids = request.args.getlist('patron_pid')
+    if not location_pids and not patron_pids:
+        abort(400)
+    for pid in location_pids:
+        _check_read_permission(location_pid=pid)
+    for pid in patron_pids:
+        _check_read_permission(patron_pid=pid)
+    channels = [
+        'location:{0}'.format(pid) for pid in location_pids
+    ] + [
+        'patron:{0}'.format(pid) for pid in patron_pids
+    ]
+    subscription = current_circulation.events.subscribe(channels)
+    keepalive = current_app.config['CIRCULATION_EVENTS_KEEPALIVE']
+
+    def stream():
+        with subscription:
+            while True:
+                events, dropped = subscription.get(timeout=keepalive)
+                if dropped:
+                    yield 'event: overflow\ndata: {0}\n\n'.format(
+                        json.dumps(dict(dropped=dropped)))
+                for event in events:
+                    yield 'id: {0}\nevent: {1}\ndata: {2}\n\n'.format(
+                        event['id'], event['type'],
+                        json.dumps(event, sort_keys=True))
+                if not events and not dropped:
+                    yield ': keep-alive\n\n'
+
+    return Response(stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+
+
+@blueprint.route("/metrics")
+def metrics():
+    """Export the duration of circulation actions for Prometheus."""
+    sink = current_circulation.instrumentation.sink
+    if sink is None:
+        abort(404)
+    try:
+        body = sink.export()
+    except NotImplementedError:
+        abort(404)
+    return Response(body, mimetype='text/plain; version=0.0.4')
+
+
+def encode_cursor(loan_pid):
+    """Return the opaque cursor of the page following a loan."""
+    return base64.urlsafe_b64encode(
+        loan_pid.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return the loan PID of a cursor, ``None`` if the cursor is invalid."""
+    try:
+        loan_pid = base64.urlsafe_b64decode(
+            str(cursor) + '=' * (-len(cursor) % 4)).decode('utf-8')
+    except (TypeError, ValueError, binascii.Error):
+        return None
+    # Decoding skips invalid characters, only accept canonical cursors.
+    return loan_pid if encode_cursor(loan_pid) == cursor else None
+
+
+def _fields():
+    """Return the loan fields requested with ``fields``, ``None`` for all."""
+    fields = request.args.get('fields')
+    if not fields:
+        return None
+    return set(field for field in fields.split(',') if field) | \
+        set(['loan_pid'])
+
+
+def _conditional(response):
+    """Add an ETag to a response, and answer ``304`` if it matches."""
+    response.add_etag()
+    return response.make_conditional(request)
+
+
+@api_blueprint.route('/loans')
+def list_loans():
+    """List loans ordered by PID.
+
+    Loans can be filtered with one or more ``item_pid``, ``patron_pid`` and
+    ``state`` parameters, ``fields`` selects a comma separated list of loan
+    fields and ``size`` the number of loans per page. Pages are followed
+    with the ``next`` link, whose ``cursor`` is the position of the last
+    loan of the page, so that each page costs the same whatever its depth.
+    """
+    _check_read_permission()
+    size = request.args.get(
+        'size', current_app.config['CIRCULATION_REST_DEFAULT_PAGE_SIZE'],
+        type=int)
+    if not 0 < size <= current_app.config['CIRCULATION_REST_MAX_PAGE_SIZE']:
+        abort(400)
+    after = None
+    if 'cursor' in request.args:
+        after = decode_cursor(request.args['cursor'])
+        if after is None:
+            abort(400)
+    criteria = dict(
+        (name + 's', request.args.getlist(name) or None)
+        for name in ('item_pid', 'patron_pid', 'state'))
+    loans = current_circulation.loan_store.scan(
+        after=after, limit=size + 1, **criteria)
+
+    links = dict(self=url_for(
+        '.list_loans', _external=True, **request.args.to_dict(flat=False)))
+    if len(loans) > size:
+        loans = loans[:size]
+        args = request.args.to_dict(flat=False)
+        args['cursor'] = encode_cursor(loans[-1]['loan_pid'])
+        links['next'] = url_for('.list_loans', _external=True, **args)
+    fields = _fields()
+    if fields is not None:
+        loans = [
+            dict((key, value) for key, value in loan.items() if key in fields)
+            for loan in loans
+        ]
+    return _conditional(jsonify(hits=loans, links=links))
+
+
+@api_blueprint.route('/loans/<loan_pid>')
+def get_loan(loan_pid):
+    """Return a loan, with the loan fields selected by ``fields``."""
+    loan = current_circulation.loan_store.get(loan_pid)
+    if loan is None:
+        abort(404)
+    _check_read_permission(loan=loan)
+    fields = _fields()
+    if fields is not None:
+        loan = dict(
+            (key, value) for key, value in loan.items() if key in fields)
+    return _conditional(jsonify(loan))
+
+
+@api_blueprint.route('/locations/<location_pid>/arrivals')
+def arrivals(location_pid):
+    """List the transits of the items on their way to a location."""
+    from .api import get_arrivals
+    _check_read_permission(location_pid=location_pid)
+    return _conditional(jsonify(hits=get_arrivals(location_pid)))
+
+
+@api_blueprint.route('/patrons/<patron_pid>/history')
+def patron_history(patron_pid):
+    """List all loans of a patron, archived ones included."""
+    from .archive import get_patron_history
+    _check_read_permission(patron_pid=patron_pid)
+    return _conditional(jsonify(hits=get_patron_history(patron_pid)))
@@ -15,8 +15,10 @@ readme = open('README.rst').read()
 history = open('CHANGES.rst').read()
 
 tests_require = [
+    'celery>=4.1.0',
     'check-manifest>=0.25',
     'coverage>=4.0',
+    'invenio-db>=1.0.0',
     'isort>=4.3.3',
     'pydocstyle>=1.0.0',
     'pytest-cache>=1.0',
@@ -25,15 +27,34 @@ tests_require = [
     'pytest>=2.8.0',
 ]
 
+invenio_db_version = '>=1.0.0,<1.1.0'
+
 extras_require = {
+    'benchmarks': [
+        'pytest-benchmark>=3.1.0',
+    ],
+    'celery': [
+        'celery>=4.1.0',
+    ],
     'docs': [
         'Sphinx>=1.5.1',
     ],
+    'mysql': [
+        'invenio-db[mysql]{0}'.format(invenio_db_version),
+    ],
+    'postgresql': [
+        'invenio-db[postgresql]{0}'.format(invenio_db_version),
+    ],
+    'sqlite': [
+        'invenio-db{0}'.format(invenio_db_version),
+    ],
     'tests': tests_require,
 }
 
 extras_require['all'] = []
-for reqs in extras_require.values():
+for name, reqs in extras_require.items():
+    if name in ('mysql', 'postgresql', 'sqlite'):
+        continue
     extras_require['all'].extend(reqs)
 
 setup_requires = [
@@ -43,6 +64,8 @@ setup_requires = [
 
 install_requires = [
     'Flask-BabelEx>=0.9.2',
+    'numpy>=1.13.0',
+    'six>=1.12.0',
 ]
 
 packages = find_packages()
@@ -72,18 +95,26 @@ setup(
         'invenio_base.apps': [
             'invenio_circulation = invenio_circulation:InvenioCirculation',
         ],
+        'invenio_base.api_apps': [
+            'invenio_circulation = invenio_circulation:InvenioCirculation',
+        ],
+        'invenio_base.api_blueprints': [
+            'invenio_circulation = invenio_circulation.views:api_blueprint',
+        ],
         'invenio_i18n.translations': [
             'messages = invenio_circulation',
         ],
+        'invenio_celery.tasks': [
+            'invenio_circulation = invenio_circulation.tasks',
+        ],
+        'invenio_db.models': [
+            'invenio_circulation = invenio_circulation.models',
+        ],
         # TODO: Edit these entry points to fit your needs.
         # 'invenio_access.actions': [],
         # 'invenio_admin.actions': [],
         # 'invenio_assets.bundles': [],
-        # 'invenio_base.api_apps': [],
-        # 'invenio_base.api_blueprints': [],
         # 'invenio_base.blueprints': [],
-        # 'invenio_celery.tasks': [],
-        # 'invenio_db.models': [],
         # 'invenio_pidstore.minters': [],
         # 'invenio_records.jsonresolver': [],
     },
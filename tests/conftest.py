@@ -9,12 +9,16 @@
 
 from __future__ import absolute_import, print_function
 
+import os
 import shutil
 import tempfile
 
 import pytest
 from flask import Flask
 from flask_babelex import Babel
+from invenio_db import InvenioDB
+from invenio_db import db as db_
+from sqlalchemy_utils.functions import create_database, database_exists
 
 
 @pytest.yield_fixture()
@@ -42,3 +46,25 @@ def app(base_app):
     """Flask application fixture."""
     with base_app.app_context():
         yield base_app
+
+
+@pytest.yield_fixture()
+def db(base_app):
+    """Database fixture."""
+    base_app.config.update(
+        CIRCULATION_LOAN_STORE=(
+            'invenio_circulation.storage:SQLAlchemyLoanStore'),
+        SQLALCHEMY_DATABASE_URI=os.environ.get(
+            'SQLALCHEMY_DATABASE_URI', 'sqlite://'),
+        SQLALCHEMY_TRACK_MODIFICATIONS=False,
+    )
+    InvenioDB(base_app)
+    # Register the models, the entry point is only read once installed.
+    import invenio_circulation.models  # noqa
+    with base_app.app_context():
+        if not database_exists(str(db_.engine.url)):
+            create_database(str(db_.engine.url))
+        db_.create_all()
+        yield db_
+        db_.session.remove()
+        db_.drop_all()
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 CERN.
+#
+# Invenio-Circulation is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Asyncio service tests."""
+
+from __future__ import absolute_import, print_function
+
+import asyncio
+import json
+
+import pytest
+
+from invenio_circulation import InvenioCirculation
+from invenio_circulation.aio import AsyncCirculation, KioskServer
+from invenio_circulation.proxies import current_circulation
+
+
+class FakeWriter(object):
+    """Stream writer collecting the responses of the server."""
+
+    def __init__(self):
+        """Initialize the writer."""
+        self.data = b''
+        self.closed = False
+
+    def write(self, data):
+        """Collect data."""
+        self.data += data
+
+    async def drain(self):
+        """Wait for nothing."""
+
+    def close(self):
+        """Close the writer."""
+        self.closed = True
+
+
+class FakeKioskClient(object):
+    """Kiosk client talking to the server without sockets."""
+
+    def __init__(self, server):
+        """Initialize the client."""
+        self.server = server
+
+    async def session(self, *lines):
+        """Send request lines in one connection, return the responses."""
+        reader = asyncio.StreamReader()
+        reader.feed_data(''.join(line + '\n' for line in lines).encode())
+        reader.feed_eof()
+        writer = FakeWriter()
+        await self.server.handle(reader, writer)
+        assert writer.closed
+        return writer.data.decode('utf-8').splitlines()
+
+
+@pytest.fixture()
+def loop():
+    """Event loop."""
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture()
+def server(app):
+    """Kiosk server."""
+    InvenioCirculation(app)
+    circulation = AsyncCirculation(app)
+    yield KioskServer(circulation)
+    circulation.executor.shutdown()
+
+
+def _ok(response):
+    """Return the JSON of a successful response."""
+    status, data = response.split(' ', 1)
+    assert status == 'OK'
+    return json.loads(data)
+
+
+def test_async_actions(app, loop):
+    """Test that the actions share the state of the application."""
+    InvenioCirculation(app)
+    circulation = AsyncCirculation(app)
+
+    async def actions():
+        loans = await asyncio.gather(*[
+            circulation.checkout('item{0}'.format(i), 'patron1')
+            for i in range(10)
+        ])
+        status = await circulation.item_status('item3')
+        renewed = await circulation.renew('item3')
+        returned = await circulation.checkin('item3')
+        return loans, status, renewed, returned
+
+    loans, status, renewed, returned = loop.run_until_complete(actions())
+    assert len(set(loan['loan_pid'] for loan in loans)) == 10
+    assert status['loan_pid'] == loans[3]['loan_pid']
+    assert renewed['extension_count'] == 1
+    assert returned['state'] == 'ITEM_RETURNED'
+    assert current_circulation.availability.get('item3').available
+    circulation.executor.shutdown()
+
+
+def test_kiosk_protocol(server, loop):
+    """Test the kiosk protocol with the fake client."""
+    client = FakeKioskClient(server)
+    responses = loop.run_until_complete(client.session(
+        'CHECKOUT item1 patron1 transaction_location_pid=desk',
+        'STATUS item1',
+        'checkout item1 patron2',
+        'RENEW item1',
+        'CHECKIN item1',
+        '',
+        'STATUS',
+        'UNKNOWN item1',
+        'CHECKOUT item2 patron1 patron_pid=patron2',
+        'CHECKOUT item2 patron1 end_date=2099-01-01',
+        'QUIT',
+        'STATUS item1',
+    ))
+    assert len(responses) == 10
+    loan = _ok(responses[0])
+    assert loan['transaction_location_pid'] == 'desk'
+    assert _ok(responses[1])['available'] is False
+    assert responses[2].startswith('ERR 400 ')
+    assert _ok(responses[3])['extension_count'] == 1
+    assert _ok(responses[4])['state'] == 'ITEM_RETURNED'
+    assert responses[5:] == [
+        'ERR 400 Empty request.', 'ERR 400 Invalid request.',
+        'ERR 400 Invalid request.', 'ERR 400 Invalid request.',
+        'ERR 400 Loan field "end_date" cannot be set.',
+    ]
+
+
+def test_kiosk_errors(server, loop):
+    """Test that unexpected errors are answered."""
+    def failing(*args, **kwargs):
+        raise IOError('Database is down.')
+    server.circulation.checkin = failing
+    client = FakeKioskClient(server)
+    responses = loop.run_until_complete(client.session(
+        'CHECKIN item1', 'STATUS item1'))
+    assert responses[0] == 'ERR 500 Internal error.'
+    assert _ok(responses[1])['available'] is True
+
+
+def test_kiosk_server(server, loop):
+    """Test the kiosk server over TCP."""
+    async def session():
+        tcp_server = await server.start('127.0.0.1', 0)
+        port = tcp_server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(b'CHECKOUT item1 patron1\nSTATUS item1\n')
+        responses = [await reader.readline(), await reader.readline()]
+        writer.write(b'QUIT\n')
+        assert await reader.read() == b''
+        writer.close()
+        tcp_server.close()
+        await tcp_server.wait_closed()
+        return [line.decode('utf-8') for line in responses]
+
+    responses = loop.run_until_complete(session())
+    assert _ok(responses[1])['loan_pid'] == _ok(responses[0])['loan_pid']
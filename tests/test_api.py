@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 CERN.
+#
+# Invenio-Circulation is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Circulation API tests."""
+
+from __future__ import absolute_import, print_function
+
+import json
+
+import pytest
+
+from invenio_circulation import InvenioCirculation
+from invenio_circulation.api import bulk_loan_action, checkin, checkout, \
+    loan_action
+from invenio_circulation.errors import InvalidLoanTransitionError, \
+    ItemNotAvailableError, LoanConflictError, LoanMaxExtensionsError, \
+    LoanNotFoundError, MissingRequiredParameterError
+from invenio_circulation.permissions import allow_all
+from invenio_circulation.proxies import current_circulation
+from invenio_circulation.signals import loan_state_changed
+
+
+def test_checkout_checkin(app):
+    """Test a simple loan lifecycle."""
+    InvenioCirculation(app)
+    loan = checkout('item1', 'patron1')
+    assert loan['state'] == 'ITEM_ON_LOAN'
+    assert loan['start_date']
+    assert current_circulation.loan_store.get(loan['loan_pid']) == loan
+
+    with pytest.raises(ItemNotAvailableError):
+        checkout('item1', 'patron2')
+
+    loan = loan_action('extend', 'item1', 'patron1')
+    assert loan['extension_count'] == 1
+
+    loan = checkin('item1')
+    assert loan['state'] == 'ITEM_RETURNED'
+
+    with pytest.raises(LoanNotFoundError):
+        checkin('item1')
+    with pytest.raises(MissingRequiredParameterError):
+        loan_action('checkout', 'item1')
+
+
+def test_request_then_checkout(app):
+    """Test that a checkout uses the pending loan of the patron."""
+    InvenioCirculation(app)
+    pending = loan_action('request', 'item1', 'patron1')
+    assert pending['state'] == 'PENDING'
+    with pytest.raises(InvalidLoanTransitionError):
+        loan_action('extend', 'item1', 'patron1')
+    loan = checkout('item1', 'patron1')
+    assert loan['loan_pid'] == pending['loan_pid']
+    assert loan['state'] == 'ITEM_ON_LOAN'
+
+
+def test_bulk_loan_action(app):
+    """Test that a batch is validated in order and committed once."""
+    InvenioCirculation(app)
+    for i in range(3):
+        checkout('item{0}'.format(i), 'patron1')
+
+    received = []
+
+    def receiver(sender, changes=None):
+        received.append(changes)
+
+    with loan_state_changed.connected_to(receiver):
+        results = bulk_loan_action('checkin', [
+            dict(item_pid='item0'),
+            dict(item_pid='item1'),
+            dict(item_pid='item0'),
+            dict(item_pid='unknown'),
+            dict(item_pid='item2', transaction_location_pid='loc1'),
+        ])
+
+    assert [r.error is None for r in results] == \
+        [True, True, False, False, True]
+    assert isinstance(results[2].error, LoanNotFoundError)
+    assert results[4].loan['transaction_location_pid'] == 'loc1'
+    assert len(received) == 1
+    assert [c.loan['item_pid'] for c in received[0]] == \
+        ['item0', 'item1', 'item2']
+    assert all(c.previous['state'] == 'ITEM_ON_LOAN' for c in received[0])
+
+
+def test_computed_fields(app):
+    """Test that operations cannot set the fields computed by actions."""
+    app.config['CIRCULATION_POLICY_RULES'] = [dict(max_extensions=1)]
+    InvenioCirculation(app)
+    loan = checkout('item1', 'patron1', start_date='2018-01-01',
+                    end_date='2099-12-31', state='ITEM_RETURNED')
+    assert loan['state'] == 'ITEM_ON_LOAN'
+    assert loan['end_date'] == '2018-01-29'
+    loan_action('extend', 'item1', extension_count=0)
+    with pytest.raises(LoanMaxExtensionsError):
+        loan_action('extend', 'item1', extension_count=0)
+
+
+def test_bulk_view(app):
+    """Test the bulk endpoint."""
+    InvenioCirculation(app)
+    checkout('item1', 'patron1')
+    with app.test_client() as client:
+        res = client.post('/loans/bulk', data=json.dumps(dict(
+            action='checkin', operations=[dict(item_pid='item1')],
+        )), content_type='application/json')
+        assert res.status_code == 403
+
+        app.config['CIRCULATION_ACTION_PERMISSION_FACTORY'] = allow_all
+        for field in ('end_date', 'item_type'):
+            res = client.post('/loans/bulk', data=json.dumps(dict(
+                action='checkout', operations=[
+                    dict(item_pid='item2', patron_pid='patron1'),
+                    {'item_pid': 'item3', 'patron_pid': 'patron1',
+                     field: 'forged'},
+                ],
+            )), content_type='application/json')
+            assert res.status_code == 400
+            assert field in json.loads(res.get_data(as_text=True))['message']
+        for operation in ({'item_pid': ['item2']},
+                          {'item_pid': 'item2', 'patron_pid': {'a': 1}}):
+            res = client.post('/loans/bulk', data=json.dumps(dict(
+                action='checkout', operations=[operation],
+            )), content_type='application/json')
+            assert res.status_code == 400
+        assert current_circulation.availability.get('item2').available
+
+        res = client.post('/loans/bulk', data=json.dumps(dict(
+            action='checkin',
+            operations=[dict(item_pid='item1'), dict(item_pid='item2')],
+        )), content_type='application/json')
+        assert res.status_code == 200
+        results = json.loads(res.get_data(as_text=True))['results']
+        assert results[0]['status'] == 200
+        assert results[0]['loan']['state'] == 'ITEM_RETURNED'
+        assert results[1]['status'] == 404
+
+        res = client.post('/loans/bulk', data=json.dumps(dict(
+            action='unknown', operations=[],
+        )), content_type='application/json')
+        assert res.status_code == 400
+
+
+ITEMS = dict(
+    item1=dict(item_type='dvd', item_location_pid='home'),
+    item2=dict(item_type='dvd', item_location_pid='home'),
+)
+
+
+def _enrich(loan):
+    """Loan enricher reading the item records."""
+    return ITEMS[loan['item_pid']]
+
+
+def test_loan_enricher(app):
+    """Test that new loans get the fields of their item and patron."""
+    app.config.update(
+        CIRCULATION_ACTION_PERMISSION_FACTORY=allow_all,
+        CIRCULATION_LOAN_ENRICHER=_enrich,
+        CIRCULATION_POLICY_RULES=[dict(item_type='dvd', max_loans=1)],
+    )
+    InvenioCirculation(app)
+    with app.test_client() as client:
+        res = client.post('/loans/bulk', data=json.dumps(dict(
+            action='checkout', operations=[
+                dict(item_pid='item1', patron_pid='patron1'),
+                dict(item_pid='item2', patron_pid='patron1'),
+            ],
+        )), content_type='application/json')
+        results = json.loads(res.get_data(as_text=True))['results']
+    assert results[0]['loan']['item_type'] == 'dvd'
+    assert results[1]['status'] == 400
+
+    result, = bulk_loan_action('checkin', [
+        dict(item_pid='item1', transaction_location_pid='branch')])
+    assert result.transit['to_location_pid'] == 'home'
+    loan = checkout('item2', 'patron2', item_type='book')
+    assert loan['item_type'] == 'book'
+
+
+def _concurrent_writes(store, count, state='ITEM_ON_LOAN'):
+    """Make the next ``count`` writes race with another desk."""
+    put_many = store.put_many
+    calls = []
+
+    def racing_put_many(loans, revisions=None, **kwargs):
+        if len(calls) < count:
+            calls.append(revisions)
+            put_many([dict(
+                loan_pid='other{0}'.format(len(calls)),
+                item_pid=list(loans)[0]['item_pid'],
+                patron_pid='patron2', state=state)])
+        return put_many(loans, revisions=revisions, **kwargs)
+
+    store.put_many = racing_put_many
+    return calls
+
+
+def test_conflict_retry(app):
+    """Test that conflicting transitions are computed again."""
+    InvenioCirculation(app)
+    store = current_circulation.loan_store
+    calls = _concurrent_writes(store, 1)
+    result = bulk_loan_action('checkout', [
+        dict(item_pid='item1', patron_pid='patron1'),
+        dict(item_pid='item2', patron_pid='patron1'),
+    ])
+    assert calls == [dict(item1=0, item2=0)]
+    assert isinstance(result[0].error, ItemNotAvailableError)
+    assert result[1].loan['state'] == 'ITEM_ON_LOAN'
+    assert [loan['loan_pid'] for loan in store.search(
+        patron_pids=['patron1'])] == [result[1].loan['loan_pid']]
+
+
+def test_conflict_view(app):
+    """Test that conflicts left after the retries are reported."""
+    app.config['CIRCULATION_CONFLICT_RETRIES'] = 1
+    InvenioCirculation(app)
+    _concurrent_writes(
+        current_circulation.loan_store, 2, state='ITEM_RETURNED')
+    with pytest.raises(LoanConflictError):
+        checkout('item1', 'patron1')
+
+    _concurrent_writes(
+        current_circulation.loan_store, 2, state='ITEM_RETURNED')
+    app.config['CIRCULATION_ACTION_PERMISSION_FACTORY'] = allow_all
+    with app.test_client() as client:
+        res = client.post('/loans/bulk', data=json.dumps(dict(
+            action='checkout',
+            operations=[dict(item_pid='item2', patron_pid='patron1')],
+        )), content_type='application/json')
+        assert res.status_code == 409
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 CERN.
+#
+# Invenio-Circulation is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Loan archive tests."""
+
+from __future__ import absolute_import, print_function
+
+import json
+import os
+from datetime import date, timedelta
+
+import pytest
+from click.testing import CliRunner
+from flask.cli import ScriptInfo
+
+from invenio_circulation import InvenioCirculation
+from invenio_circulation.archive import LoanArchive, archive_loans, \
+    get_patron_history
+from invenio_circulation.cli import circulation
+from invenio_circulation.errors import CirculationException, \
+    LoanArchiveConfigError
+from invenio_circulation.permissions import allow_all
+from invenio_circulation.proxies import current_circulation
+from invenio_circulation.views import api_blueprint
+
+
+def _days_ago(days):
+    """Return the ISO date of some days ago."""
+    return (date.today() - timedelta(days=days)).isoformat()
+
+
+def _loans():
+    """Return old and recent loans of two patrons."""
+    return [
+        dict(loan_pid='1', item_pid='item1', patron_pid='patron1',
+             state='ITEM_RETURNED', transaction_date=_days_ago(800)),
+        dict(loan_pid='2', item_pid='item2', patron_pid='patron2',
+             state='CANCELLED', transaction_date=_days_ago(500)),
+        dict(loan_pid='3', item_pid='item3', patron_pid='patron1',
+             state='ITEM_RETURNED', transaction_date=_days_ago(400)),
+        dict(loan_pid='4', item_pid='item4', patron_pid='patron1',
+             state='ITEM_RETURNED', transaction_date=_days_ago(10)),
+        dict(loan_pid='5', item_pid='item5', patron_pid='patron1',
+             state='ITEM_ON_LOAN', transaction_date=_days_ago(600)),
+    ]
+
+
+def _pids(loans):
+    return [loan['loan_pid'] for loan in loans]
+
+
+def test_archive_segments(tmpdir):
+    """Test that patron loans are only read from their segments."""
+    archive = LoanArchive(str(tmpdir.join('archive')))
+    assert archive.segments() == []
+    assert list(archive.get_patron_loans('patron1')) == []
+    loans = _loans()
+    archive.write(loans[:2])
+    archive.write(loans[2:])
+    assert len(archive.segments()) == 2
+    assert sorted(os.listdir(archive.path)) == sorted(
+        name for segment in archive.segments()
+        for name in (segment + '.ndjson.gz', segment + '.patrons.json'))
+    assert _pids(archive.get_patron_loans('patron1')) == ['1', '3', '4', '5']
+
+    read = []
+    archive._read = lambda segment, lines: read.append(segment) or []
+    list(archive.get_patron_loans('patron2'))
+    assert read == archive.segments()[:1]
+
+
+def test_archive_index_cache(tmpdir):
+    """Test that only the recently used segment indexes stay in memory."""
+    archive = LoanArchive(str(tmpdir.join('archive')), index_cache_size=2)
+    for loan in _loans():
+        archive.write([loan])
+    assert _pids(archive.get_patron_loans('patron1')) == ['1', '3', '4', '5']
+    assert list(archive._indexes) == archive.segments()[-2:]
+    assert _pids(archive.get_patron_loans('patron2')) == ['2']
+    assert list(archive._indexes) == archive.segments()[-2:]
+
+
+def test_archive_loans(app):
+    """Test moving old finished loans to the archive."""
+    InvenioCirculation(app)
+    store = current_circulation.loan_store
+    store.put_many(_loans())
+    assert archive_loans(chunk_size=1) == 3
+    assert len(current_circulation.archive.segments()) == 3
+    assert _pids(store.search()) == ['4', '5']
+    assert archive_loans() == 0
+
+    assert _pids(get_patron_history('patron1')) == ['4', '3', '5', '1']
+    assert _pids(get_patron_history('patron2')) == ['2']
+
+    # Loans archived but not deleted by an interrupted run.
+    store.put(dict(_loans()[0], end_date='2000-01-01'))
+    history = get_patron_history('patron1')
+    assert _pids(history) == ['4', '3', '5', '1']
+    assert history[-1]['end_date'] == '2000-01-01'
+    assert archive_loans(age=0) == 2
+    assert _pids(store.search()) == ['5']
+    assert _pids(get_patron_history('patron1')) == ['4', '3', '5', '1']
+
+
+def test_archive_command(app):
+    """Test the archive command and the history endpoint."""
+    InvenioCirculation(app)
+    app.register_blueprint(api_blueprint)
+    current_circulation.loan_store.put_many(_loans())
+    result = CliRunner().invoke(
+        circulation, ['loans', 'archive', '--age', '450'],
+        obj=ScriptInfo(create_app=lambda *_: app))
+    assert result.exit_code == 0, result.output
+    assert 'Archived 2 loans.' in result.output
+
+    with app.test_client() as client:
+        url = '/circulation/patrons/patron1/history'
+        assert client.get(url).status_code == 403
+        app.config['CIRCULATION_LOAN_READ_PERMISSION_FACTORY'] = allow_all
+        res = client.get(url)
+        assert res.status_code == 200
+        assert _pids(json.loads(res.get_data(as_text=True))['hits']) == \
+            ['4', '3', '5', '1']
+
+
+def test_archive_path(base_app, db, tmpdir):
+    """Test that a shared loan store requires a shared archive path."""
+    InvenioCirculation(base_app)
+    with pytest.raises(LoanArchiveConfigError):
+        current_circulation.archive
+    assert not issubclass(LoanArchiveConfigError, CirculationException)
+    base_app.config['CIRCULATION_ARCHIVE_PATH'] = str(tmpdir)
+    assert current_circulation.archive.path == str(tmpdir)
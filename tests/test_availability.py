@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 CERN.
+#
+# Invenio-Circulation is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Availability index tests."""
+
+from __future__ import absolute_import, print_function
+
+from invenio_circulation import InvenioCirculation
+from invenio_circulation.api import bulk_loan_action, checkin, checkout, \
+    loan_action
+
+
+def test_availability_index(app):
+    """Test that the index follows loan transitions."""
+    InvenioCirculation(app)
+    index = app.extensions['invenio-circulation'].availability
+
+    assert index.get('item1').available
+    loan = checkout('item1', 'patron1', start_date='2018-02-01')
+    loan_action('request', 'item1', 'patron2')
+    loan_action('request', 'item2', 'patron2')
+    pending = loan_action('request', 'item2', 'patron3')
+
+    result = index.get_many(['item1', 'item2', 'item3'])
+    assert list(result) == ['item1', 'item2', 'item3']
+    assert not result['item1'].available
+    assert result['item1'].state == 'ITEM_ON_LOAN'
+    assert result['item1'].loan_pid == loan['loan_pid']
+    assert result['item1'].end_date == '2018-03-01'
+    assert result['item1'].pending_requests == 1
+    assert result['item2'].available
+    assert result['item2'].pending_requests == 2
+    assert result['item3'].available
+    assert result['item3'].pending_requests == 0
+
+    checkin('item1')
+    loan_action('cancel', 'item2', 'patron3')
+    checkout('item2', 'patron2')
+    result = index.get_many(['item1', 'item2'])
+    assert not result['item1'].available
+    assert result['item1'].state == 'ITEM_AT_DESK'
+    assert result['item1'].pending_requests == 0
+    assert not result['item2'].available
+    assert result['item2'].pending_requests == 0
+
+
+def test_availability_rebuild(app):
+    """Test rebuilding the index from loans."""
+    InvenioCirculation(app)
+    index = app.extensions['invenio-circulation'].availability
+    bulk_loan_action('checkout', [
+        dict(item_pid='item1', patron_pid='patron1'),
+        dict(item_pid='item2', patron_pid='patron1'),
+    ])
+    expected = index.get_many(['item1', 'item2'])
+    index.rebuild([])
+    assert index.get('item1').available
+    store = app.extensions['invenio-circulation'].loan_store
+    loans = store.get_by_items(['item1', 'item2'])
+    index.rebuild(loan for item in loans.values() for loan in item)
+    assert index.get_many(['item1', 'item2']) == expected
+
+
+def test_availability_max_age(app):
+    """Test that the index sees the loans written by other processes."""
+    app.config['CIRCULATION_AVAILABILITY_MAX_AGE'] = 0
+    InvenioCirculation(app)
+    index = app.extensions['invenio-circulation'].availability
+    assert index.get('item1').available
+
+    app.extensions['invenio-circulation'].loan_store.put_many([dict(
+        loan_pid='other', item_pid='item1', patron_pid='patron1',
+        state='ITEM_ON_LOAN')])
+    assert index.get('item1').loan_pid == 'other'
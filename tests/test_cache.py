@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 CERN.
+#
+# Invenio-Circulation is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""View response cache tests."""
+
+from __future__ import absolute_import, print_function
+
+import time
+
+import pytest
+from flask import session, template_rendered
+from jinja2 import ChoiceLoader, DictLoader
+
+from invenio_circulation import InvenioCirculation
+from invenio_circulation.api import checkin, checkout
+from invenio_circulation.cache import LRUCacheBackend, RedisCacheBackend
+from invenio_circulation.proxies import current_circulation
+
+
+class FakeRedis(object):
+    """Subset of the Redis client, storing bytes like Redis."""
+
+    def __init__(self):
+        """Initialize the client."""
+        self.data = {}
+
+    def mget(self, keys):
+        """Return the values of several keys."""
+        return [self.data.get(key) for key in keys]
+
+    def set(self, key, value, ex=None):
+        """Set the value of a key."""
+        self.data[key] = value.encode('utf-8')
+
+
+def _redis_backend(app):
+    return RedisCacheBackend(app, client=FakeRedis())
+
+
+def test_lru_backend():
+    """Test eviction and expiry of the in-process backend."""
+    backend = LRUCacheBackend()
+    backend.size = 2
+    backend.set('a', 1)
+    backend.set('b', 2)
+    assert backend.get_many(['a']) == [1]
+    backend.set('c', 3)
+    assert backend.get_many(['a', 'b', 'c']) == [1, None, 3]
+    backend.set('d', 4, timeout=0.01)
+    time.sleep(0.02)
+    assert backend.get_many(['d']) == [None]
+
+
+@pytest.mark.parametrize('backend', [
+    'invenio_circulation.cache:LRUCacheBackend', _redis_backend,
+])
+def test_cached_views(app, backend):
+    """Test that responses are cached until their item changes."""
+    app.config['CIRCULATION_VIEW_CACHE_BACKEND'] = backend
+    InvenioCirculation(app)
+    renders = []
+    template_rendered.connect(
+        lambda sender, template, context: renders.append(template.name),
+        app, weak=False)
+    with app.test_client() as client:
+        res = client.get('/items/item1')
+        assert 'Available' in res.get_data(as_text=True)
+        etag = res.headers['ETag']
+        assert client.get('/items/item1').headers['ETag'] == etag
+        assert client.get('/items/item1', headers={
+            'If-None-Match': etag}).status_code == 304
+        client.get('/items/item2')
+        assert len(renders) == 2
+
+        checkout('item1', 'patron1', start_date='2018-01-04')
+        res = client.get('/items/item1', headers={'If-None-Match': etag})
+        assert res.status_code == 200
+        assert 'On loan until 2018-02-01' in res.get_data(as_text=True)
+        client.get('/items/item2')
+        assert len(renders) == 3
+
+    cache = current_circulation.view_cache
+    with app.test_request_context('/items/item1'):
+        key = cache.make_key('item:item1')
+        app.config['CIRCULATION_BASE_TEMPLATE'] = 'theme/page.html'
+        assert cache.make_key('item:item1') != key
+
+
+def test_cache_disabled(app):
+    """Test that views render every time without cache."""
+    app.config['CIRCULATION_VIEW_CACHE_BACKEND'] = None
+    InvenioCirculation(app)
+    assert current_circulation.view_cache is None
+    checkout('item1', 'patron1')
+    checkin('item1')
+    with app.test_client() as client:
+        res = client.get('/items/item1')
+        assert res.status_code == 200
+        assert 'ETag' not in res.headers
+
+
+def test_cache_sessions(app):
+    """Test that pages showing the session user are not shared."""
+    app.config['CIRCULATION_BASE_TEMPLATE'] = 'user.html'
+    app.jinja_loader = ChoiceLoader([app.jinja_loader, DictLoader({
+        'user.html': "user={{ session.get('user') }} "
+                     "{% block page_body %}{% endblock %}",
+    })])
+    InvenioCirculation(app)
+
+    @app.route('/login/<user>')
+    def login(user):
+        session['user'] = user
+        return ''
+
+    responses = []
+    for user in ('alice', 'bob', None):
+        with app.test_client() as client:
+            if user:
+                client.get('/login/{0}'.format(user))
+            responses.append(client.get('/items/item1').get_data(
+                as_text=True))
+    assert [response.split()[0] for response in responses] == [
+        'user=alice', 'user=bob', 'user=None']
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 CERN.
+#
+# Invenio-Circulation is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Location calendars tests."""
+
+from __future__ import absolute_import, print_function
+
+from invenio_circulation import InvenioCirculation
+from invenio_circulation.api import checkout
+from invenio_circulation.calendars import LocationCalendars
+from invenio_circulation.policies import to_dates, to_isoformat
+from invenio_circulation.signals import location_calendar_changed
+
+# 2018-01-06 is a Saturday.
+CALENDAR = dict(
+    weekdays=[0, 1, 2, 3, 4],
+    closed=['2018-01-01', '2018-12-25'],
+    open=['2018-01-13'],
+)
+
+
+def test_next_open_day():
+    """Test open days lookup."""
+    calendars = LocationCalendars({'loc1': CALENDAR}.get, 30)
+    assert calendars.next_open_day('loc1', '2018-01-01') == '2018-01-02'
+    assert calendars.next_open_day('loc1', '2018-01-05', 1) == '2018-01-08'
+    assert calendars.next_open_day('loc1', '2018-01-12', 1) == '2018-01-13'
+    assert calendars.next_open_day('loc1', '2018-12-22', 1) == '2018-12-24'
+    assert calendars.next_open_day('loc1', '2018-12-24', 1) == '2018-12-26'
+    assert calendars.next_open_day('loc2', '2018-01-06') == '2018-01-06'
+    assert calendars.next_open_day(None, '2018-01-06') == '2018-01-06'
+
+    dates = to_dates(['2018-01-06', None, '2018-01-06', '2018-01-01'])
+    assert to_isoformat(calendars.next_open_days_per_location(
+        ['loc1', 'loc1', 'loc2', 'loc1'], dates)) == \
+        ['2018-01-08', None, '2018-01-06', '2018-01-02']
+
+
+def test_invalidation(app):
+    """Test that calendar changes invalidate the cache."""
+    calendars_config = {'loc1': dict(weekdays=[0, 1, 2, 3, 4])}
+    app.config['CIRCULATION_LOCATION_CALENDARS'] = calendars_config
+    InvenioCirculation(app)
+    calendars = app.extensions['invenio-circulation'].calendars
+
+    assert calendars.next_open_day('loc1', '2018-01-06') == '2018-01-08'
+    calendars_config['loc1']['weekdays'] = [5]
+    assert calendars.next_open_day('loc1', '2018-01-06') == '2018-01-08'
+    location_calendar_changed.send(app, location_pid='loc1')
+    assert calendars.next_open_day('loc1', '2018-01-07') == '2018-01-13'
+
+
+def test_checkout_skips_closed_days(app):
+    """Test that due dates fall on open days."""
+    app.config['CIRCULATION_LOCATION_CALENDARS'] = {'loc1': CALENDAR}
+    InvenioCirculation(app)
+    loan = checkout('item1', 'patron1', start_date='2017-12-04',
+                    transaction_location_pid='loc1')
+    assert loan['end_date'] == '2018-01-02'
+    loan = checkout('item2', 'patron1', start_date='2017-12-04')
+    assert loan['end_date'] == '2018-01-01'
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 CERN.
+#
+# Invenio-Circulation is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""CLI tests."""
+
+from __future__ import absolute_import, print_function
+
+import json
+
+from click.testing import CliRunner
+from flask.cli import ScriptInfo
+
+from invenio_circulation import InvenioCirculation
+from invenio_circulation.cli import circulation
+from invenio_circulation.proxies import current_circulation
+
+LOANS = [
+    dict(loan_pid=str(pid), item_pid='item{0}'.format(pid),
+         patron_pid='patron1', state='ITEM_ON_LOAN', extension_count=pid)
+    for pid in range(1, 6)
+]
+
+
+def _invoke(app, *args):
+    """Invoke a circulation command."""
+    result = CliRunner().invoke(
+        circulation, args, obj=ScriptInfo(create_app=lambda *_: app))
+    assert result.exit_code == 0, result.output
+    return result
+
+
+def test_export_import(app, tmpdir):
+    """Test exporting and importing loans in both formats."""
+    InvenioCirculation(app)
+    store = current_circulation.loan_store
+    store.put_many(LOANS)
+    for fmt in ('ndjson', 'csv'):
+        path = tmpdir.join('loans.' + fmt).strpath
+        _invoke(app, 'loans', 'export', path, '-f', fmt, '--chunk-size', '2')
+        store.put_many([dict(loan, state='CANCELLED') for loan in LOANS])
+        current_circulation.availability.rebuild([])
+        assert current_circulation.availability.get('item1').available
+        _invoke(app, 'loans', 'import', path, '-f', fmt)
+        assert store.scan() == LOANS
+        assert not current_circulation.availability.get('item1').available
+
+
+def test_resume(app, tmpdir):
+    """Test resuming an export and an import from a checkpoint."""
+    InvenioCirculation(app)
+    store = current_circulation.loan_store
+    store.put_many(LOANS)
+    path = tmpdir.join('loans.ndjson')
+    checkpoint = tmpdir.join('checkpoint')
+
+    checkpoint.write('2')
+    path.write(''.join(json.dumps(loan) + '\n' for loan in LOANS[:2]))
+    _invoke(app, 'loans', 'export', path.strpath,
+            '--checkpoint', checkpoint.strpath)
+    assert [json.loads(line) for line in path.readlines()] == LOANS
+    assert checkpoint.read() == '5'
+
+    store.put_many([dict(loan, state='CANCELLED') for loan in LOANS])
+    checkpoint.write('3')
+    _invoke(app, 'loans', 'import', path.strpath,
+            '--checkpoint', checkpoint.strpath, '--chunk-size', '1')
+    assert checkpoint.read() == '5'
+    states = [loan['state'] for loan in store.scan()]
+    assert states == ['CANCELLED'] * 3 + ['ITEM_ON_LOAN'] * 2
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 CERN.
+#
+# Invenio-Circulation is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Event bus tests."""
+
+from __future__ import absolute_import, print_function
+
+import json
+from itertools import islice
+
+from six.moves.queue import Queue
+
+from invenio_circulation import InvenioCirculation
+from invenio_circulation.api import bulk_loan_action, checkout, loan_action, \
+    receive_items
+from invenio_circulation.events import EventBus, RedisEventBroker
+from invenio_circulation.permissions import allow_all
+from invenio_circulation.proxies import current_circulation
+
+
+class FakePubSubRedis(object):
+    """Subset of the Redis client for pub/sub, sending bytes like Redis."""
+
+    def __init__(self):
+        """Initialize the client."""
+        self.subscribers = []
+
+    def publish(self, channel, message):
+        """Send a message to the subscribers of a channel."""
+        for subscribed, queue in self.subscribers:
+            if subscribed == channel:
+                queue.put(dict(type='message', channel=channel,
+                               data=message.encode('utf-8')))
+
+    def pubsub(self, ignore_subscribe_messages=False):
+        """Return a subscriber."""
+        return FakePubSub(self)
+
+
+class FakePubSub(object):
+    """Subscriber of the fake Redis client."""
+
+    def __init__(self, client):
+        """Initialize the subscriber."""
+        self.client = client
+        self.queue = Queue()
+
+    def subscribe(self, channel):
+        """Subscribe to a channel."""
+        self.client.subscribers.append((channel, self.queue))
+
+    def listen(self):
+        """Iterate over the received messages."""
+        while True:
+            yield self.queue.get()
+
+
+def _types(events):
+    return [(event['type'], event.get('trigger') or event['status'])
+            for event in events]
+
+
+def test_bus():
+    """Test channels and dropping of the oldest events."""
+    bus = EventBus(frozenset(['PENDING']), queue_size=2)
+    bus.publish(['patron:1'], dict(n=0))
+    first = bus.subscribe(['patron:1', 'location:1'])
+    second = bus.subscribe(['location:1'], size=10)
+    for n in range(1, 4):
+        bus.publish(['patron:1', 'location:1'], dict(n=n))
+    bus.publish(['location:2'], dict(n=4))
+
+    events, dropped = first.get(timeout=0)
+    assert [event['n'] for event in events] == [2, 3]
+    assert dropped == 1
+    assert [event['id'] for event in events] == [2, 3]
+    assert first.get(timeout=0) == ([], 0)
+    events, dropped = second.get(timeout=0)
+    assert [event['n'] for event in events] == [1, 2, 3]
+
+    first.close()
+    with second:
+        bus.publish(['patron:1'], dict(n=5))
+        assert first.get(timeout=0) == ([], 0)
+    assert bus._subscriptions == {}
+
+
+def test_circulation_events(app):
+    """Test the events of loans, holds and transits."""
+    InvenioCirculation(app)
+    checkout('item0', 'patron0')
+    assert 'events' not in current_circulation.__dict__
+    subscription = current_circulation.events.subscribe(
+        ['patron:patron2', 'location:branch'])
+    checkout('item1', 'patron1', item_location_pid='home')
+    loan_action('request', 'item1', 'patron2', pickup_location_pid='branch')
+    bulk_loan_action('checkin', [
+        dict(item_pid='item1', transaction_location_pid='home')])
+    receive_items('branch', ['item1'])
+
+    events, dropped = subscription.get(timeout=0)
+    assert dropped == 0
+    assert _types(events) == [
+        ('hold', 'request'),
+        ('hold', 'validate_request'),
+        ('transit', 'started'),
+        ('transit', 'completed'),
+    ]
+    assert events[0]['patron_pid'] == 'patron2'
+    assert events[2]['to_location_pid'] == 'branch'
+
+
+def test_event_stream(app):
+    """Test the server-sent events endpoint."""
+    app.config['CIRCULATION_EVENTS_KEEPALIVE'] = 0.01
+    InvenioCirculation(app)
+    with app.test_client() as client:
+        assert client.get('/events').status_code == 400
+        assert client.get('/events?patron_pid=patron1').status_code == 403
+        app.config['CIRCULATION_LOAN_READ_PERMISSION_FACTORY'] = allow_all
+        res = client.get('/events?patron_pid=patron1')
+        assert res.mimetype == 'text/event-stream'
+        checkout('item1', 'patron1')
+        checkout('item2', 'patron2')
+        chunks = [
+            chunk.decode('utf-8') if isinstance(chunk, bytes) else chunk
+            for chunk in islice(res.response, 4)
+        ]
+        res.close()
+    events = [chunk for chunk in chunks if chunk != ': keep-alive\n\n']
+    assert len(events) == 1
+    lines = events[0].splitlines()
+    assert lines[1] == 'event: loan'
+    event = json.loads(lines[2][len('data: '):])
+    assert (event['item_pid'], event['state']) == ('item1', 'ITEM_ON_LOAN')
+    assert current_circulation.events._subscriptions == {}
+
+
+def test_redis_broker(app):
+    """Test that events reach the subscribers of other processes."""
+    client = FakePubSubRedis()
+    app.config['CIRCULATION_EVENTS_BROKER'] = \
+        lambda app: RedisEventBroker(app, client=client)
+    InvenioCirculation(app)
+    other_process = EventBus(
+        frozenset(['PENDING']), broker=RedisEventBroker(client=client))
+    subscription = other_process.subscribe(['patron:patron1'])
+    local = current_circulation.events.subscribe(['patron:patron1'])
+
+    checkout('item1', 'patron1')
+    for events in (subscription.get(timeout=1)[0], local.get(timeout=1)[0]):
+        assert _types(events) == [('loan', 'checkout')]
+        assert events[0]['id'] == 1
+
+
+def test_redis_broker_publisher(app):
+    """Test that processes without subscribers publish their events."""
+    client = FakePubSubRedis()
+    app.config['CIRCULATION_EVENTS_BROKER'] = \
+        lambda app: RedisEventBroker(app, client=client)
+    InvenioCirculation(app)
+    other_process = EventBus(
+        frozenset(['PENDING']), broker=RedisEventBroker(client=client))
+    subscription = other_process.subscribe(['location:home'])
+
+    checkout('item1', 'patron1', item_location_pid='home')
+    loan_action('checkin', 'item1', transaction_location_pid='branch')
+    events, dropped = subscription.get(timeout=1)
+    while len(events) < 3:
+        more, dropped = subscription.get(timeout=1)
+        assert more
+        events.extend(more)
+    assert _types(events) == [
+        ('loan', 'checkout'), ('loan', 'checkin'), ('transit', 'started')]
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 CERN.
+#
+# Invenio-Circulation is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Hold queues tests."""
+
+from __future__ import absolute_import, print_function
+
+import pytest
+
+from invenio_circulation import InvenioCirculation
+from invenio_circulation.api import bulk_loan_action, checkin, checkout, \
+    loan_action
+from invenio_circulation.errors import ItemNotAvailableError
+from invenio_circulation.holds import HoldQueue
+
+
+def _hold(loan_pid, location='loc1'):
+    return dict(loan_pid=loan_pid, pickup_location_pid=location)
+
+
+def test_hold_queue():
+    """Test the priority queue operations."""
+    queue = HoldQueue()
+    queue.push(_hold('a'), (1, '2018-01-03'))
+    queue.push(_hold('b', 'loc2'), (0, '2018-01-05'))
+    queue.push(_hold('c'), (1, '2018-01-01'))
+    queue.push(_hold('d', 'loc2'), (1, '2018-01-02'))
+    assert len(queue) == 4
+    assert [h['loan_pid'] for h in queue] == ['b', 'c', 'd', 'a']
+    assert queue.peek()['loan_pid'] == 'b'
+
+    def at_loc1(hold):
+        return hold['pickup_location_pid'] == 'loc1'
+
+    assert queue.peek(at_loc1)['loan_pid'] == 'c'
+    queue.cancel('c')
+    assert 'c' not in queue
+    assert queue.peek(at_loc1)['loan_pid'] == 'a'
+    assert queue.peek(lambda hold: False) is None
+
+    queue.reorder('a', (0, '2018-01-01'))
+    assert [h['loan_pid'] for h in queue] == ['a', 'b', 'd']
+    assert queue.pop()['loan_pid'] == 'a'
+    assert queue.pop()['loan_pid'] == 'b'
+    queue.cancel('unknown')
+    assert queue.pop()['loan_pid'] == 'd'
+    assert queue.pop() is None
+    assert len(queue) == 0
+
+
+def test_hold_queue_compaction():
+    """Test that cancelled holds do not accumulate in the heap."""
+    queue = HoldQueue()
+    queue.push(_hold('kept'), (1, ''))
+    for i in range(100):
+        queue.push(_hold(str(i)), (0, ''))
+        queue.reorder(str(i), (2, ''))
+        queue.cancel(str(i))
+    assert len(queue._heap) <= 10
+    assert [h['loan_pid'] for h in queue] == ['kept']
+
+
+def test_checkin_assigns_next_hold(app):
+    """Test that a checkin assigns the item to the next hold."""
+    app.config['CIRCULATION_HOLD_PRIORITIES'] = {'staff': 0}
+    InvenioCirculation(app)
+    holds = app.extensions['invenio-circulation'].holds
+
+    checkout('item1', 'patron1')
+    loan_action('request', 'item1', 'patron2', request_date='2018-01-01')
+    loan_action('request', 'item1', 'patron3', request_date='2018-01-02',
+                patron_category='staff')
+    loan_action('request', 'item1', 'patron4', request_date='2018-01-03')
+    assert holds.peek_next('item1')['patron_pid'] == 'patron3'
+
+    loan = checkin('item1', transaction_location_pid='loc1')
+    assert loan['state'] == 'ITEM_RETURNED'
+    assert holds.peek_next('item1')['patron_pid'] == 'patron2'
+    assert len(holds.get('item1')) == 2
+
+    with pytest.raises(ItemNotAvailableError):
+        checkout('item1', 'patron2')
+    loan = checkout('item1', 'patron3')
+    assert loan['state'] == 'ITEM_ON_LOAN'
+    assert loan['end_date']
+
+    loan_action('cancel', 'item1', 'patron2')
+    results = bulk_loan_action('checkin', [dict(item_pid='item1')])
+    assert results[0].loan['state'] == 'ITEM_RETURNED'
+    store = app.extensions['invenio-circulation'].loan_store
+    at_desk = list(store.search(item_pids=['item1'], states=['ITEM_AT_DESK']))
+    assert [loan['patron_pid'] for loan in at_desk] == ['patron4']
+    assert holds.peek_next('item1') is None
+
+
+def test_hold_queue_loaded_from_store(app):
+    """Test that queues are loaded from the loan store on first use."""
+    InvenioCirculation(app)
+    loan_action('request', 'item1', 'patron1', request_date='2018-01-02')
+    loan_action('request', 'item1', 'patron2', request_date='2018-01-01')
+    holds = app.extensions['invenio-circulation'].holds
+    holds._queues.clear()
+    assert holds.peek_next('item1')['patron_pid'] == 'patron2'
+
+
+def test_hold_created_by_other_process(app):
+    """Test that a checkin serves holds missing from the loaded queue."""
+    InvenioCirculation(app)
+    state = app.extensions['invenio-circulation']
+    checkout('item1', 'patron1')
+    assert state.holds.peek_next('item1') is None
+
+    state.loan_store.put_many([dict(
+        loan_pid='other', item_pid='item1', patron_pid='patron2',
+        state='PENDING', request_date='2018-01-01')])
+    checkin('item1')
+    assert state.loan_store.get('other')['state'] == 'ITEM_AT_DESK'
+    assert state.holds.peek_next('item1') is None
+
+
+def test_hold_queues_bounded(app):
+    """Test that empty and least recently used queues are dropped."""
+    app.config['CIRCULATION_HOLD_QUEUE_CACHE_SIZE'] = 2
+    InvenioCirculation(app)
+    holds = app.extensions['invenio-circulation'].holds
+    for item_pid in ('item1', 'item2', 'item3'):
+        checkout(item_pid, 'patron1')
+        loan_action('request', item_pid, 'patron2')
+        assert holds.peek_next(item_pid)['patron_pid'] == 'patron2'
+    assert list(holds._queues) == ['item2', 'item3']
+
+    loan_action('cancel', 'item3', 'patron2')
+    assert list(holds._queues) == ['item2']
+    assert holds.peek_next('item3') is None
+    assert holds.peek_next('item1')['patron_pid'] == 'patron2'
+    assert list(holds._queues) == ['item3', 'item1']
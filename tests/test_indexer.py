@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 CERN.
+#
+# Invenio-Circulation is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Loan indexer tests."""
+
+from __future__ import absolute_import, print_function
+
+import time
+
+import pytest
+
+from invenio_circulation import InvenioCirculation
+from invenio_circulation.api import checkin, checkout, loan_action
+from invenio_circulation.errors import LoanIndexerConfigError
+from invenio_circulation.indexer import InProcessIndexerQueue, \
+    KombuIndexerQueue
+from invenio_circulation.tasks import process_loan_indexer_queue
+
+
+@pytest.fixture()
+def bulk_requests(app):
+    """Enable the indexer and record the bulk requests."""
+    requests = []
+    app.config['CIRCULATION_INDEXER_BULK_HANDLER'] = requests.append
+    return requests
+
+
+def _indexer(app):
+    """Return the indexer, without its background thread."""
+    indexer = app.extensions['invenio-circulation'].indexer
+    indexer.stop_worker()
+    return indexer
+
+
+def test_in_process_queue():
+    """Test deduplication and the window of the in-process queue."""
+    queue = InProcessIndexerQueue()
+    queue.put([('loan', '1'), ('item', 'a')], 10)
+    queue.put([('loan', '2'), ('loan', '1')], 20)
+    assert len(queue) == 3
+    assert queue.take(older_than=5) == []
+    assert queue.take(older_than=15) == [('loan', '1'), ('item', 'a')]
+    queue.put([('loan', '1')], 30)
+    assert queue.take(limit=1) == [('loan', '2')]
+    assert queue.take() == [('loan', '1')]
+
+
+def test_kombu_queue(app):
+    """Test the broker queue."""
+    InvenioCirculation(app)
+    queue = KombuIndexerQueue(app)
+    queue.put([('loan', '1'), ('item', 'a')], 10)
+    queue.put([('loan', '1')], 20)
+    assert queue.take() == [('loan', '1'), ('item', 'a')]
+    assert queue.take() == []
+
+
+def test_indexer_deduplicates(app, bulk_requests):
+    """Test that changes are indexed once per flush."""
+    app.config['CIRCULATION_INDEXER_CHUNK_SIZE'] = 3
+    InvenioCirculation(app)
+    indexer = _indexer(app)
+
+    loan = checkout('item1', 'patron1')
+    loan_action('extend', 'item1')
+    checkin('item1')
+    other = checkout('item2', 'patron1')
+    assert indexer.flush() == 0
+    assert indexer.flush(force=True) == 4
+
+    actions = [a for request in bulk_requests for a in request]
+    assert [len(request) for request in bulk_requests] == [3, 1]
+    assert [(a['_index'], a['_id']) for a in actions] == [
+        ('loans', loan['loan_pid']),
+        ('loans', other['loan_pid']),
+        ('circulation-items', 'item1'),
+        ('circulation-items', 'item2'),
+    ]
+    assert actions[0]['_source']['state'] == 'ITEM_RETURNED'
+    assert actions[2]['_source']['available']
+    assert not actions[3]['_source']['available']
+
+
+def test_indexer_window(app, bulk_requests):
+    """Test that only documents older than the window are flushed."""
+    app.config['CIRCULATION_INDEXER_WINDOW'] = 0.05
+    InvenioCirculation(app)
+    indexer = _indexer(app)
+    checkout('item1', 'patron1')
+    time.sleep(0.1)
+    checkout('item2', 'patron1')
+    assert indexer.flush() == 2
+    assert indexer.flush(force=True) == 2
+
+    indexer.start_worker(interval=0.01)
+    checkout('item3', 'patron1')
+    indexer.stop_worker()
+    assert len(indexer.queue) == 0
+
+
+def test_indexer_task(app, bulk_requests):
+    """Test the Celery task."""
+    app.config['CIRCULATION_INDEXER_QUEUE'] = KombuIndexerQueue
+    InvenioCirculation(app)
+    checkout('item1', 'patron1')
+    assert app.extensions['invenio-circulation'].indexer._worker is None
+    assert process_loan_indexer_queue.apply(
+        kwargs=dict(force=True)).result == 2
+    assert len(bulk_requests) == 1
+
+
+def test_indexer_task_queue(app, bulk_requests):
+    """Test that the Celery task refuses queues of a single process."""
+    InvenioCirculation(app)
+    _indexer(app)
+    with pytest.raises(LoanIndexerConfigError):
+        process_loan_indexer_queue()
+
+
+def test_indexer_worker(app, bulk_requests):
+    """Test that the in-process queue is flushed by the indexer itself."""
+    app.config['CIRCULATION_INDEXER_WINDOW'] = 0.01
+    InvenioCirculation(app)
+    checkout('item1', 'patron1')
+    indexer = app.extensions['invenio-circulation'].indexer
+    for _ in range(100):
+        if bulk_requests:
+            break
+        time.sleep(0.01)
+    indexer.stop_worker()
+    assert len(bulk_requests) == 1
+    assert len(indexer.queue) == 0
+
+
+def test_indexer_disabled(app):
+    """Test that nothing is queued without bulk handler."""
+    InvenioCirculation(app)
+    indexer = app.extensions['invenio-circulation'].indexer
+    assert not indexer.enabled
+    checkout('item1', 'patron1')
+    assert len(indexer.queue) == 0
+
+
+def test_indexer_reads_store(app, bulk_requests):
+    """Test that items are indexed as they are in the loan store."""
+    InvenioCirculation(app)
+    state = app.extensions['invenio-circulation']
+    _indexer(app)
+    checkout('item1', 'patron1')
+    assert not state.availability.get('item1').available
+
+    # Returned by another process.
+    loan, = state.loan_store.search(item_pids=['item1'])
+    state.loan_store.put_many([dict(loan, state='ITEM_RETURNED')])
+    assert state.indexer.flush(force=True) == 2
+    assert bulk_requests[0][1]['_source']['available']
+
+
+@pytest.mark.parametrize('queue', [InProcessIndexerQueue, KombuIndexerQueue])
+def test_indexer_failure(app, bulk_requests, queue):
+    """Test that documents of failed bulk requests are queued again."""
+    failures = [IOError()]
+    app.config['CIRCULATION_INDEXER_QUEUE'] = queue
+
+    def handler(actions):
+        if failures:
+            raise failures.pop()
+        bulk_requests.append(actions)
+    app.config['CIRCULATION_INDEXER_BULK_HANDLER'] = handler
+    InvenioCirculation(app)
+    indexer = _indexer(app)
+    checkout('item1', 'patron1')
+    with pytest.raises(IOError):
+        indexer.flush(force=True)
+    assert indexer.flush() == 2
+    assert len(bulk_requests[0]) == 2
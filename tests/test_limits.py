@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 CERN.
+#
+# Invenio-Circulation is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Patron limits tests."""
+
+from __future__ import absolute_import, print_function
+
+from datetime import date, timedelta
+
+import pytest
+from click.testing import CliRunner
+from flask.cli import ScriptInfo
+
+from invenio_circulation import InvenioCirculation
+from invenio_circulation.api import bulk_loan_action, checkin, checkout
+from invenio_circulation.cli import circulation
+from invenio_circulation.errors import PatronBlockedError, PatronMaxLoansError
+from invenio_circulation.proxies import current_circulation
+from invenio_circulation.tasks import reconcile_patron_limits
+
+
+def test_max_loans(app):
+    """Test the maximum number of loans per item type."""
+    app.config['CIRCULATION_POLICY_RULES'] = [
+        dict(item_type='dvd', max_loans=2),
+    ]
+    InvenioCirculation(app)
+    results = bulk_loan_action('checkout', [
+        dict(item_pid='item{0}'.format(i), patron_pid='patron1',
+             item_type='dvd')
+        for i in range(3)
+    ])
+    assert [result.error is None for result in results] == \
+        [True, True, False]
+    assert isinstance(results[2].error, PatronMaxLoansError)
+    checkout('item3', 'patron1', item_type='book')
+    checkout('item4', 'patron2', item_type='dvd')
+    assert current_circulation.loan_store.get_patron_counts(['patron1']) == \
+        dict(patron1=dict(dvd=2, book=1))
+
+    checkin('item0')
+    checkout('item2', 'patron1', item_type='dvd')
+    with pytest.raises(PatronMaxLoansError):
+        checkout('item5', 'patron1', item_type='dvd')
+
+
+def test_blocks(app):
+    """Test that overdue loans and fines block patrons."""
+    app.config['CIRCULATION_POLICY_RULES'] = [
+        dict(patron_category='student', max_overdue_loans=0),
+        dict(patron_category='staff', max_fines=0.5),
+    ]
+    InvenioCirculation(app)
+    started = (date.today() - timedelta(days=33)).isoformat()
+    checkout('item1', 'patron1', start_date=started)
+    checkout('item2', 'patron1', patron_category='staff')
+    with pytest.raises(PatronBlockedError):
+        checkout('item3', 'patron1', patron_category='student')
+
+    checkout('item4', 'patron1', start_date=started)
+    with pytest.raises(PatronBlockedError):
+        checkout('item5', 'patron1', patron_category='staff')
+
+
+def test_blocks_other_processes(app):
+    """Test that blocks see the loans written by other processes."""
+    app.config['CIRCULATION_POLICY_RULES'] = [dict(max_overdue_loans=0)]
+    InvenioCirculation(app)
+    assert current_circulation.patron_summaries.get('patron1').loans == 0
+
+    current_circulation.loan_store.put_many([dict(
+        loan_pid='other', item_pid='item1', patron_pid='patron1',
+        state='ITEM_ON_LOAN', end_date='2018-01-01')])
+    with pytest.raises(PatronBlockedError):
+        checkout('item2', 'patron1')
+
+
+def _concurrent_desks(app):
+    """Check out items of the same type at two desks at the same time."""
+    app.config['CIRCULATION_POLICY_RULES'] = [
+        dict(item_type='dvd', max_loans=1),
+    ]
+    InvenioCirculation(app)
+    store = current_circulation.loan_store
+    put_many = store.put_many
+    calls = []
+
+    def racing_put_many(loans, **kwargs):
+        if not calls:
+            calls.append(kwargs.get('max_counts'))
+            put_many([dict(
+                loan_pid='other', item_pid='item2', patron_pid='patron1',
+                state='ITEM_ON_LOAN', item_type='dvd')])
+        return put_many(loans, **kwargs)
+
+    store.put_many = racing_put_many
+    with pytest.raises(PatronMaxLoansError):
+        checkout('item1', 'patron1', item_type='dvd')
+    assert calls == [{('patron1', 'dvd'): 1}]
+    assert store.get_patron_counts(['patron1']) == dict(
+        patron1=dict(dvd=1))
+    assert checkout('item3', 'patron1', item_type='book')
+
+
+def test_concurrent_desks(app):
+    """Test that concurrent checkouts cannot exceed the maximum loans."""
+    _concurrent_desks(app)
+
+
+def test_concurrent_desks_database(base_app, db):
+    """Test the maximum loans of concurrent checkouts in the database."""
+    _concurrent_desks(base_app)
+
+
+def test_reconcile(app):
+    """Test rebuilding drifted counters."""
+    InvenioCirculation(app)
+    store = current_circulation.loan_store
+    checkout('item1', 'patron1', item_type='dvd')
+    checkout('item2', 'patron2')
+    store._counts[('patron1', 'dvd')] = 3
+    store._counts[('patron3', None)] = 1
+
+    result = CliRunner().invoke(
+        circulation, ['limits', 'reconcile'],
+        obj=ScriptInfo(create_app=lambda *_: app))
+    assert result.exit_code == 0
+    assert result.output.splitlines()[:2] == [
+        'patron1\tdvd\t3\t1', 'patron3\t\t1\t0']
+    assert store.get_patron_counts(['patron1', 'patron3']) == dict(
+        patron1=dict(dvd=1), patron3={})
+    assert reconcile_patron_limits() == 0
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 CERN.
+#
+# Invenio-Circulation is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Metrics tests."""
+
+from __future__ import absolute_import, print_function
+
+from invenio_circulation import InvenioCirculation
+from invenio_circulation.api import checkin, checkout
+from invenio_circulation.metrics import STAGES, InProcessMetrics
+from invenio_circulation.signals import action_stage_timed
+
+
+def test_histograms():
+    """Test the in-process histograms and their export."""
+    sink = InProcessMetrics(buckets=[0.1, 0.01])
+    sink.observe('checkout', 'validation', 0.005)
+    sink.observe('checkout', 'validation', 0.05)
+    sink.observe('checkout', 'validation', 5)
+    sink.observe('checkin', 'indexing', 0.01)
+    histograms = sink.histograms()
+    assert histograms[('checkout', 'validation')] == dict(
+        buckets=[(0.01, 1), (0.1, 2), (float('inf'), 3)],
+        count=3, sum=5.055)
+    assert histograms[('checkin', 'indexing')]['buckets'][0] == (0.01, 1)
+
+    lines = sink.export().splitlines()
+    assert lines[1] == \
+        '# TYPE circulation_action_stage_duration_seconds histogram'
+    assert 'circulation_action_stage_duration_seconds_bucket{' \
+        'action="checkout",stage="validation",le="+Inf"} 3' in lines
+    assert 'circulation_action_stage_duration_seconds_count{' \
+        'action="checkin",stage="indexing"} 1' in lines
+
+    sink.reset()
+    assert sink.histograms() == {}
+
+
+def test_instrumented_actions(app):
+    """Test that actions are timed when metrics are enabled."""
+    app.config['CIRCULATION_METRICS_ENABLED'] = True
+    InvenioCirculation(app)
+    timed = []
+
+    def receiver(sender, action=None, stage=None, duration=None):
+        timed.append((action, stage))
+
+    with action_stage_timed.connected_to(receiver, sender=app):
+        checkout('item1', 'patron1')
+    assert sorted(timed) == sorted(('checkout', stage) for stage in STAGES)
+
+    checkin('item1')
+    sink = app.extensions['invenio-circulation'].instrumentation.sink
+    assert sink.histograms()[('checkin', 'storage_write')]['count'] == 1
+
+    with app.test_client() as client:
+        res = client.get('/metrics')
+        assert res.status_code == 200
+        assert res.content_type.startswith('text/plain')
+        assert b'action="checkin",stage="validation"' in res.data
+
+
+def test_metrics_disabled(app):
+    """Test that nothing is collected by default."""
+    InvenioCirculation(app)
+    assert not app.extensions['invenio-circulation'].instrumentation.enabled
+    checkout('item1', 'patron1')
+    with app.test_client() as client:
+        assert client.get('/metrics').status_code == 404
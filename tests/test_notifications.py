@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 CERN.
+#
+# Invenio-Circulation is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Loan notices tests."""
+
+from __future__ import absolute_import, print_function
+
+from datetime import date
+
+from celery import Celery
+from click.testing import CliRunner
+from flask.cli import ScriptInfo
+
+from invenio_circulation import InvenioCirculation
+from invenio_circulation.api import checkout, loan_action
+from invenio_circulation.cli import circulation
+from invenio_circulation.notifications import SQLAlchemyNoticeLog, \
+    prepare_notices, send_notice_chunk
+from invenio_circulation.tasks import send_notices
+
+SENT = []
+
+
+def sender(patron_pid, body, notices):
+    """Record the notices of a patron."""
+    if patron_pid == 'failing':
+        raise IOError()
+    SENT.append((patron_pid, body.strip().splitlines(),
+                 [notice['key'] for notice in notices]))
+
+
+def _setup(app):
+    """Create loans needing notices on 2018-02-01."""
+    del SENT[:]
+    app.config.update(
+        CIRCULATION_NOTICE_SENDER='{0}:sender'.format(__name__),
+        CIRCULATION_NOTICE_CHUNK_SIZE=2,
+    )
+    InvenioCirculation(app)
+    checkout('item1', 'patron1', start_date='2018-01-07')
+    checkout('item2', 'patron1', start_date='2018-01-03')
+    checkout('item3', 'patron2', start_date='2017-12-28')
+    checkout('item4', 'failing', start_date='2017-12-05')
+    checkout('item5', 'patron3', start_date='2018-01-08')
+    loan_action('request', 'item5', 'patron1')
+
+
+def test_notices(app):
+    """Test sending notices, then sending them again."""
+    _setup(app)
+    chunks = prepare_notices(date(2018, 2, 1))
+    assert [[patron for patron, _ in chunk] for chunk in chunks] == [
+        ['patron1', 'patron2'], ['failing', 'patron3']]
+    assert sum(send_notice_chunk(chunk) for chunk in chunks) == 4
+
+    assert [patron for patron, _, _ in SENT] == [
+        'patron1', 'patron2', 'patron3']
+    assert SENT[0][1] == [
+        'Item item1 is due on 2018-02-04.',
+        'Item item2 was due on 2018-01-31, please return it.',
+    ]
+    assert SENT[2][1] == [
+        'Item item5 was requested by another patron, please return it.']
+
+    # Sent notices are skipped, failed ones are retried.
+    chunks = prepare_notices(date(2018, 2, 1))
+    assert [[patron for patron, _ in chunk] for chunk in chunks] == [
+        ['failing']]
+
+
+def test_notices_cli(app):
+    """Test the notices command."""
+    _setup(app)
+    runner = CliRunner()
+    args = ['notices', 'send', '--date', '2018-02-01']
+    obj = ScriptInfo(create_app=lambda *_: app)
+    assert runner.invoke(circulation, args, obj=obj).exit_code == 0
+    assert len(SENT) == 3
+    assert runner.invoke(circulation, args, obj=obj).exit_code == 0
+    assert len(SENT) == 3
+
+
+def test_sqlalchemy_notice_log(base_app, db):
+    """Test the database notice log."""
+    InvenioCirculation(base_app)
+    log = SQLAlchemyNoticeLog(base_app)
+    assert log.claim(['a', 'b']) == set(['a', 'b'])
+    assert log.claim(['a', 'c']) == set(['c'])
+    log.mark_sent(['a'])
+    log.release(['a', 'b'])
+    assert log.claim(['a', 'b', 'c']) == set(['b'])
+
+    log.timeout = log.timeout * 0
+    assert log.claim(['a', 'b', 'c']) == set(['b', 'c'])
+
+
+def test_notices_task(app):
+    """Test the Celery task sending chunks in parallel."""
+    celery = Celery('test', set_as_current=True)
+    celery.conf.update(task_always_eager=True)
+    _setup(app)
+    assert send_notices('2018-02-01') == 2
+    assert len(SENT) == 3
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 CERN.
+#
+# Invenio-Circulation is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Patron summaries tests."""
+
+from __future__ import absolute_import, print_function
+
+import json
+from datetime import date, timedelta
+
+from invenio_circulation import InvenioCirculation
+from invenio_circulation.api import checkin, checkout, loan_action
+from invenio_circulation.permissions import allow_all
+
+
+def test_patron_summary(app):
+    """Test that summaries follow loan transitions."""
+    InvenioCirculation(app)
+    summaries = app.extensions['invenio-circulation'].patron_summaries
+    started = (date.today() - timedelta(days=33)).isoformat()
+
+    checkout('item1', 'patron1', start_date=started)
+    summary = summaries.get('patron1')
+    assert summary.loans == 1
+    assert summary.overdue_loans == 1
+    assert summary.fines == 0.5
+
+    checkout('item2', 'patron1')
+    loan_action('request', 'item3', 'patron1')
+    checkout('item4', 'patron2')
+    summary = summaries.get('patron1')
+    assert (summary.loans, summary.overdue_loans, summary.holds) == (2, 1, 1)
+
+    checkin('item1')
+    loan_action('cancel', 'item3', 'patron1')
+    summary = summaries.get('patron1')
+    assert (summary.loans, summary.overdue_loans, summary.holds) == (1, 0, 0)
+    assert summary.fines == 0
+
+
+def test_patron_summary_eviction(app):
+    """Test the least recently used eviction."""
+    app.config['CIRCULATION_PATRON_SUMMARY_CACHE_SIZE'] = 2
+    InvenioCirculation(app)
+    summaries = app.extensions['invenio-circulation'].patron_summaries
+    for i in range(3):
+        checkout('item{0}'.format(i), 'patron{0}'.format(i))
+
+    summaries.get('patron0')
+    summaries.get('patron1')
+    summaries.get('patron0')
+    summaries.get('patron2')
+    assert list(summaries._patrons) == ['patron0', 'patron2']
+
+    # Evicted patrons are reloaded from the loan store.
+    checkout('item3', 'patron1')
+    assert summaries.get('patron1').loans == 2
+
+
+def test_patron_summary_view(app):
+    """Test the patron summary endpoint."""
+    InvenioCirculation(app)
+    checkout('item1', 'patron1')
+    with app.test_client() as client:
+        assert client.get('/patrons/patron1/summary').status_code == 403
+        app.config['CIRCULATION_LOAN_READ_PERMISSION_FACTORY'] = allow_all
+        res = client.get('/patrons/patron1/summary')
+        assert res.status_code == 200
+        assert json.loads(res.get_data(as_text=True)) == dict(
+            patron_pid='patron1', loans=1, overdue_loans=0, fines=0,
+            holds=0)
+
+
+def test_patron_summary_max_age(app):
+    """Test that summaries see the loans written by other processes."""
+    app.config['CIRCULATION_PATRON_SUMMARY_MAX_AGE'] = 0
+    InvenioCirculation(app)
+    state = app.extensions['invenio-circulation']
+    assert state.patron_summaries.get('patron1').loans == 0
+
+    state.loan_store.put_many([dict(
+        loan_pid='other', item_pid='item1', patron_pid='patron1',
+        state='ITEM_ON_LOAN')])
+    assert state.patron_summaries.get('patron1').loans == 1
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 CERN.
+#
+# Invenio-Circulation is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Circulation policies tests."""
+
+from __future__ import absolute_import, print_function
+
+from datetime import date, timedelta
+
+import numpy as np
+
+from invenio_circulation import InvenioCirculation
+from invenio_circulation.api import checkout, loan_action
+from invenio_circulation.policies import due_dates, fines, overdue_days, \
+    overdue_sweep, to_dates, to_isoformat
+
+
+def test_due_dates():
+    """Test due date computation."""
+    result = due_dates(['2018-01-30', None, '2018-12-31'], [28, 1, 1])
+    assert to_isoformat(result) == ['2018-02-27', None, '2019-01-01']
+
+
+def test_overdue_and_fines():
+    """Test overdue days and fines computation."""
+    end_dates = to_dates(['2018-01-01', '2018-01-09', '2018-01-10', None])
+    days = overdue_days(end_dates, date(2018, 1, 10))
+    assert days.tolist() == [9, 1, 0, 0]
+    days = overdue_days(end_dates, date(2018, 1, 10), grace_period=2)
+    assert days.tolist() == [9, 0, 0, 0]
+    assert fines([9, 1, 0], 0.5).tolist() == [4.5, 0.5, 0]
+    assert fines([9, 1, 0], 0.5, max_fine=1).tolist() == [1, 0.5, 0]
+    assert fines([9, 1], np.array([0.1, 1])).tolist() == [0.9, 1]
+
+
+def test_overdue_sweep(app):
+    """Test the overdue sweep over loans."""
+    InvenioCirculation(app)
+    loans = [
+        dict(loan_pid='1', end_date='2018-01-01'),
+        dict(loan_pid='2', end_date='2018-03-01'),
+        dict(loan_pid='3'),
+    ]
+    report = overdue_sweep(loans, today=date(2018, 2, 1))
+    assert report.loan_pids.tolist() == ['1', '2', '3']
+    assert report.overdue_days.tolist() == [31, 0, 0]
+    assert report.fines.tolist() == [3.1, 0, 0]
+
+    report = overdue_sweep(loans, today=date(2018, 2, 1), policy=dict(
+        grace_period=0, fine_rate=1, max_fine=None))
+    assert report.fines.tolist() == [31, 0, 0]
+
+
+def test_checkout_due_date(app):
+    """Test that checkout and extend compute due dates."""
+    InvenioCirculation(app)
+    today = date.today()
+    loan = checkout('item1', 'patron1', start_date='2018-01-01')
+    assert loan['end_date'] == '2018-01-29'
+    loan = loan_action('extend', 'item1')
+    assert loan['end_date'] == (today + timedelta(days=28)).isoformat()
+
+    loan = checkout('item2', 'patron1')
+    assert loan['end_date'] == (today + timedelta(days=28)).isoformat()
+    loan = loan_action('extend', 'item2')
+    assert loan['end_date'] == (today + timedelta(days=56)).isoformat()
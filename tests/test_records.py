@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 CERN.
+#
+# Invenio-Circulation is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Compact loan record tests."""
+
+from __future__ import absolute_import, print_function
+
+import json
+from datetime import date
+
+import pytest
+
+from invenio_circulation import InvenioCirculation
+from invenio_circulation.policies import overdue_sweep
+from invenio_circulation.proxies import current_circulation
+from invenio_circulation.records import CompactLoan, LoanBatch
+from invenio_circulation.rules import PolicyResolver
+from invenio_circulation.storage import MemoryLoanStore
+
+LOANS = [
+    dict(loan_pid='1', item_pid='item1', patron_pid='patron1',
+         state='ITEM_ON_LOAN', transaction_date='2018-01-01T10:00:00.123456',
+         start_date='2018-01-01', end_date='2018-01-29', extension_count=0,
+         transaction_location_pid='loc1', item_type='dvd'),
+    dict(loan_pid='2', item_pid='item2', patron_pid='patron1',
+         state='PENDING', pickup_location_pid=None, note='fragile'),
+    dict(loan_pid='3', item_pid='item3', patron_pid='patron2',
+         state='ITEM_ON_LOAN', end_date='2018-02-30', extension_count=-1,
+         item_type=['dvd'], transaction_date=''),
+]
+
+
+def _json_loans(count):
+    """Return loans decoded from JSON, like loans read from a store."""
+    return json.loads(json.dumps([
+        dict(loan_pid='{0:032x}'.format(i), item_pid='item{0}'.format(i),
+             patron_pid='patron{0}'.format(i % 1000), state='ITEM_ON_LOAN',
+             transaction_date='2018-01-01T10:00:{0:02d}.{1:06d}'.format(
+                 i % 60, i),
+             start_date='2018-01-01', end_date='2018-01-{0:02d}'.format(
+                 i % 28 + 1),
+             extension_count=i % 3, transaction_location_pid='loc1',
+             item_location_pid='loc{0}'.format(i % 10),
+             patron_category='student', item_type='book')
+        for i in range(count)
+    ]))
+
+
+def _allocated(build):
+    """Return the memory allocated by the result of a function."""
+    tracemalloc = pytest.importorskip('tracemalloc')
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = build()
+        size = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    return result, size
+
+
+def test_compact_loan():
+    """Test the conversions of compact loans."""
+    for loan in LOANS:
+        compact = CompactLoan.from_dict(loan)
+        assert compact.to_dict() == loan
+        assert compact == loan
+        assert compact['loan_pid'] == loan['loan_pid']
+    compact = CompactLoan.from_dict(LOANS[1])
+    assert compact.get('end_date') is None
+    assert 'pickup_location_pid' in compact
+    assert 'end_date' not in compact
+    assert compact['note'] == 'fragile'
+    with pytest.raises(KeyError):
+        compact['end_date']
+    with pytest.raises(AttributeError):
+        compact.other = 1
+
+
+def test_loan_batch():
+    """Test the conversions and columns of loan batches."""
+    batch = LoanBatch.from_loans(LOANS[:2] + [CompactLoan(**LOANS[2])])
+    assert len(batch) == 3
+    assert batch.to_dicts() == LOANS
+    assert list(batch) == LOANS
+    assert sorted(batch.extra) == [1, 2]
+    assert batch.decode('end_date') == ['2018-01-29', None, None]
+    assert batch.decode('state') == ['ITEM_ON_LOAN', 'PENDING', 'ITEM_ON_LOAN']
+    assert batch.mask('state', ['ITEM_ON_LOAN']).tolist() == \
+        [True, False, True]
+    combinations, inverse = batch.unique(['patron_pid', 'state'])
+    assert [combinations[i] for i in inverse] == [
+        ('patron1', 'ITEM_ON_LOAN'), ('patron1', 'PENDING'),
+        ('patron2', 'ITEM_ON_LOAN'),
+    ]
+    assert LoanBatch.from_loans([]).to_dicts() == []
+
+    resolver = PolicyResolver(
+        dict(loan_duration=28), [dict(item_type='dvd', loan_duration=7)])
+    assert [policy['loan_duration'] for policy in resolver.for_batch(
+        batch)] == [7, 28, 28]
+
+
+def test_memory():
+    """Test that batches take a fraction of the memory of dictionaries."""
+    text = json.dumps(_json_loans(10000))
+    loans, dicts_size = _allocated(lambda: json.loads(text))
+    batch, batch_size = _allocated(lambda: LoanBatch.from_loans(loans))
+    compact, compact_size = _allocated(
+        lambda: [CompactLoan.from_dict(loan) for loan in loans])
+    assert batch.to_dicts() == loans
+    assert dicts_size > 5 * batch_size
+    assert dicts_size > 1.5 * compact_size
+
+
+def test_store_iteration(app):
+    """Test that stores and jobs can use compact loans."""
+    InvenioCirculation(app)
+    store = current_circulation.loan_store
+    loans = _json_loans(25)
+    store.put_many(loans)
+    assert [loan.to_dict() for loan in store.iter_loans(
+        chunk_size=10, compact=True)] == loans
+    batches = list(store.iter_batches(chunk_size=10))
+    assert [len(batch) for batch in batches] == [10, 10, 5]
+    assert [loan for batch in batches for loan in batch.to_dicts()] == loans
+
+    today = date(2018, 2, 1)
+    expected = overdue_sweep(loans, today=today)
+    reports = [overdue_sweep(batch, today=today) for batch in batches]
+    assert [pid for report in reports for pid in report.loan_pids] == \
+        expected.loan_pids.tolist()
+    assert [fine for report in reports for fine in report.fines] == \
+        expected.fines.tolist()
+    assert list(MemoryLoanStore().iter_batches()) == []
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 CERN.
+#
+# Invenio-Circulation is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Bulk renewal tests."""
+
+from __future__ import absolute_import, print_function
+
+import json
+from datetime import date, timedelta
+
+import pytest
+from click.testing import CliRunner
+from flask.cli import ScriptInfo
+
+from invenio_circulation import InvenioCirculation
+from invenio_circulation.api import checkout, loan_action
+from invenio_circulation.cli import circulation
+from invenio_circulation.errors import LoanMaxExtensionsError, \
+    LoanNotFoundError, LoanOnHoldError, PatronBlockedError
+from invenio_circulation.permissions import allow_all
+from invenio_circulation.proxies import current_circulation
+from invenio_circulation.renewals import extend_location_loans, \
+    renew_patron_loans
+
+
+def _days(days):
+    """Return the ISO date of a day relative to today."""
+    return (date.today() + timedelta(days=days)).isoformat()
+
+
+def _count_writes(store):
+    """Count the calls to ``put_many`` of a store."""
+    writes = []
+    put_many = store.put_many
+
+    def counting_put_many(loans, **kwargs):
+        writes.append(len(list(loans)))
+        return put_many(loans, **kwargs)
+    store.put_many = counting_put_many
+    return writes
+
+
+def test_renew_patron_loans(app):
+    """Test renewing all loans of patrons at once."""
+    app.config['CIRCULATION_POLICY_RULES'] = [
+        dict(item_type='short', max_extensions=1, extension_duration=7),
+        dict(patron_category='student', max_overdue_loans=0),
+    ]
+    InvenioCirculation(app)
+    checkout('item1', 'patron1', start_date=_days(-25))
+    checkout('item2', 'patron1', item_type='short', start_date=_days(-27))
+    checkout('item3', 'patron1', item_type='short', start_date=_days(-26))
+    loan_action('extend', 'item3')
+    checkout('item4', 'patron1', start_date=_days(-24))
+    loan_action('request', 'item4', 'patron2')
+    checkout('item5', 'patron2', patron_category='student',
+             start_date=_days(-30))
+    checkout('item6', 'patron3', start_date=_days(-23))
+
+    store = current_circulation.loan_store
+    writes = _count_writes(store)
+    search = store.search
+    searches = []
+
+    def counting_search(**kwargs):
+        searches.append(kwargs)
+        return search(**kwargs)
+    store.search = counting_search
+    results = renew_patron_loans(['patron1', 'patron2'])
+    assert writes == [2]
+    assert [kwargs.get('patron_pids') for kwargs in searches] == [
+        ['patron1', 'patron2'], None]
+    assert [result.item_pid for result in results] == \
+        ['item2', 'item1', 'item4', 'item3', 'item5']
+    assert [result.loan['end_date'] for result in results[:2]] == \
+        [_days(8), _days(31)]
+    assert results[0].loan['extension_count'] == 1
+    assert [type(result.error) for result in results[1:]] == [
+        type(None), LoanOnHoldError, LoanMaxExtensionsError,
+        PatronBlockedError,
+    ]
+    assert current_circulation.loan_store.get(
+        results[1].loan['loan_pid']) == results[1].loan
+    assert current_circulation.patron_summaries.get('patron1').loans == 4
+
+    assert renew_patron_loans(['patron4']) == []
+
+
+def test_renewal_rules(app):
+    """Test that single renewals follow the rules of renew all."""
+    app.config['CIRCULATION_POLICY_RULES'] = [
+        dict(patron_category='student', max_overdue_loans=0),
+    ]
+    InvenioCirculation(app)
+    store = current_circulation.loan_store
+    checkout('item1', 'patron1')
+    checkout('item3', 'patron2', patron_category='student')
+    checkout('item2', 'patron2', patron_category='student',
+             start_date=_days(-30))
+    # Requested through another process.
+    store.put_many([dict(loan_pid='other', item_pid='item1',
+                         patron_pid='patron3', state='PENDING')])
+
+    results = renew_patron_loans(['patron1', 'patron2'])
+    assert [type(result.error) for result in results] == [
+        LoanOnHoldError, PatronBlockedError, PatronBlockedError]
+    for item_pid, error in (('item1', LoanOnHoldError),
+                            ('item3', PatronBlockedError)):
+        with pytest.raises(error):
+            loan_action('extend', item_pid)
+
+
+def test_extend_location_loans(app):
+    """Test postponing the due dates of a location."""
+    InvenioCirculation(app)
+    checkout('item1', 'patron1', transaction_location_pid='branch',
+             start_date=_days(-26))
+    checkout('item2', 'patron1', transaction_location_pid='branch',
+             start_date=_days(-8))
+    checkout('item3', 'patron1', transaction_location_pid='branch',
+             start_date=_days(-29))
+    checkout('item4', 'patron2', transaction_location_pid='main',
+             start_date=_days(-26))
+    checkout('item5', 'patron2', transaction_location_pid='branch',
+             start_date=_days(-24))
+    store = current_circulation.loan_store
+    search_due = store.search_due
+
+    def returning_search_due(*args, **kwargs):
+        # Item 5 is returned by another process in the meantime.
+        loans = list(search_due(*args, **kwargs))
+        loan, = store.search(item_pids=['item5'])
+        store.put(dict(loan, state='ITEM_RETURNED'))
+        return loans
+    store.search_due = returning_search_due
+
+    results = extend_location_loans('branch', _days(10))
+    assert [result.item_pid for result in results] == ['item1', 'item5']
+    loan = results[0].loan
+    assert loan['end_date'] == _days(10)
+    assert loan.get('extension_count', 0) == 0
+    assert isinstance(results[1].error, LoanNotFoundError)
+    store.search_due = search_due
+    assert current_circulation.availability.get('item1').end_date == \
+        _days(10)
+
+    result = CliRunner().invoke(
+        circulation, ['loans', 'extend-location', 'main', _days(10)],
+        obj=ScriptInfo(create_app=lambda *_: app))
+    assert result.exit_code == 0, result.output
+    assert 'Extended 1 loans.' in result.output
+
+
+def test_renew_view(app):
+    """Test the renew all endpoint."""
+    InvenioCirculation(app)
+    with app.test_client() as client:
+        assert client.post('/patrons/patron1/renew').status_code == 403
+    app.config['CIRCULATION_ACTION_PERMISSION_FACTORY'] = allow_all
+    checkout('item1', 'patron1')
+    checkout('item2', 'patron1')
+    loan_action('request', 'item2', 'patron2')
+    with app.test_client() as client:
+        res = client.post('/patrons/patron1/renew')
+        assert res.status_code == 200
+        results = json.loads(res.get_data(as_text=True))['results']
+    assert sorted(
+        (result['item_pid'], result['status']) for result in results
+    ) == [('item1', 200), ('item2', 400)]
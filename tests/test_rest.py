@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 CERN.
+#
+# Invenio-Circulation is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""REST API tests."""
+
+from __future__ import absolute_import, print_function
+
+import json
+
+from invenio_circulation import InvenioCirculation
+from invenio_circulation.permissions import allow_all, deny_all
+from invenio_circulation.proxies import current_circulation
+from invenio_circulation.views import api_blueprint, decode_cursor, \
+    encode_cursor
+
+LOANS = [
+    dict(loan_pid='loan{0:02d}'.format(i), item_pid='item{0}'.format(i % 3),
+         patron_pid='patron{0}'.format(i % 2),
+         state='ITEM_ON_LOAN' if i % 4 else 'ITEM_RETURNED')
+    for i in range(20)
+]
+
+
+def _get(client, url, **kwargs):
+    res = client.get(url, **kwargs)
+    return res, json.loads(res.get_data(as_text=True) or 'null')
+
+
+def test_cursor():
+    """Test the encoding of cursors."""
+    assert decode_cursor(encode_cursor('loan/1')) == 'loan/1'
+    assert decode_cursor('%%%') is None
+
+
+def test_list_loans(app):
+    """Test paging through filtered loans."""
+    InvenioCirculation(app)
+    app.config['CIRCULATION_LOAN_READ_PERMISSION_FACTORY'] = allow_all
+    app.register_blueprint(api_blueprint)
+    current_circulation.loan_store.put_many(LOANS)
+    expected = [
+        loan for loan in LOANS
+        if loan['patron_pid'] == 'patron0' and loan['state'] == 'ITEM_ON_LOAN'
+    ]
+    with app.test_client() as client:
+        hits = []
+        url = '/circulation/loans?patron_pid=patron0&state=ITEM_ON_LOAN' \
+            '&size=3&fields=state'
+        while url:
+            res, data = _get(client, url)
+            assert res.status_code == 200
+            assert len(data['hits']) <= 3
+            hits.extend(data['hits'])
+            url = data['links'].get('next')
+        assert hits == [
+            dict(loan_pid=loan['loan_pid'], state='ITEM_ON_LOAN')
+            for loan in expected
+        ]
+
+        res, data = _get(
+            client, '/circulation/loans?item_pid=item0&item_pid=item1')
+        assert len(data['hits']) == 14
+        assert 'next' not in data['links']
+
+        for url in ('/circulation/loans?size=0',
+                    '/circulation/loans?size=10000',
+                    '/circulation/loans?cursor=%25'):
+            assert client.get(url).status_code == 400
+
+
+def test_get_loan(app):
+    """Test fetching a loan with conditional requests."""
+    InvenioCirculation(app)
+    app.config['CIRCULATION_LOAN_READ_PERMISSION_FACTORY'] = allow_all
+    app.register_blueprint(api_blueprint)
+    store = current_circulation.loan_store
+    store.put_many(LOANS)
+    with app.test_client() as client:
+        res, data = _get(client, '/circulation/loans/loan01')
+        assert data == LOANS[1]
+        etag = res.headers['ETag']
+
+        res = client.get('/circulation/loans/loan01',
+                         headers={'If-None-Match': etag})
+        assert res.status_code == 304
+        store.put(dict(LOANS[1], state='ITEM_RETURNED'))
+        res = client.get('/circulation/loans/loan01',
+                         headers={'If-None-Match': etag})
+        assert res.status_code == 200
+
+        res, data = _get(client, '/circulation/loans/loan01?fields=item_pid')
+        assert data == dict(loan_pid='loan01', item_pid='item1')
+        assert client.get('/circulation/loans/x').status_code == 404
+
+
+def _patron1_loans(loan=None, **kwargs):
+    """Permission factory allowing to read the loans of ``patron1``."""
+    if loan is not None and loan['patron_pid'] == 'patron1':
+        return allow_all()
+    return deny_all()
+
+
+def test_read_permission(app):
+    """Test that reading loans requires a permission."""
+    InvenioCirculation(app)
+    app.register_blueprint(api_blueprint)
+    current_circulation.loan_store.put_many(LOANS)
+    with app.test_client() as client:
+        for url in ('/circulation/loans', '/circulation/loans/loan01',
+                    '/circulation/locations/home/arrivals'):
+            assert client.get(url).status_code == 403
+
+        app.config['CIRCULATION_LOAN_READ_PERMISSION_FACTORY'] = \
+            _patron1_loans
+        res, data = _get(client, '/circulation/loans/loan01')
+        assert res.status_code == 200
+        assert data == LOANS[1]
+        assert client.get('/circulation/loans/loan02').status_code == 403
+        assert client.get('/circulation/loans').status_code == 403
+        assert client.get('/circulation/loans/x').status_code == 404
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 CERN.
+#
+# Invenio-Circulation is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Policy rules tests."""
+
+from __future__ import absolute_import, print_function
+
+from datetime import date, timedelta
+
+import pytest
+
+from invenio_circulation import InvenioCirculation
+from invenio_circulation.api import checkout, loan_action
+from invenio_circulation.errors import LoanMaxExtensionsError, \
+    PolicyRulesConfigError
+from invenio_circulation.policies import overdue_sweep
+from invenio_circulation.proxies import current_circulation
+from invenio_circulation.rules import PolicyResolver
+
+DEFAULT = dict(loan_duration=28, fine_rate=0.1, max_extensions=None)
+
+RULES = [
+    dict(item_type='dvd', loan_duration=7, max_extensions=1),
+    dict(item_type='dvd', location_pid='loc1', fine_rate=1),
+    dict(patron_category='staff', loan_duration=56),
+    dict(patron_category='staff', item_type='dvd', library_pid='*',
+         loan_duration=14),
+    dict(library_pid='lib1', fine_rate=0.5),
+]
+
+
+def test_resolve():
+    """Test the resolution of the most specific rules."""
+    resolver = PolicyResolver(DEFAULT, RULES)
+    assert resolver.resolve() == DEFAULT
+    assert resolver.resolve('student', 'book', 'loc1') == DEFAULT
+    assert resolver.resolve('student', 'dvd') == dict(
+        DEFAULT, loan_duration=7, max_extensions=1)
+    assert resolver.resolve('student', 'dvd', 'loc1', 'lib1') == dict(
+        DEFAULT, loan_duration=7, max_extensions=1, fine_rate=1)
+    assert resolver.resolve('staff', 'book', library_pid='lib1') == dict(
+        DEFAULT, loan_duration=56, fine_rate=0.5)
+    assert resolver.resolve('staff', 'dvd') == dict(
+        DEFAULT, loan_duration=14, max_extensions=1)
+    assert resolver.for_loan(dict(
+        patron_category='staff', item_type='dvd',
+        transaction_location_pid='loc1')) == dict(
+            DEFAULT, loan_duration=14, max_extensions=1, fine_rate=1)
+
+    # Resolved policies are memoized until the rules are reloaded.
+    assert resolver.resolve('staff', 'dvd') is resolver.resolve('staff', 'dvd')
+    resolver.load(DEFAULT, RULES[:1])
+    assert resolver.resolve('staff', 'dvd')['loan_duration'] == 7
+
+    with pytest.raises(PolicyRulesConfigError):
+        PolicyResolver(DEFAULT, [dict(item_type='dvd', loan_days=7)])
+
+
+def test_rules_in_actions(app):
+    """Test that loans and fines follow the rules."""
+    app.config['CIRCULATION_POLICY_RULES'] = RULES
+    InvenioCirculation(app)
+    loan = checkout('item1', 'patron1', item_type='dvd',
+                    start_date='2018-01-01')
+    assert loan['end_date'] == '2018-01-08'
+    loan_action('extend', 'item1')
+    with pytest.raises(LoanMaxExtensionsError):
+        loan_action('extend', 'item1')
+
+    start = date.today() - timedelta(days=5)
+    checkout('item2', 'patron2', item_type='dvd',
+             start_date=(start - timedelta(days=7)).isoformat(),
+             transaction_location_pid='loc1')
+    checkout('item3', 'patron2',
+             start_date=(start - timedelta(days=28)).isoformat())
+    assert current_circulation.patron_summaries.get('patron2').fines == 5.5
+
+    report = overdue_sweep(current_circulation.loan_store.search(
+        patron_pids=['patron2']))
+    assert sorted(report.fines.tolist()) == [0.5, 5]
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 CERN.
+#
+# Invenio-Circulation is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Import and initialization budget tests."""
+
+from __future__ import absolute_import, print_function
+
+import json
+import subprocess
+import sys
+
+IMPORT_BUDGET = 3.0
+"""Seconds allowed to import the package, Flask included."""
+
+INIT_BUDGET = 0.2
+"""Seconds allowed to initialize the extension."""
+
+HEAVY_MODULES = [
+    'celery', 'elasticsearch', 'invenio_db', 'kombu', 'numpy', 'sqlalchemy',
+    'invenio_circulation.api', 'invenio_circulation.archive',
+    'invenio_circulation.calendars', 'invenio_circulation.indexer',
+    'invenio_circulation.notifications', 'invenio_circulation.policies',
+    'invenio_circulation.storage',
+]
+
+SCRIPT = '''
+import json, sys, time
+start = time.time()
+from flask import Flask
+from flask_babelex import Babel
+from invenio_circulation import InvenioCirculation
+imported = time.time()
+app = Flask('testapp')
+Babel(app)
+InvenioCirculation(app)
+initialized = time.time()
+loaded = [name for name in {modules!r} if name in sys.modules]
+with app.app_context():
+    from invenio_circulation.api import checkout
+    checkout('item1', 'patron1')
+print(json.dumps(dict(
+    import_time=imported - start,
+    init_time=initialized - imported,
+    loaded=loaded,
+    used=[name for name in {modules!r} if name in sys.modules],
+)))
+'''
+
+
+def test_startup_budget():
+    """Test that heavy modules are only loaded on first use."""
+    output = subprocess.check_output([
+        sys.executable, '-c', SCRIPT.format(modules=HEAVY_MODULES)])
+    result = json.loads(output.decode('utf-8').splitlines()[-1])
+    assert result['loaded'] == []
+    assert result['import_time'] < IMPORT_BUDGET
+    assert result['init_time'] < INIT_BUDGET
+    assert 'invenio_circulation.storage' in result['used']
+    assert 'numpy' in result['used']
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 CERN.
+#
+# Invenio-Circulation is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Loan storage tests."""
+
+from __future__ import absolute_import, print_function
+
+import pytest
+
+from invenio_circulation import InvenioCirculation
+from invenio_circulation.api import checkin, checkout
+from invenio_circulation.errors import LoanConflictError
+from invenio_circulation.storage import MemoryLoanStore, SQLAlchemyLoanStore
+
+LOANS = [
+    dict(loan_pid='1', item_pid='item1', patron_pid='patron1',
+         state='ITEM_ON_LOAN'),
+    dict(loan_pid='2', item_pid='item1', patron_pid='patron2',
+         state='PENDING'),
+    dict(loan_pid='3', item_pid='item2', patron_pid='patron1',
+         state='ITEM_RETURNED'),
+]
+
+
+def _pids(loans):
+    return sorted(loan['loan_pid'] for loan in loans)
+
+
+def _check_store(store):
+    """Check the behavior common to all stores."""
+    store.put_many(LOANS)
+    assert store.get('1') == LOANS[0]
+    assert store.get_many(['3', 'x', '1']) == [LOANS[2], None, LOANS[0]]
+
+    assert _pids(store.search()) == ['1', '2', '3']
+    assert _pids(store.search(item_pids=['item1'])) == ['1', '2']
+    assert _pids(store.search(patron_pids=['patron1'],
+                              states=['ITEM_ON_LOAN', 'PENDING'])) == ['1']
+    assert _pids(store.search(item_pids=['item1', 'item2'],
+                              patron_pids=['patron1'])) == ['1', '3']
+    assert _pids(store.search(states=[])) == []
+
+    assert [loan['loan_pid'] for loan in store.scan()] == ['1', '2', '3']
+    assert store.scan(after='1', limit=1) == [LOANS[1]]
+    assert store.scan(after='1', item_pids=['item2']) == [LOANS[2]]
+    assert [loan['loan_pid'] for loan in store.iter_loans(chunk_size=2)] == \
+        ['1', '2', '3']
+
+    by_item = store.get_by_items(['item1', 'item3'], states=['PENDING'])
+    assert by_item == {'item1': [LOANS[1]], 'item3': []}
+    by_patron = store.get_by_patrons(['patron1'])
+    assert _pids(by_patron['patron1']) == ['1', '3']
+
+    loan = dict(LOANS[1], state='CANCELLED', patron_pid='patron3')
+    store.put(loan)
+    assert store.get('2') == loan
+    assert _pids(store.search(states=['PENDING'])) == []
+    assert _pids(store.search(patron_pids=['patron2'])) == []
+    assert _pids(store.search(patron_pids=['patron3'])) == ['2']
+
+    loan = store.get('1')
+    loan['state'] = 'MODIFIED'
+    assert store.get('1') == LOANS[0]
+
+    revisions = store.get_item_revisions(['item1', 'item3'])
+    assert revisions == dict(item1=2, item3=0)
+    store.put(dict(loan_pid='4', item_pid='item3', state='PENDING'),
+              revisions=revisions)
+    with pytest.raises(LoanConflictError):
+        store.put_many([dict(LOANS[0], state='CANCELLED'), store.get('4')],
+                       revisions=revisions)
+    assert store.get('1') == LOANS[0]
+    assert store.get_item_revisions(['item1', 'item3']) == \
+        dict(item1=2, item3=1)
+
+    store.put_many([
+        dict(loan_pid='5', item_pid='item5', patron_pid='patron1',
+             state='ITEM_ON_LOAN', item_type='dvd'),
+        dict(LOANS[0], state='ITEM_RETURNED'),
+    ])
+    assert store.get_patron_counts(['patron1', 'patron2']) == dict(
+        patron1=dict(dvd=1), patron2={})
+    assert store.reconcile_patron_counts() == {}
+
+    store.put_many([
+        dict(loan_pid='6', item_pid='item6', state='ITEM_ON_LOAN',
+             end_date='2018-01-02'),
+        dict(loan_pid='7', item_pid='item7', state='PENDING',
+             end_date='2018-01-02'),
+        dict(loan_pid='8', item_pid='item8', state='ITEM_ON_LOAN',
+             end_date='2018-01-01'),
+        dict(loan_pid='9', item_pid='item9', state='ITEM_ON_LOAN',
+             end_date='2018-01-05'),
+    ])
+    store.put(dict(store.get('9'), end_date='2018-01-03'))
+    assert [loan['loan_pid'] for loan in store.search_due(
+        '2018-01-01', '2018-01-03', states=['ITEM_ON_LOAN'])] == \
+        ['8', '6', '9']
+    assert [loan['loan_pid'] for loan in store.search_due(
+        start='2018-01-02', end='2018-01-02')] == ['6', '7']
+
+    transit = dict(item_pid='item1', to_location_pid='loc2')
+    store.put_many([], transits=dict(
+        item1=transit, item2=dict(item_pid='item2', to_location_pid='loc1')))
+    store.put_many([], transits=dict(
+        item2=dict(item_pid='item2', to_location_pid='loc2'), item3=None))
+    assert store.get_transits(['item1', 'item3']) == dict(
+        item1=transit, item3=None)
+    assert sorted(t['item_pid'] for t in store.search_transits(
+        ['loc1', 'loc2'])) == ['item1', 'item2']
+    store.put_many([], transits=dict(item1=None))
+    assert list(store.search_transits(['loc1'])) == []
+    assert [t['item_pid'] for t in store.search_transits(['loc2'])] == \
+        ['item2']
+
+    store.put(dict(loan_pid='10', item_pid='item10', patron_pid='patron1',
+                   state='ITEM_ON_LOAN', item_type='dvd',
+                   end_date='2018-01-02'))
+    store.delete_many(['10', '6', 'x'])
+    assert store.get_many(['10', '6']) == [None, None]
+    assert _pids(store.search(patron_pids=['patron1'])) == ['1', '3', '5']
+    assert [loan['loan_pid'] for loan in store.search_due(
+        start='2018-01-02', end='2018-01-02')] == ['7']
+    assert store.get_patron_counts(['patron1']) == dict(patron1=dict(dvd=1))
+    assert store.reconcile_patron_counts() == {}
+
+
+def test_memory_store():
+    """Test the in-memory store."""
+    _check_store(MemoryLoanStore())
+
+
+def test_sqlalchemy_store(db):
+    """Test the database store."""
+    _check_store(SQLAlchemyLoanStore())
+
+
+def test_store_from_config(base_app, db):
+    """Test that the configured store is used by the API."""
+    InvenioCirculation(base_app)
+    state = base_app.extensions['invenio-circulation']
+    assert isinstance(state.loan_store, SQLAlchemyLoanStore)
+    loan = checkout('item1', 'patron1')
+    assert state.availability.get('item1').loan_pid == loan['loan_pid']
+    checkin('item1')
+    assert state.loan_store.get(loan['loan_pid'])['state'] == \
+        'ITEM_RETURNED'
+    assert state.availability.get('item1').available
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 CERN.
+#
+# Invenio-Circulation is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Loan transitions tests."""
+
+from __future__ import absolute_import, print_function
+
+import pytest
+
+from invenio_circulation import InvenioCirculation
+from invenio_circulation.errors import InvalidLoanTransitionError, \
+    LoanTransitionsConfigError
+from invenio_circulation.proxies import current_circulation
+from invenio_circulation.transitions import LoanTransitions
+
+
+def test_transitions_from_config(app):
+    """Test the transitions table compiled at initialization."""
+    InvenioCirculation(app)
+    transitions = current_circulation.loan_transitions
+
+    assert transitions.initial_state == 'CREATED'
+    assert transitions.validate('CREATED', 'checkout') == 'ITEM_ON_LOAN'
+    assert transitions.validate('ITEM_ON_LOAN', 'extend') == 'ITEM_ON_LOAN'
+    assert transitions.validate('ITEM_ON_LOAN', 'checkin') == \
+        'ITEM_RETURNED'
+    assert transitions.can('PENDING', 'cancel')
+    assert not transitions.can('ITEM_RETURNED', 'checkout')
+    assert transitions.triggers('CREATED') == {'request', 'checkout'}
+    assert transitions.final_states == {'ITEM_RETURNED', 'CANCELLED'}
+    assert transitions.is_active('PENDING')
+    assert not transitions.is_active('CANCELLED')
+
+    with pytest.raises(InvalidLoanTransitionError) as excinfo:
+        transitions.validate('ITEM_RETURNED', 'extend')
+    assert excinfo.value.state == 'ITEM_RETURNED'
+    assert excinfo.value.trigger == 'extend'
+
+
+def test_transitions_custom_config(base_app):
+    """Test a custom state machine."""
+    base_app.config['CIRCULATION_LOAN_TRANSITIONS'] = {
+        'CREATED': [dict(dest='LOST', trigger='lose')],
+        'LOST': [],
+    }
+    InvenioCirculation(base_app)
+    transitions = base_app.extensions['invenio-circulation'].loan_transitions
+    assert transitions.validate('CREATED', 'lose') == 'LOST'
+    assert not transitions.can('CREATED', 'checkout')
+
+
+def test_transitions_invalid_config():
+    """Test validation of the state machine definition."""
+    with pytest.raises(LoanTransitionsConfigError):
+        LoanTransitions({'CREATED': [dict(dest='MISSING', trigger='x')]},
+                        'CREATED')
+    with pytest.raises(LoanTransitionsConfigError):
+        LoanTransitions({'CREATED': [dict(dest='CREATED', trigger='x'),
+                                     dict(dest='CREATED', trigger='x')]},
+                        'CREATED')
+    with pytest.raises(LoanTransitionsConfigError):
+        LoanTransitions({'CREATED': []}, 'NEW')
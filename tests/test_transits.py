@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2018 CERN.
+#
+# Invenio-Circulation is free software; you can redistribute it and/or modify it
+# under the terms of the MIT License; see LICENSE file for more details.
+
+"""Transit tests."""
+
+from __future__ import absolute_import, print_function
+
+import json
+
+from invenio_circulation import InvenioCirculation
+from invenio_circulation.api import bulk_loan_action, checkout, get_arrivals, \
+    loan_action, receive_items
+from invenio_circulation.permissions import allow_all
+from invenio_circulation.views import api_blueprint
+
+
+def _route(transit):
+    """Return the reason and locations of a transit."""
+    return (transit['reason'], transit['from_location_pid'],
+            transit['to_location_pid'])
+
+
+def test_checkin_transits(app):
+    """Test that checkin sends items to their hold or home location."""
+    InvenioCirculation(app)
+    for i in range(4):
+        checkout('item{0}'.format(i), 'patron1', item_location_pid='home')
+    loan_action('request', 'item1', 'patron2', pickup_location_pid='branch')
+    loan_action('request', 'item2', 'patron2', pickup_location_pid='home')
+
+    results = bulk_loan_action('checkin', [
+        dict(item_pid='item0', transaction_location_pid='home'),
+        dict(item_pid='item1', transaction_location_pid='home'),
+        dict(item_pid='item2', transaction_location_pid='branch'),
+        dict(item_pid='item3', transaction_location_pid='branch'),
+    ])
+    assert [result.transit and _route(result.transit)
+            for result in results] == [
+        None,
+        ('pickup', 'home', 'branch'),
+        ('pickup', 'branch', 'home'),
+        ('return', 'branch', 'home'),
+    ]
+    assert results[1].transit['loan_pid'] != results[1].loan['loan_pid']
+    assert sorted(t['item_pid'] for t in get_arrivals('home')) == \
+        ['item2', 'item3']
+    assert [t['item_pid'] for t in get_arrivals('branch')] == ['item1']
+
+    assert list(receive_items('home', ['item1', 'item2'])) == ['item2']
+    assert [t['item_pid'] for t in get_arrivals('home')] == ['item3']
+    assert [t['item_pid'] for t in get_arrivals('branch')] == ['item1']
+
+
+def test_arrivals_view(app):
+    """Test the arrivals endpoint."""
+    InvenioCirculation(app)
+    app.config['CIRCULATION_LOAN_READ_PERMISSION_FACTORY'] = allow_all
+    app.register_blueprint(api_blueprint)
+    checkout('item1', 'patron1', item_location_pid='home')
+    loan_action('checkin', 'item1', transaction_location_pid='branch')
+    with app.test_client() as client:
+        res = client.get('/circulation/locations/home/arrivals')
+        hits = json.loads(res.get_data(as_text=True))['hits']
+        assert [hit['item_pid'] for hit in hits] == ['item1']